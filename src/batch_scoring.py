@@ -0,0 +1,226 @@
+import re
+
+import numpy as np
+
+from lexicon_store import import_nltk
+from message_features import _CONTEXT_NGRAMS, _CONTEXT_WORDS, FeatureExtractor, _strip_token, compound
+
+# Keeps nltk's __init__ from pulling in sklearn, pandas and scipy, whatever imported it first
+import_nltk()
+from nltk.sentiment.vader import VaderConstants
+
+# analyze_many scores agree with SentimentIntensityAnalyzer.polarity_scores()['compound']
+# to within this tolerance. Fast-path scores use the same left-to-right summation and the
+# same 4-decimal rounding as VADER, so in practice they are identical.
+BATCH_TOLERANCE = 1e-4
+
+# Whitespace-separated tokens of a draft, with their offsets
+_RAW_TOKEN = re.compile(r"\S+")
+
+
+class BatchScorer:
+    """
+    Scores lists of messages with VADER's lexicon in one vectorized pass.
+    Messages whose score only depends on per-token lexicon valences (the vast majority
+    of chat messages) are tokenized once and summed with NumPy; messages that trigger
+    VADER's context rules are delegated to the wrapped SentimentIntensityAnalyzer.
+    """
+
+    def __init__(self, sia):
+        self.sia = sia
+        self.extractor = FeatureExtractor(sia)
+
+    def score(self, texts):
+        """
+        Compound scores for a list of message strings (already rewritten), as a float64 array
+        """
+        return self.score_features([self.extractor.extract(text) for text in texts])
+
+    def score_features(self, features):
+        """
+        Compound scores for a list of MessageFeatures, as a float64 array
+        """
+        n = len(features)
+        scores = np.zeros(n)
+        segment_ids = []
+        values = []
+        fast = np.zeros(n, dtype=bool)
+        exclamations = np.zeros(n)
+        questions = np.zeros(n)
+
+        for idx, item in enumerate(features):
+            if item.needs_context:
+                scores[idx] = self.sia.polarity_scores(item.rewritten)["compound"]
+                continue
+            fast[idx] = True
+            segment_ids.extend([idx] * len(item.valences))
+            values.extend(item.valences)
+            exclamations[idx] = item.exclamations
+            questions[idx] = item.questions
+
+        if not fast.any():
+            return scores
+
+        # Sum of valences per message (bincount adds left to right, like VADER's sum())
+        sums = np.bincount(np.asarray(segment_ids, dtype=np.intp),
+                           weights=np.asarray(values, dtype=np.float64), minlength=n)
+
+        # Punctuation emphasis: up to 4 '!' at 0.292 each, 2-3 '?' at 0.18 each, more capped at 0.96
+        amplifier = np.minimum(exclamations, 4) * 0.292
+        amplifier += np.where(questions > 3, 0.96, np.where(questions > 1, questions * 0.18, 0.0))
+        sums = np.where(sums > 0, sums + amplifier, np.where(sums < 0, sums - amplifier, sums))
+
+        normalized = sums / np.sqrt(sums * sums + 15)
+        # Python's round() to match VADER's rounding exactly
+        scores[fast] = [round(x, 4) for x in normalized[fast].tolist()]
+        return scores
+
+
+def _common_prefix_length(a, b):
+    """Length of the longest common prefix of two strings, by bisection over C-level comparisons"""
+    if b.startswith(a):
+        return len(a)
+    if a.startswith(b):
+        return len(b)
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class DraftScorer:
+    """
+    Scores a message draft as it is typed, matching analyze_short_term exactly.
+    The draft is tokenized left to right into running per-token totals (capitals, valence sums
+    with and without capitalization emphasis, whether a context rule applies) with a checkpoint
+    at every whitespace no custom phrase match spans. A keystroke rolls back to the latest
+    checkpoint the edit can't affect and only canonicalizes, rewrites and tokenizes the draft
+    from there. Drafts that trigger VADER's context rules are scored by the analyzer itself.
+    """
+
+    def __init__(self, analyzer):
+        self.analyzer = analyzer
+        self._lexicon = None
+
+    def _reset(self):
+        lexicon = self._lexicon = self.analyzer.lexicon
+        automaton = lexicon.automaton
+        # Longest custom phrase: a match starting before a checkpoint can't reach further past it.
+        # Emoji matches never contain a space, so they never span a checkpoint.
+        self._reach = 0 if automaton is None else max(
+            (length for length, bounded in zip(automaton.lengths, lexicon.bounded) if bounded), default=0
+        )
+        self._valence_of = self.analyzer.sia.lexicon.get
+        self._draft = ""
+        self._score = 0.0
+        # (raw draft offset, tokens before it, '!' and '?' before it)
+        self._checkpoints = [(0, 0, 0, 0)]
+        # Per token, running up to and including it
+        self._words = []
+        self._capitals = []
+        self._plain = []
+        self._emphasized = []
+        self._context = []
+
+    def score(self, draft):
+        """Compound sentiment of the draft, between -1 and 1"""
+        if self.analyzer.lexicon is not self._lexicon:
+            self._reset()
+        if draft == self._draft:
+            return self._score
+
+        # Latest checkpoint followed by more unchanged (canonical) text than any phrase is long:
+        # tokens before it, and phrase matches around it, are the same as last time
+        # (searched from the newest, since edits are almost always near the end)
+        common = _common_prefix_length(self._draft, draft)
+        checkpoints = self._checkpoints
+        keep = len(checkpoints) - 1
+        while keep and (checkpoints[keep][0] >= common
+                        or len(" ".join(draft[checkpoints[keep][0]:common].split())) <= self._reach):
+            keep -= 1
+        offset, tokens, exclamations, questions = checkpoints[keep]
+        del checkpoints[keep + 1:]
+        for totals in (self._words, self._capitals, self._plain, self._emphasized, self._context):
+            del totals[tokens:]
+
+        exclamations, questions = self._extend(draft, offset, exclamations, questions)
+        self._draft = draft
+        words = self._words
+        if words and self._context[-1]:
+            self._score = self.analyzer.analyze_short_term(draft)
+            return self._score
+
+        # Capitalized words are emphasized only when the draft isn't all capitals
+        is_cap_diff = words and 0 < len(words) - self._capitals[-1] < len(words)
+        total = (self._emphasized if is_cap_diff else self._plain)[-1] if words else 0.0
+        # Same punctuation emphasis, normalization and rounding as the other scorers
+        self._score = compound((total,), exclamations, questions)
+        return self._score
+
+    def _extend(self, draft, offset, exclamations, questions):
+        """Tokenize the draft from a checkpoint at offset on; returns its '!' and '?' counts"""
+        spans = [(match.start(), match.end()) for match in _RAW_TOKEN.finditer(draft, offset)]
+        canonical = " ".join(draft[start:end] for start, end in spans)
+        matches = self._lexicon.scan(canonical)
+
+        # Rewrite and tokenize one segment (a raw token, or several a phrase match joins) at a time
+        segment_start = 0
+        position = 0
+        next_match = 0
+        for k, (start, end) in enumerate(spans):
+            position += end - start
+            spanning = next_match
+            while spanning < len(matches) and matches[spanning][1] <= position:
+                spanning += 1
+            if spanning < len(matches) and matches[spanning][0] < position:
+                # A phrase match spans the space after this token
+                position += 1
+                continue
+            parts = []
+            at = segment_start
+            while next_match < len(matches) and matches[next_match][1] <= position:
+                match_start, match_end, placeholder = matches[next_match]
+                parts.append(canonical[at:match_start])
+                parts.append(f" {placeholder} ")
+                at = match_end
+                next_match += 1
+            parts.append(canonical[at:position])
+            text = "".join(parts)
+            exclamations += text.count("!")
+            questions += text.count("?")
+            for raw in text.split():
+                # SentiText drops single characters
+                if len(raw) > 1:
+                    self._add(_strip_token(raw))
+            if k + 1 < len(spans):
+                self._checkpoints.append((spans[k + 1][0], len(self._words), exclamations, questions))
+            position += 1
+            segment_start = position
+        return exclamations, questions
+
+    def _add(self, token):
+        words = self._words
+        n = len(words)
+        word = token.lower()
+        is_upper = token.isupper()
+        valence = self._valence_of(word)
+        plain = self._plain[-1] if n else 0.0
+        emphasized = self._emphasized[-1] if n else 0.0
+        if valence is not None:
+            plain += valence
+            emphasized += (valence + VaderConstants.C_INCR if valence > 0 else valence - VaderConstants.C_INCR) \
+                if is_upper else valence
+        context = (n and self._context[-1]) or word in _CONTEXT_WORDS or "n't" in word
+        if not context and n:
+            # Idioms and multi-word boosters ending at this word
+            bigram = words[-1] + " " + word
+            context = bigram in _CONTEXT_NGRAMS or (n > 1 and words[-2] + " " + bigram in _CONTEXT_NGRAMS)
+        words.append(word)
+        self._capitals.append((self._capitals[-1] if n else 0) + is_upper)
+        self._plain.append(plain)
+        self._emphasized.append(emphasized)
+        self._context.append(bool(context))
@@ -0,0 +1,234 @@
+import argparse
+import os
+import random
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from emoji_suggester import EmojiSuggester
+from jsonl_io import JsonlWriter, iter_jsonl
+from paths import SENTIMENT_CONFIG_PATH
+from sentiment_analyzer import SentimentAnalyzer
+from sentiment_config import load_config
+from suggestion_cache import SuggestionCache
+
+# Headless suggestions for archived conversations: JSONL in, one suggestion record per
+# target message out, streamed chunk by chunk so memory stays bounded however long the
+# input is. Never imports tkinter, pandas or matplotlib.
+#
+#   python batch_suggestions.py conversations.jsonl.gz --workers 8 > suggestions.jsonl
+#   zcat archive.jsonl.gz | python -m batch_suggestions --target "User 2" --output out.jsonl.gz
+#
+# Each input line is a conversation: a list of {"speaker", "message"[, "timestamp"]} objects
+# (the test_conversations format) or {"conversation_id": ..., "messages": [...]}. Malformed
+# lines are skipped with a warning on stderr (--strict stops at the first one instead).
+
+NUM_SUGGESTIONS = 3
+
+
+def chunked(items, chunk_size, start=0):
+    """Group a stream into (index of first item, list) chunks"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+
+def ordered_imap(pool, fn, items, max_pending):
+    """Like pool.map, but yields (item, result) in order and keeps at most max_pending items in flight"""
+    pending = deque()
+    for item in items:
+        pending.append((item, pool.submit(fn, item)))
+        if len(pending) >= max_pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def _parse_conversation(conversation, idx):
+    """(conversation id, messages) of one input line; ValueError if it is malformed"""
+    if isinstance(conversation, ValueError):  # from iter_jsonl(keep_invalid=True)
+        raise ValueError(f"conversation {idx}: {conversation}")
+    if isinstance(conversation, dict):
+        conversation_id = conversation.get("conversation_id", conversation.get("id", idx))
+        messages = conversation.get("messages", [])
+    elif isinstance(conversation, list):
+        conversation_id, messages = idx, conversation
+    else:
+        raise ValueError(f"conversation {idx}: expected a list of messages or an object with \"messages\"")
+    if not isinstance(messages, list):
+        raise ValueError(f"conversation {idx}: \"messages\" is not a list")
+
+    for msg_idx, msg in enumerate(messages):
+        if not isinstance(msg, dict):
+            raise ValueError(f"conversation {idx}, message {msg_idx}: expected an object, got {type(msg).__name__}")
+        if not isinstance(msg.get("message"), str):
+            raise ValueError(f"conversation {idx}, message {msg_idx}: \"message\" is missing or not a string")
+        if msg.get("speaker") is None:
+            raise ValueError(f"conversation {idx}, message {msg_idx}: \"speaker\" is missing")
+        timestamp = msg.get("timestamp")
+        if timestamp is not None and (isinstance(timestamp, bool) or not isinstance(timestamp, (int, float))):
+            raise ValueError(f"conversation {idx}, message {msg_idx}: \"timestamp\" is not a number")
+    return conversation_id, messages
+
+
+def suggest_conversations(start_idx, conversations, analyzer, suggester, targets=None, seed=None,
+                          num_suggestions=NUM_SUGGESTIONS, strict=False):
+    """
+    Suggestion records for consecutive conversations, numbered from start_idx, and the
+    problems of the malformed ones, which are skipped (strict raises ValueError instead)
+    Every message is scored (all of a chunk in one analyze_many batch) and folded into its
+    speaker's long-term sentiment, which starts afresh with each conversation; messages from
+    targets (every speaker when None) get a record. With a seed, each record's suggestions
+    come from an RNG seeded by (seed, conversation, message), so they don't depend on how
+    the input was split across workers.
+    """
+    parsed = []
+    skipped = []
+    for idx, conversation in enumerate(conversations, start_idx):
+        try:
+            parsed.append((idx, *_parse_conversation(conversation, idx)))
+        except ValueError as e:
+            if strict:
+                raise
+            skipped.append(str(e))
+    # Each message is tokenized once; its features give both the score and the contextual emojis
+    features = [analyzer.features(msg["message"]) for _, _, messages in parsed for msg in messages]
+    analyzer.analyze_many(features)
+    features = iter(features)
+
+    results = []
+    for conversation_idx, conversation_id, messages in parsed:
+        analyzer.reset_long_term()
+        for msg_idx, msg in enumerate(messages):
+            message_features = next(features)
+            speaker = str(msg.get("speaker"))
+            short_term_sentiment = message_features.score
+            analyzer.add_long_term_score(speaker, short_term_sentiment, msg.get("timestamp"))
+            if targets is not None and speaker not in targets:
+                continue
+            long_term_sentiment = analyzer.get_long_term(speaker)
+            rng = random.Random(f"{seed}:{conversation_idx}:{msg_idx}") if seed is not None else None
+            results.append({
+                "conversation_id": conversation_id,
+                "message_id": msg_idx,
+                "speaker": speaker,
+                "message": msg.get("message"),
+                "short_term_sentiment": short_term_sentiment,
+                "long_term_sentiment": long_term_sentiment,
+                "suggestions": suggester.suggest(short_term_sentiment, long_term_sentiment, num_suggestions,
+                                                 rng=rng, features=message_features),
+            })
+    return results, skipped
+
+
+def build_pipeline(config_path=SENTIMENT_CONFIG_PATH):
+    """Analyzer and (bucket-cached) suggester sharing one sentiment config"""
+    config_source = load_config(config_path)
+    return SentimentAnalyzer(config=config_source), SuggestionCache(EmojiSuggester(config=config_source))
+
+
+# Per-process state for parallel runs, built once by _init_worker
+_worker = {}
+
+
+def _init_worker(config_path, targets, seed, num_suggestions, strict):
+    _worker["pipeline"] = build_pipeline(config_path)
+    _worker["options"] = {"targets": targets, "seed": seed, "num_suggestions": num_suggestions, "strict": strict}
+
+
+def _suggest_chunk(chunk):
+    start_idx, conversations = chunk
+    analyzer, suggester = _worker["pipeline"]
+    return suggest_conversations(start_idx, conversations, analyzer, suggester, **_worker["options"])
+
+
+def run(input_path, output_path, workers=1, chunk_size=256, targets=None, seed=None,
+        num_suggestions=NUM_SUGGESTIONS, config_path=SENTIMENT_CONFIG_PATH, strict=False):
+    """
+    Stream conversations from input_path ('-' for stdin) to suggestion records in output_path
+    ('-' for stdout, .gz to compress), in input order. At most 2 chunks per worker are in
+    flight at a time. Malformed conversations are skipped with a warning on stderr, or raise
+    ValueError when strict. Returns (conversations, records, skipped) processed.
+    """
+    chunks = chunked(iter_jsonl(input_path, keep_invalid=True), chunk_size)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(config_path, targets, seed, num_suggestions, strict))
+        scored = ordered_imap(pool, _suggest_chunk, chunks, max_pending=workers * 2)
+    else:
+        analyzer, suggester = build_pipeline(config_path)
+        scored = (
+            ((start, chunk), suggest_conversations(start, chunk, analyzer, suggester, targets, seed,
+                                                   num_suggestions, strict))
+            for start, chunk in chunks
+        )
+
+    conversations = 0
+    skipped = 0
+    try:
+        with JsonlWriter(output_path) as writer:
+            for (start, chunk), (results, problems) in scored:
+                for problem in problems:
+                    print(f"Skipping {problem}", file=sys.stderr)
+                skipped += len(problems)
+                for result in results:
+                    writer.write(result)
+                # Downstream consumers of a pipe see each chunk as soon as it is done
+                writer.flush()
+                conversations = start + len(chunk)
+            records = writer.count
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return conversations, records, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Suggest emojis for archived conversations (JSONL, one conversation per line) without the UI"
+    )
+    parser.add_argument("input", nargs="?", default="-", help="Conversations file (.jsonl or .jsonl.gz); - for stdin")
+    parser.add_argument("--output", default="-", help="Suggestions file (.jsonl or .jsonl.gz); - for stdout")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes to shard conversations across")
+    parser.add_argument("--chunk-size", type=int, default=256, help="Conversations per work unit")
+    parser.add_argument("--target", action="append", dest="targets",
+                        help="Only write records for this speaker's messages (repeatable; default: every speaker)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible suggestions")
+    parser.add_argument("--num-suggestions", type=int, default=NUM_SUGGESTIONS)
+    parser.add_argument("--config", default=SENTIMENT_CONFIG_PATH, help="Sentiment config (thresholds and weights)")
+    parser.add_argument("--strict", action="store_true",
+                        help="Stop at the first malformed conversation instead of skipping it")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        conversations, records, skipped = run(args.input, args.output, args.workers, args.chunk_size,
+                                              set(args.targets) if args.targets else None, args.seed,
+                                              args.num_suggestions, args.config, args.strict)
+    except ValueError as e:
+        print(f"Malformed input: {e}", file=sys.stderr)
+        return 1
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); silence the final flush of stdout too
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    elapsed = time.perf_counter() - started
+    # Progress goes to stderr so stdout stays pure JSONL
+    print(f"Wrote {records} suggestion records for {conversations} conversations in {elapsed:.1f}s",
+          file=sys.stderr)
+    if skipped:
+        print(f"Skipped {skipped} malformed conversations", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
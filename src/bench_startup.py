@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Each snippet runs in a fresh interpreter and prints its timings as JSON
+LEGACY_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+try:
+    import textblob
+except ImportError:
+    pass
+import nltk
+try:
+    nltk.data.find('vader_lexicon')
+except LookupError:
+    pass
+from nltk.sentiment.vader import SentimentIntensityAnalyzer
+t1 = time.perf_counter()
+sia = SentimentIntensityAnalyzer()
+t2 = time.perf_counter()
+sia.polarity_scores("That's wonderful news!")
+t3 = time.perf_counter()
+print(json.dumps({"import": t1 - t0, "construct": t2 - t1, "first_score": t3 - t2}))
+"""
+
+CURRENT_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+from sentiment_analyzer import SentimentAnalyzer
+t1 = time.perf_counter()
+analyzer = SentimentAnalyzer(warm_up={warm_up})
+t2 = time.perf_counter()
+analyzer.analyze_short_term("That's wonderful news!")
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "construct": t2 - t1, "first_score": t3 - t2}}))
+"""
+
+
+def run_snippet(snippet):
+    output = subprocess.run(
+        [sys.executable, "-c", snippet], cwd=SRC_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def benchmark(snippet, runs):
+    samples = [run_snippet(snippet) for _ in range(runs)]
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure SentimentAnalyzer cold start in fresh interpreters")
+    parser.add_argument("--runs", type=int, default=5, help="Interpreter launches per configuration")
+    args = parser.parse_args()
+
+    # Make sure the prebuilt lexicon artifact exists before timing the current path
+    run_snippet(CURRENT_SNIPPET.format(warm_up=False))
+
+    results = {
+        "legacy (eager nltk)": benchmark(LEGACY_SNIPPET, args.runs),
+        "lazy": benchmark(CURRENT_SNIPPET.format(warm_up=False), args.runs),
+        "lazy + warm-up": benchmark(CURRENT_SNIPPET.format(warm_up=True), args.runs),
+    }
+
+    print(f"{'configuration':<22}{'import':>10}{'construct':>12}{'first score':>14}{'total':>10}  (ms, median of {args.runs})")
+    for name, timings in results.items():
+        total = sum(timings.values())
+        print(f"{name:<22}{timings['import'] * 1000:>10.1f}{timings['construct'] * 1000:>12.1f}"
+              f"{timings['first_score'] * 1000:>14.1f}{total * 1000:>10.1f}")
+
+    legacy = results["legacy (eager nltk)"]
+    lazy = results["lazy"]
+    speedup = (legacy["import"] + legacy["construct"]) / max(lazy["import"] + lazy["construct"], 1e-9)
+    print(f"Import + construction speedup: {speedup:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
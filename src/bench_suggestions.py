@@ -0,0 +1,277 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from batch_scoring import DraftScorer
+from chat_processor import ChatProcessor
+from emoji_suggester import EmojiSuggester, blend_draft
+from paths import DATA_DIR
+from sentiment_analyzer import SentimentAnalyzer
+from synthetic_corpus import generate_conversations, generate_messages
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASELINE_PATH = os.path.join(DATA_DIR, 'benchmarks', 'baseline.json')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it can't be read"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+# Rounds per benchmark; the fastest round is reported, which filters out scheduler noise
+ROUNDS = 3
+
+
+def measure(func, inputs, rounds=ROUNDS):
+    """
+    Call func on every input, timing each call, for several rounds
+    Returns p50/p99 latency in microseconds and calls per second of the fastest round
+    """
+    best = None
+    for _ in range(rounds):
+        latencies = []
+        gc.collect()
+        started = time.perf_counter()
+        for item in inputs:
+            t0 = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1e6
+
+        timings = {
+            "calls": len(latencies),
+            "p50_us": percentile(0.50),
+            "p99_us": percentile(0.99),
+            "throughput_per_s": len(latencies) / elapsed if elapsed else 0.0,
+        }
+        if best is None or timings["throughput_per_s"] > best["throughput_per_s"]:
+            best = timings
+    return best
+
+
+def bench_short_term(args):
+    messages = generate_messages(args.messages, seed=args.seed, vocabulary=args.vocabulary)
+    # No cache: every call runs VADER
+    uncached = SentimentAnalyzer(cache_size=0)
+    uncached.analyze_short_term(messages[0])
+    results = {"analyze_short_term (uncached)": measure(uncached.analyze_short_term, messages, args.rounds)}
+
+    # Cache big enough for the whole corpus, scored once to warm it
+    cached = SentimentAnalyzer(cache_size=2 * len(messages), cache_bytes=1 << 30)
+    for message in messages:
+        cached.analyze_short_term(message)
+    results["analyze_short_term (cached)"] = measure(cached.analyze_short_term, messages, args.rounds)
+    return results
+
+
+def bench_long_term(args):
+    analyzer = SentimentAnalyzer(cache_size=0)
+    rng = random.Random(args.seed)
+    results = {}
+    for window_size in args.window_sizes:
+        histories = [
+            generate_messages(window_size, seed=rng.random(), vocabulary=args.vocabulary)
+            for _ in range(max(1, args.messages // (window_size * 10)))
+        ]
+        results[f"analyze_long_term (window={window_size})"] = measure(
+            lambda history: analyzer.analyze_long_term(history, window_size), histories, args.rounds
+        )
+        results[f"update_long_term (window={window_size})"] = _bench_update_long_term(
+            window_size, histories[0], args.messages, args.rounds
+        )
+    return results
+
+
+def _bench_update_long_term(window_size, history, count, rounds):
+    # Incremental path: one new message folded into an existing window (scores come from the cache)
+    analyzer = SentimentAnalyzer(window_size=window_size)
+    for message in history:
+        analyzer.update_long_term("User 2", message)
+    messages = [history[i % len(history)] for i in range(count)]
+    return measure(lambda message: analyzer.update_long_term("User 2", message), messages, rounds)
+
+
+def bench_suggest(args):
+    suggester = EmojiSuggester(seed=args.seed)
+    rng = random.Random(args.seed)
+    sentiments = [(rng.uniform(-1, 1), rng.uniform(-1, 1)) for _ in range(args.messages)]
+    return {"EmojiSuggester.suggest": measure(lambda pair: suggester.suggest(*pair), sentiments, args.rounds)}
+
+
+def bench_get_conversation(args):
+    results = {}
+    for history_size in args.history_sizes:
+        chat_processor = ChatProcessor(per_user_capacity=history_size, global_capacity=history_size)
+        for idx, message in enumerate(generate_messages(history_size, seed=args.seed)):
+            chat_processor.add_message("User 1" if idx % 2 == 0 else "User 2", message)
+        results[f"ChatProcessor.get_conversation (history={history_size})"] = measure(
+            lambda _: chat_processor.get_conversation(), range(min(args.messages, 10000)), args.rounds
+        )
+    return results
+
+
+def bench_end_to_end(args):
+    """Per-message latency of what the app does on send: extract features, store, score, update long-term, suggest"""
+    analyzer = SentimentAnalyzer()
+    suggester = EmojiSuggester(seed=args.seed)
+    chat_processor = ChatProcessor()
+    messages = [
+        (msg_data["speaker"], msg_data["message"])
+        for conversation in generate_conversations(max(1, args.messages // 6), seed=args.seed)
+        for msg_data in conversation
+    ]
+
+    def send(item):
+        speaker, message = item
+        features = analyzer.features(message)
+        record = chat_processor.add_message(speaker, message, features=features)
+        record.score = analyzer.update_long_term(speaker, features)
+        state = analyzer.long_term_state(speaker)
+        suggester.suggest(state.last_score, state.value, features=features)
+
+    return {"end-to-end message": measure(send, messages, args.rounds)}
+
+
+def keystroke_streams(messages, seed=None, typo_rate=0.05):
+    """Scripted typing: every intermediate draft of each message, with occasional backspaces"""
+    rng = random.Random(seed)
+    for message in messages:
+        draft = ""
+        for char in message:
+            if draft and rng.random() < typo_rate:
+                draft = draft[:-1]
+                yield draft
+            draft += char
+            yield draft
+        yield ""
+
+
+def bench_typing(args):
+    """Per-keystroke latency of as-you-type suggestions: incremental draft score, blend, suggest"""
+    analyzer = SentimentAnalyzer()
+    draft_scorer = DraftScorer(analyzer)
+    suggester = EmojiSuggester(seed=args.seed)
+    analyzer.update_long_term("User 2", "I'm looking forward to our next meeting!")
+    state = analyzer.long_term_state("User 2")
+    drafts = list(keystroke_streams(generate_messages(max(1, args.messages // 25), seed=args.seed,
+                                                      vocabulary=args.vocabulary), seed=args.seed))
+
+    def keystroke(draft):
+        draft_sentiment = draft_scorer.score(draft) if draft.strip() else None
+        suggester.suggest(blend_draft(state.last_score, draft_sentiment), state.value)
+
+    return {"keystroke (draft score + suggest)": measure(keystroke, drafts, args.rounds)}
+
+
+BENCHMARKS = {
+    "short_term": bench_short_term,
+    "long_term": bench_long_term,
+    "suggest": bench_suggest,
+    "get_conversation": bench_get_conversation,
+    "end_to_end": bench_end_to_end,
+    "typing": bench_typing,
+}
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks whose p50, p99 or throughput got worse than the baseline by more than tolerance"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for key in ("p50_us", "p99_us"):
+            if previous[key] > 0 and current[key] > previous[key] * (1 + tolerance):
+                regressions.append((name, key, previous[key], current[key]))
+        key = "throughput_per_s"
+        if current[key] < previous[key] * (1 - tolerance):
+            regressions.append((name, key, previous[key], current[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the emoji suggestion hot path on a synthetic corpus")
+    parser.add_argument("--messages", type=int, default=20000, help="Corpus size (messages per benchmark)")
+    parser.add_argument("--vocabulary", type=int, default=5000,
+                        help="Synthetic words mixed into messages so they aren't all cache hits (0 disables)")
+    parser.add_argument("--window-sizes", type=int, nargs="+", default=[5, 10, 50, 100])
+    parser.add_argument("--history-sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=ROUNDS, help="Timed rounds per benchmark (best is kept)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Save this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Relative slowdown allowed before a benchmark is flagged")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file")
+    parser.add_argument("--keystroke-budget-ms", type=float, default=5.0,
+                        help="p99 latency allowed per keystroke for as-you-type suggestions")
+    args = parser.parse_args()
+
+    results = {}
+    for name, bench in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        results.update(bench(args))
+
+    print(f"{'benchmark':<52}{'p50 us':>10}{'p99 us':>10}{'ops/s':>12}")
+    for name, timings in results.items():
+        print(f"{name:<52}{timings['p50_us']:>10.1f}{timings['p99_us']:>10.1f}{timings['throughput_per_s']:>12.0f}")
+    rss = peak_rss_mb()
+    if rss is not None:
+        print(f"Peak RSS: {rss:.1f} MB")
+
+    run = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "messages": args.messages,
+        "peak_rss_mb": rss,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+
+    regressions = []
+    for name, timings in results.items():
+        if name.startswith("keystroke") and timings["p99_us"] > args.keystroke_budget_ms * 1000:
+            print(f"OVER BUDGET {name}: p99 {timings['p99_us'] / 1000:.2f} ms > {args.keystroke_budget_ms} ms")
+            regressions.append((name, "p99_us", args.keystroke_budget_ms * 1000, timings["p99_us"]))
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        slower = compare(results, baseline["results"], args.tolerance)
+        for name, key, before, after in slower:
+            print(f"REGRESSION {name}: {key} {before:.1f} -> {after:.1f}")
+        if not slower:
+            print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+        regressions.extend(slower)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MANIFEST_NAME = 'chart_manifest.json'
+
+# Bump to re-render every chart after changing how they are drawn
+RENDER_VERSION = 1
+
+# matplotlib and seaborn are only imported once a chart is actually rendered (see
+# _load_plotting), so a run where every chart is up to date never loads them
+plt = None
+sns = None
+
+
+def _load_plotting():
+    global plt, sns
+    if plt is not None:
+        return
+    import matplotlib
+    # Charts are only ever written to files, so render headlessly
+    matplotlib.use('Agg')
+    import matplotlib.pyplot
+    import seaborn
+    plt, sns = matplotlib.pyplot, seaborn
+
+
+def _bar_chart(data, figsize, title, xlabel, ylabel):
+    fig = plt.figure(figsize=figsize)
+    sns.barplot(x=data['labels'], y=data['values'], order=data['order'])
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.xticks(rotation=45)
+    return fig
+
+
+def render_sentiment_distribution(data):
+    return _bar_chart(data, (10, 6), 'Distribution of Sentiment Categories', 'Sentiment Category', 'Count')
+
+
+def render_accuracy_by_sentiment(data):
+    return _bar_chart(data, (10, 6), 'Emoji Suggestion Accuracy by Sentiment Category',
+                      'Sentiment Category', 'Accuracy')
+
+
+def render_confusion_matrix(data):
+    fig = plt.figure(figsize=(10, 8))
+    sns.heatmap(data['matrix'], annot=True, fmt='d', cmap='Blues',
+                xticklabels=data['labels'],
+                yticklabels=data['labels'])
+    plt.title('Confusion Matrix: Expected vs. Suggested Emoji Categories')
+    plt.xlabel('Suggested Emoji Category')
+    plt.ylabel('Expected Emoji Category')
+    return fig
+
+
+def render_emoji_sentiment_distribution(data):
+    fig = plt.figure(figsize=(12, 8))
+    sns.heatmap(data['table'], annot=True, fmt='d', cmap='YlGnBu')
+    plt.title('Distribution of Emoji Categories by Sentiment')
+    plt.xlabel('Emoji Category')
+    plt.ylabel('Sentiment Category')
+    return fig
+
+
+def render_sentiment_comparison(data):
+    fig = plt.figure(figsize=(10, 8))
+    sns.scatterplot(
+        x=data['short_term'],
+        y=data['long_term'],
+        hue=data['category'],
+        hue_order=data['order'],
+        palette='viridis'
+    )
+    plt.title('Short-term vs. Long-term Sentiment')
+    plt.xlabel('Short-term Sentiment')
+    plt.ylabel('Long-term Sentiment')
+    plt.grid(True, linestyle='--', alpha=0.7)
+    return fig
+
+
+def render_match_percentage_distribution(data):
+    fig = plt.figure(figsize=(10, 6))
+    # Match percentages take few distinct values, so they travel as (value, count) pairs;
+    # expanded again here so the KDE bandwidth matches the full data
+    sns.histplot(np.repeat(data['values'], data['counts']), bins=10, kde=True)
+    plt.title('Distribution of Emoji-Sentiment Match Percentages')
+    plt.xlabel('Match Percentage')
+    plt.ylabel('Count')
+    return fig
+
+
+# Chart name -> (file name, title used in the report, renderer)
+CHARTS = {
+    'sentiment_distribution': ('sentiment_distribution.png', 'Sentiment Distribution',
+                               render_sentiment_distribution),
+    'accuracy_by_sentiment': ('accuracy_by_sentiment.png', 'Accuracy by Sentiment',
+                              render_accuracy_by_sentiment),
+    'confusion_matrix': ('confusion_matrix.png', 'Confusion Matrix', render_confusion_matrix),
+    'emoji_sentiment_distribution': ('emoji_sentiment_distribution.png', 'Emoji-Sentiment Distribution',
+                                     render_emoji_sentiment_distribution),
+    'sentiment_comparison': ('sentiment_comparison.png', 'Short-term vs. Long-term Sentiment',
+                             render_sentiment_comparison),
+    'match_percentage_distribution': ('match_percentage_distribution.png', 'Match Percentage Distribution',
+                                      render_match_percentage_distribution),
+}
+
+
+def data_hash(name, data):
+    """Fingerprint of a chart's input data (and of how it is drawn)"""
+    digest = hashlib.sha256()
+    digest.update(f'{name}:{RENDER_VERSION}:'.encode('utf-8'))
+    digest.update(pickle.dumps(data, protocol=4))
+    return digest.hexdigest()
+
+
+def render_chart(name, data, path):
+    """Render one chart to a PNG file and free its figure"""
+    _load_plotting()
+    fig = CHARTS[name][2](data)
+    try:
+        fig.tight_layout()
+        fig.savefig(path)
+    finally:
+        plt.close(fig)
+    return path
+
+
+def _load_manifest(out_dir):
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def render_charts(chart_data, out_dir, workers=None):
+    """
+    Render charts whose input changed since the last run, in a process pool.
+    chart_data maps chart names (see CHARTS) to their input data. A chart is skipped
+    when its PNG exists and its data hash matches the manifest from the previous run.
+    Returns {chart name: data hash} for every chart, and the names that were rendered.
+    """
+    manifest = _load_manifest(out_dir)
+    hashes = {name: data_hash(name, data) for name, data in chart_data.items()}
+    stale = [
+        name for name in chart_data
+        if manifest.get(name) != hashes[name] or not os.path.exists(os.path.join(out_dir, CHARTS[name][0]))
+    ]
+
+    jobs = [(name, chart_data[name], os.path.join(out_dir, CHARTS[name][0])) for name in stale]
+    if workers == 1 or len(jobs) <= 1:
+        for job in jobs:
+            render_chart(*job)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(jobs))) as pool:
+            # Surface the first rendering error, if any
+            list(pool.map(render_chart, *zip(*jobs)))
+
+    manifest.update(hashes)
+    tmp_path = os.path.join(out_dir, MANIFEST_NAME + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_NAME))
+    return hashes, stale
@@ -1,49 +1,130 @@
+import time
+from collections import deque
+from collections.abc import Mapping
+from itertools import islice
+
+import metrics
+
+class Message:
+    """
+    A single chat message; score holds its cached sentiment once computed, and features
+    its MessageFeatures (see message_features.py) once extracted
+    """
+
+    __slots__ = ("seq", "timestamp", "speaker", "text", "score", "features")
+
+    def __init__(self, seq, timestamp, speaker, text, score=None, features=None):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.speaker = speaker
+        self.text = text
+        self.score = score
+        self.features = features
+
+    def __repr__(self):
+        return f"Message({self.seq}, {self.speaker!r}, {self.text!r}, score={self.score})"
+
+def _last(records, count):
+    """The last count items of a deque, oldest first, in O(count)"""
+    if count <= 0:
+        return []
+    recent = list(islice(reversed(records), count))
+    recent.reverse()
+    return recent
+
+class MessagesView(Mapping):
+    """
+    Read-only, live view of the retained message texts grouped by user (the old messages dict)
+    Each user maps to a tuple of texts, so writes raise instead of being silently lost;
+    add messages with ChatProcessor.add_message
+    """
+
+    __slots__ = ("_user_messages",)
+
+    def __init__(self, user_messages):
+        self._user_messages = user_messages
+
+    def __getitem__(self, user):
+        return tuple(record.text for record in self._user_messages[user])
+
+    def __iter__(self):
+        return iter(self._user_messages)
+
+    def __len__(self):
+        return len(self._user_messages)
+
+    def __repr__(self):
+        return f"MessagesView({dict(self)!r})"
+
 class ChatProcessor:
-    def __init__(self):
-        # Store messages by user
-        self.messages = {
-            "User 1": [],
-            "User 2": []
-        }
+    def __init__(self, per_user_capacity=1000, global_capacity=10000, with_defaults=True):
+        # Ring buffers: each user's recent messages, plus one append-ordered log across users
+        self.per_user_capacity = per_user_capacity
+        self.global_capacity = global_capacity
+        self.user_messages = {}
+        self.log = deque(maxlen=global_capacity)
+        self._next_seq = 0
+
         # Add default messages to ensure emoji suggestions from the start
+        # (skipped with with_defaults=False, e.g. for real conversations served by the session manager)
         self.default_messages = {
             "User 1": ["Hello", "How are you?"],
             "User 2": ["Hi there", "I'm doing well"]
-        }
-        
+        } if with_defaults else {}
+
         # Initialize with default messages
+        self._add_defaults()
+
+    def _add_defaults(self):
         for user, msgs in self.default_messages.items():
-            self.messages[user] = msgs.copy()
-    
-    def add_message(self, user, message):
-        """Add a message to the user's message history"""
-        if user in self.messages:
-            self.messages[user].append(message)
-        else:
-            self.messages[user] = [message]
-    
+            for msg in msgs:
+                self.add_message(user, msg)
+
+    @metrics.timed("chat_add_message", event="messages")
+    def add_message(self, user, message, timestamp=None, score=None, features=None):
+        """Add a message to the user's message history and return its record"""
+        record = Message(self._next_seq, time.time() if timestamp is None else timestamp, user, message, score,
+                         features)
+        self._next_seq += 1
+
+        user_records = self.user_messages.get(user)
+        if user_records is None:
+            user_records = self.user_messages[user] = deque(maxlen=self.per_user_capacity)
+        user_records.append(record)
+        self.log.append(record)
+        return record
+
+    def get_recent_records(self, user, count=10):
+        """Get the most recent message records from a specific user"""
+        if user not in self.user_messages:
+            return []
+
+        return _last(self.user_messages[user], count)
+
     def get_recent_messages(self, user, count=10):
         """Get the most recent messages from a specific user"""
-        if user not in self.messages:
-            return []
-        
-        return self.messages[user][-count:]
-    
+        return [record.text for record in self.get_recent_records(user, count)]
+
+    @metrics.timed("chat_get_conversation")
     def get_conversation(self, count=20):
-        """Get the most recent messages from the conversation (all users)"""
-        all_messages = []
-        for user, msgs in self.messages.items():
-            for msg in msgs:
-                all_messages.append((user, msg))
-        
-        # Sort by assumed timestamp (just by order added in this simple implementation)
-        return all_messages[-count:]
-        
+        """Get the most recent messages from the conversation (all users), in chronological order"""
+        return [(record.speaker, record.text) for record in _last(self.log, count)]
+
+    def iter_records(self):
+        """Every retained message record across users, oldest first"""
+        return iter(self.log)
+
+    @property
+    def messages(self):
+        """Retained message texts grouped by user, as a read-only MessagesView"""
+        return MessagesView(self.user_messages)
+
     def reset_conversation(self):
         """Reset the conversation to initial state with default messages"""
-        for user, msgs in self.default_messages.items():
-            self.messages[user] = msgs.copy()
-            
+        self.user_messages.clear()
+        self.log.clear()
+        self._add_defaults()
+
     def has_messages(self, user):
         """Check if a user has any messages"""
-        return user in self.messages and len(self.messages[user]) > 0
\ No newline at end of file
+        return user in self.user_messages and len(self.user_messages[user]) > 0
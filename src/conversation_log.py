@@ -0,0 +1,483 @@
+import argparse
+import mmap
+import os
+import pickle
+import struct
+import time
+import zlib
+from array import array
+from collections import deque
+from contextlib import contextmanager
+
+# Durable, append-only log of one conversation. Every message is stored with the sentiment
+# score it was given, and the long-term sentiment state is snapshotted every so often, so a
+# conversation is restored from disk without running VADER again: load the latest snapshot,
+# then replay only the records written after it (plus whatever the ring buffers retain).
+
+MAGIC = b'EMOJILOG'
+# Bump when the record or snapshot layout changes
+LOG_VERSION = 1
+FILE_HEADER = struct.Struct('<8sI')
+DATA_START = FILE_HEADER.size
+
+# Record: payload length and CRC32, then the payload: kind (always MESSAGE so far), timestamp,
+# score, speaker length, speaker and text (both UTF-8). A torn or corrupt record ends the log.
+RECORD_HEADER = struct.Struct('<II')
+RECORD_FIELDS = struct.Struct('<BddH')
+
+MESSAGE = 0
+
+# Sidecar index (<log>.index): one entry per block of at least INDEX_BLOCK_BYTES of records,
+# framed like a record, with the block's span, record count, the CRC32 of all its bytes and
+# the speakers in it. Opening a log checks whole blocks with one CRC each instead of walking
+# every record, and a replay without a snapshot only decodes the blocks it needs. The index is
+# just an accelerator: whatever it doesn't cover, or no longer matches, is walked record by
+# record and indexed again.
+INDEX_MAGIC = b'EMOJIIDX'
+INDEX_BLOCK_BYTES = 1 << 20
+INDEX_FIELDS = struct.Struct('<QQII')
+SPEAKER_LENGTH = struct.Struct('<H')
+
+
+def snapshot_path(path):
+    return path + '.snapshot'
+
+
+def index_path(path):
+    return path + '.index'
+
+
+def remove(path):
+    """Delete a log, its snapshot and its index"""
+    for name in (path, snapshot_path(path), index_path(path)):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def _index(buf, pos, end):
+    """Start offsets of the valid records from pos on, and the offset the last one ends at"""
+    header_size = RECORD_HEADER.size
+    fields_size = RECORD_FIELDS.size
+    unpack_header = RECORD_HEADER.unpack_from
+    crc32 = zlib.crc32
+    offsets = array('Q')
+    append = offsets.append
+    while pos + header_size <= end:
+        length, checksum = unpack_header(buf, pos)
+        body = pos + header_size
+        stop = body + length
+        if length < fields_size or stop > end or crc32(buf[body:stop]) != checksum:
+            break
+        append(pos)
+        pos = stop
+    return offsets, pos
+
+
+class Block:
+    """One index entry: records start <= offset < end, their CRC32 and speakers (UTF-8 bytes)"""
+
+    __slots__ = ("start", "end", "records", "crc", "speakers", "index_end")
+
+    def __init__(self, start, end, records, crc, speakers, index_end):
+        self.start = start
+        self.end = end
+        self.records = records
+        self.crc = crc
+        self.speakers = speakers
+        # Where the entry ends in the index file
+        self.index_end = index_end
+
+
+def _read_index(path, size):
+    """The index entries of a log, as Blocks that follow on from each other and lie within its first size bytes"""
+    try:
+        with open(index_path(path), 'rb') as f:
+            data = f.read()
+    except OSError:
+        return []
+    if len(data) < DATA_START or FILE_HEADER.unpack_from(data) != (INDEX_MAGIC, LOG_VERSION):
+        return []
+    blocks = []
+    pos = DATA_START
+    expected_start = DATA_START
+    while pos + RECORD_HEADER.size <= len(data):
+        length, checksum = RECORD_HEADER.unpack_from(data, pos)
+        body = pos + RECORD_HEADER.size
+        stop = body + length
+        if length < INDEX_FIELDS.size or stop > len(data) or zlib.crc32(data[body:stop]) != checksum:
+            break
+        start, end, records, crc = INDEX_FIELDS.unpack_from(data, body)
+        if start != expected_start or end > size:
+            break
+        speakers = []
+        at = body + INDEX_FIELDS.size
+        while at < stop:
+            (speaker_length,) = SPEAKER_LENGTH.unpack_from(data, at)
+            at += SPEAKER_LENGTH.size
+            speakers.append(data[at:at + speaker_length])
+            at += speaker_length
+        blocks.append(Block(start, end, records, crc, frozenset(speakers), stop))
+        expected_start = end
+        pos = stop
+    return blocks
+
+
+def _decoder():
+    """Decode an already validated record at an offset into (kind, timestamp, score, speaker, text)"""
+    body = RECORD_HEADER.size
+    text_start = body + RECORD_FIELDS.size
+    unpack_header = RECORD_HEADER.unpack_from
+    unpack_fields = RECORD_FIELDS.unpack_from
+    # Few distinct speakers: decode each once and share the string
+    speakers = {}
+
+    def decode(buf, pos):
+        length, _ = unpack_header(buf, pos)
+        kind, timestamp, score, speaker_length = unpack_fields(buf, pos + body)
+        speaker_end = pos + text_start + speaker_length
+        speaker_bytes = buf[pos + text_start:speaker_end]
+        speaker = speakers.get(speaker_bytes)
+        if speaker is None:
+            speaker = speakers[speaker_bytes] = speaker_bytes.decode('utf-8')
+        return kind, timestamp, score, speaker, buf[speaker_end:pos + body + length].decode('utf-8')
+
+    return decode
+
+
+class ConversationLog:
+    """
+    Append-only binary log of one conversation's scored messages (see the module comment).
+    snapshot_every: records between snapshots of the long-term sentiment state
+    retain: how many of the latest messages restore() puts back into the ChatProcessor
+            (its global capacity)
+    sync: fsync after every record instead of only at snapshots
+    ignore_snapshot: replay the whole log even if there is a snapshot
+    """
+
+    def __init__(self, path, snapshot_every=1000, retain=10000, sync=False, ignore_snapshot=False):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+        # Start offsets of the latest retained records, so snapshots know where the retained window begins
+        self.recent_offsets = deque(maxlen=retain)
+        self.since_snapshot = 0
+        # Indexed blocks, and the block being filled (from _block_start to the end of the log)
+        self.blocks = []
+        self._block_start = DATA_START
+        self._block_records = 0
+        self._block_crc = 0
+        self._block_speakers = set()
+        self._file = None
+        self._index_file = None
+        self._snapshot = None if ignore_snapshot else self._load_snapshot()
+        self._open()
+
+    def _load_snapshot(self):
+        try:
+            with open(snapshot_path(self.path), 'rb') as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get('version') != LOG_VERSION:
+            return None
+        return snapshot
+
+    def _open(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < DATA_START:
+            with open(self.path, 'wb') as f:
+                f.write(FILE_HEADER.pack(MAGIC, LOG_VERSION))
+            self._snapshot = None
+
+        self._file = open(self.path, 'r+b')
+        magic, version = FILE_HEADER.unpack(self._file.read(DATA_START))
+        if magic != MAGIC or version != LOG_VERSION:
+            self._file.close()
+            raise ValueError(f"{self.path} is not a version {LOG_VERSION} conversation log")
+
+        # Records before the snapshot were complete when it was taken, so only indexed blocks
+        # reaching past it are checked (one CRC each), then the unindexed tail record by record
+        size = os.fstat(self._file.fileno()).st_size
+        trusted = DATA_START
+        if self._snapshot is not None:
+            if self._snapshot['offset'] <= size:
+                trusted = self._snapshot['offset']
+            else:
+                # The log lost records the snapshot had seen (e.g. an unsynced tail after a power cut)
+                self._snapshot = None
+        blocks = _read_index(self.path, size)
+        with self._mapped() as mapped:
+            if mapped is None:
+                blocks = []
+            else:
+                with memoryview(mapped) as view:
+                    for k, block in enumerate(blocks):
+                        if block.end > trusted and zlib.crc32(view[block.start:block.end]) != block.crc:
+                            del blocks[k:]
+                            break
+            self.blocks = blocks
+            self._open_index()
+            end = DATA_START
+            if mapped is not None:
+                tail, end = _index(mapped, self._block_start, size)
+                self._index_tail(mapped, tail, end)
+        if end < size:
+            # Drop a record torn by a crash mid-write; appends continue after the last valid one
+            self._file.truncate(end)
+        if self._snapshot is not None and self._snapshot['offset'] > end:
+            # A block the snapshot relied on turned out to be corrupt
+            self._snapshot = None
+        self._file.seek(end)
+        self.end = end
+
+    def _open_index(self):
+        """Open the index for appending after self.blocks, rewriting it if it has nothing worth keeping"""
+        path = index_path(self.path)
+        if self.blocks:
+            self._index_file = open(path, 'r+b')
+            self._index_file.truncate(self.blocks[-1].index_end)
+            self._index_file.seek(self.blocks[-1].index_end)
+        else:
+            self._index_file = open(path, 'wb')
+            self._index_file.write(FILE_HEADER.pack(INDEX_MAGIC, LOG_VERSION))
+            self._index_file.flush()
+        self._block_start = self.blocks[-1].end if self.blocks else DATA_START
+        self._block_records = 0
+        self._block_crc = 0
+        self._block_speakers = set()
+
+    def _index_tail(self, mapped, offsets, end):
+        """Index validated records at offsets (the last one ending at end) that no block covers yet"""
+        speaker_at = RECORD_HEADER.size + RECORD_FIELDS.size
+        speakers = self._block_speakers
+        first = 0
+        with memoryview(mapped) as view:
+            for k, pos in enumerate(offsets):
+                speaker_length = mapped[pos + speaker_at - 2] | mapped[pos + speaker_at - 1] << 8
+                speakers.add(mapped[pos + speaker_at:pos + speaker_at + speaker_length])
+                stop = offsets[k + 1] if k + 1 < len(offsets) else end
+                if stop - self._block_start >= INDEX_BLOCK_BYTES:
+                    self._block_records = k + 1 - first
+                    self._block_crc = zlib.crc32(view[self._block_start:stop])
+                    self._close_block(stop)
+                    speakers = self._block_speakers
+                    first = k + 1
+            self._block_records = len(offsets) - first
+            self._block_crc = zlib.crc32(view[self._block_start:end])
+
+    def _track(self, record, speaker_bytes, end):
+        """Add an appended record ending at end to the block being filled, closing the block once it is big enough"""
+        self._block_crc = zlib.crc32(record, self._block_crc)
+        self._block_records += 1
+        self._block_speakers.add(speaker_bytes)
+        if end - self._block_start >= INDEX_BLOCK_BYTES:
+            self._close_block(end)
+
+    def _close_block(self, end):
+        """Write the index entry of the block being filled, which ends at end, and start the next one"""
+        speakers = sorted(self._block_speakers)
+        payload = INDEX_FIELDS.pack(self._block_start, end, self._block_records, self._block_crc) + b''.join(
+            SPEAKER_LENGTH.pack(len(speaker)) + speaker for speaker in speakers
+        )
+        # Like the log, flushed but only fsynced by the OS; an entry that outlived its block fails its CRC
+        self._index_file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+        self._index_file.flush()
+        self.blocks.append(Block(self._block_start, end, self._block_records, self._block_crc,
+                                 frozenset(speakers), self._index_file.tell()))
+        self._block_start = end
+        self._block_records = 0
+        self._block_crc = 0
+        self._block_speakers = set()
+
+    @property
+    def empty(self):
+        return self.end == DATA_START
+
+    @contextmanager
+    def _mapped(self):
+        """Read-only memory map of the log (None while it has no records), so replay reads straight from the page cache"""
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size <= DATA_START:
+                yield None
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def records(self, start=DATA_START):
+        """Yield (offset, kind, timestamp, score, speaker, text) for the valid records from start"""
+        with self._mapped() as mapped:
+            if mapped is None:
+                return
+            offsets, _ = _index(mapped, start, min(self.end, len(mapped)))
+            decode = _decoder()
+            for offset in offsets:
+                yield (offset,) + decode(mapped, offset)
+
+    def _append(self, kind, speaker, text, score, timestamp):
+        speaker_bytes = speaker.encode('utf-8')
+        payload = RECORD_FIELDS.pack(kind, timestamp, score, len(speaker_bytes)) + speaker_bytes + text.encode('utf-8')
+        offset = self.end
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        self._file.write(record)
+        # Flushed per record so a crash of this process loses nothing; fsync only if asked
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+        self.end = offset + len(record)
+        self._track(record, speaker_bytes, self.end)
+        self.since_snapshot += 1
+        return offset
+
+    def append(self, speaker, text, score, timestamp=None):
+        """Append a scored message and return its offset"""
+        offset = self._append(MESSAGE, speaker, text, score, time.time() if timestamp is None else timestamp)
+        self.recent_offsets.append(offset)
+        return offset
+
+    def snapshot_due(self):
+        return self.since_snapshot >= self.snapshot_every
+
+    def snapshot(self, long_term_states):
+        """Durably save the long-term states as of the end of the log"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        snapshot = {
+            'version': LOG_VERSION,
+            'offset': self.end,
+            'retained_from': self.recent_offsets[0] if self.recent_offsets else self.end,
+            'states': long_term_states,
+        }
+        path = snapshot_path(self.path)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self.since_snapshot = 0
+
+    def restore(self, chat_processor, long_term_states, state_for):
+        """
+        Rebuild a conversation from a freshly opened log: the snapshot's long-term states, the
+        records after it folded in, and the retained messages put back into chat_processor
+        long_term_states is the {user: LongTermSentiment} dict to fill, state_for(user) returns
+        (creating if needed) a user's state. Returns the number of records replayed.
+        """
+        if self._snapshot is None:
+            return self._restore_without_snapshot(chat_processor, long_term_states, state_for)
+
+        long_term_states.clear()
+        long_term_states.update(self._snapshot['states'])
+        state_from = self._snapshot['offset']
+        replayed = 0
+        for offset, _, timestamp, score, speaker, text in self.records(self._snapshot['retained_from']):
+            replayed += 1
+            chat_processor.add_message(speaker, text, timestamp, score)
+            self.recent_offsets.append(offset)
+            if offset >= state_from:
+                state_for(speaker).add(score, timestamp)
+                self.since_snapshot += 1
+        # The snapshot's states are live objects now
+        self._snapshot = None
+        return replayed
+
+    def _restore_without_snapshot(self, chat_processor, long_term_states, state_for):
+        """
+        Replay a log that has no usable snapshot
+        Only what can still matter is decoded: the last `retain` records for the chat history
+        plus each user's last window for the long-term state (a windowed average only depends
+        on the scores inside the window). Blocks are visited newest first and only walked while
+        the history is short or they hold a speaker whose window isn't full yet.
+        """
+        long_term_states.clear()
+        segments = [(block.start, block.end, block.speakers) for block in self.blocks]
+        if self.end > self._block_start:
+            segments.append((self._block_start, self.end, self._block_speakers))
+        total = sum(block.records for block in self.blocks) + self._block_records
+        if not total:
+            return 0
+        retain = self.recent_offsets.maxlen
+        speaker_at = RECORD_HEADER.size + RECORD_FIELDS.size
+        length_at = speaker_at - 2
+        with self._mapped() as mapped:
+            # Walk back from the newest record to find what each user's window needs
+            retained = []
+            missing = {}
+            window = set()
+            for start, end, speakers in reversed(segments):
+                if len(retained) >= retain and all(missing.get(speaker) == 0 for speaker in speakers):
+                    continue
+                offsets, _ = _index(mapped, start, end)
+                for pos in reversed(offsets):
+                    if len(retained) < retain:
+                        retained.append(pos)
+                    speaker_length = mapped[pos + length_at] | mapped[pos + length_at + 1] << 8
+                    speaker_bytes = mapped[pos + speaker_at:pos + speaker_at + speaker_length]
+                    remaining = missing.get(speaker_bytes)
+                    if remaining is None:
+                        remaining = state_for(speaker_bytes.decode('utf-8')).window_size
+                    if remaining > 0:
+                        window.add(pos)
+                        remaining -= 1
+                    missing[speaker_bytes] = remaining
+
+            decode = _decoder()
+            retained_from = retained[-1] if retained else self.end
+            for pos in sorted(window.union(retained)):
+                _, timestamp, score, speaker, text = decode(mapped, pos)
+                if pos >= retained_from:
+                    chat_processor.add_message(speaker, text, timestamp, score)
+                    self.recent_offsets.append(pos)
+                if pos in window:
+                    state_for(speaker).add(score, timestamp)
+        # Nothing is covered by a snapshot yet, so take one soon
+        self.since_snapshot = total
+        return total
+
+    def close(self, long_term_states=None):
+        """Close the log, snapshotting long_term_states first if given and anything changed"""
+        if self._file is None or self._file.closed:
+            return
+        if long_term_states is not None and self.since_snapshot:
+            self.snapshot(long_term_states)
+        self._file.close()
+        self._index_file.close()
+
+
+def main():
+    from chat_processor import ChatProcessor
+    from long_term_sentiment import LongTermSentiment
+
+    parser = argparse.ArgumentParser(description="Replay a conversation log and report the restored state")
+    parser.add_argument("path")
+    parser.add_argument("--full", action="store_true", help="Ignore the snapshot and replay every record")
+    parser.add_argument("--window-size", type=int, default=10)
+    args = parser.parse_args()
+
+    chat_processor = ChatProcessor(with_defaults=False)
+    states = {}
+
+    def state_for(user):
+        state = states.get(user)
+        if state is None:
+            state = states[user] = LongTermSentiment(args.window_size)
+        return state
+
+    started = time.perf_counter()
+    log = ConversationLog(args.path, ignore_snapshot=args.full)
+    replayed = log.restore(chat_processor, states, state_for)
+    elapsed = time.perf_counter() - started
+    log.close()
+
+    size_mb = log.end / (1 << 20)
+    print(f"Replayed {replayed} records in {elapsed:.2f}s (log {size_mb:.1f} MB, "
+          f"{size_mb / elapsed if elapsed else 0:.0f} MB/s over the whole log)")
+    for user, state in sorted(states.items()):
+        print(f"{user}: last {state.last_score}, long-term {state.value:.4f} over {len(state)} messages")
+
+
+if __name__ == "__main__":
+    main()
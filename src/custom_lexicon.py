@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+from collections import deque
+
+# custom_sentiment.json scores are in [-1, 1]; VADER valences are in [-4, 4]
+CUSTOM_SCALE = 4.0
+
+# Emoji presentation selector, often present or missing on the same emoji
+VARIATION_SELECTOR = "\ufe0f"
+
+
+def load_custom_sentiment(path):
+    """
+    Load custom_sentiment.json into a flat {term: VADER-scale valence} dict.
+    Terms may be single words, multi-word phrases or emojis.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    entries = {}
+    for entry in data.get("positive_words", []) + data.get("negative_words", []):
+        entries[entry["word"].lower()] = entry["score"] * CUSTOM_SCALE
+    for emoji_char, score in data.get("emoji_indicators", {}).items():
+        entries[emoji_char] = score * CUSTOM_SCALE
+    return entries
+
+
+def _fold(ch):
+    """Lowercase a character without changing string length (offsets must stay aligned)"""
+    lowered = ch.lower()
+    return lowered if len(lowered) == 1 else ch
+
+
+class AhoCorasick:
+    """
+    Character-level Aho-Corasick automaton.
+    Finds every occurrence of every pattern in one left-to-right pass, so matching
+    is linear in the text length (plus matches) however many patterns there are.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        # Pattern id ending at a state, and the nearest suffix state that also ends a pattern
+        self.output = [-1]
+        self.output_link = [0]
+        self.lengths = []
+
+        for pattern_id, pattern in enumerate(patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[state][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(-1)
+                    self.output_link.append(0)
+                state = nxt
+            self.output[state] = pattern_id
+            self.lengths.append(len(pattern))
+
+        # Breadth-first construction of failure and output links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                link = self.fail[nxt]
+                self.output_link[nxt] = link if self.output[link] >= 0 else self.output_link[link]
+
+    def to_state(self):
+        """Plain containers only, so the automaton can be serialized with marshal"""
+        return (self.goto, self.fail, self.output, self.output_link, self.lengths)
+
+    @classmethod
+    def from_state(cls, state):
+        automaton = cls.__new__(cls)
+        automaton.goto, automaton.fail, automaton.output, automaton.output_link, automaton.lengths = state
+        return automaton
+
+    def iter_matches(self, text):
+        """Yield (start, end, pattern_id) for every match in text"""
+        goto, fail, output, output_link, lengths = (
+            self.goto, self.fail, self.output, self.output_link, self.lengths
+        )
+        state = 0
+        for end, ch in enumerate(text, 1):
+            ch = _fold(ch)
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            match_state = state if output[state] >= 0 else output_link[state]
+            while match_state:
+                pattern_id = output[match_state]
+                yield end - lengths[pattern_id], end, pattern_id
+                match_state = output_link[match_state]
+
+
+class CompiledLexicon:
+    """
+    VADER lexicon merged with custom terms, compiled once.
+    Single words go straight into the lookup dict, unless VADER already scores them: its
+    valences are kept, so custom words only extend the vocabulary.
+    Phrases and emojis can't be seen by VADER's whitespace tokenizer, so an
+    Aho-Corasick automaton finds them in one pass and rewrite() replaces each match
+    with a placeholder token that the merged dict scores.
+    """
+
+    def __init__(self, base_lexicon, custom_entries):
+        self.lexicon = dict(base_lexicon)
+        patterns = []
+        self.placeholders = []
+        # Phrase matches must sit on word boundaries; emoji matches may touch words
+        self.bounded = []
+
+        for term, valence in custom_entries.items():
+            if " " not in term and any(ch.isalnum() for ch in term):
+                self.lexicon.setdefault(term, valence)
+                continue
+
+            is_phrase = " " in term
+            if is_phrase:
+                placeholder = f"customphrase{len(patterns)}"
+                variants = [" ".join(term.split())]
+            else:
+                placeholder = "emoji" + "".join(f"{ord(ch):x}" for ch in term if ch != VARIATION_SELECTOR)
+                variants = [term]
+                stripped = term.replace(VARIATION_SELECTOR, "")
+                if stripped and stripped != term:
+                    variants.append(stripped)
+
+            self.lexicon[placeholder] = valence
+            for variant in variants:
+                patterns.append("".join(_fold(ch) for ch in variant))
+                self.placeholders.append(placeholder)
+                self.bounded.append(is_phrase)
+
+        self.automaton = AhoCorasick(patterns) if patterns else None
+        self.fingerprint = hashlib.sha1(
+            json.dumps(sorted(custom_entries.items()), ensure_ascii=False).encode('utf-8')
+        ).hexdigest()[:12]
+
+    @classmethod
+    def from_file(cls, base_lexicon, path):
+        """Compile the VADER lexicon with custom_sentiment.json (or the VADER lexicon alone if missing)"""
+        entries = load_custom_sentiment(path) if path and os.path.exists(path) else {}
+        return cls(base_lexicon, entries)
+
+    def to_state(self):
+        """Plain containers only, so the compiled lexicon can be serialized with marshal"""
+        return {
+            "lexicon": self.lexicon,
+            "placeholders": self.placeholders,
+            "bounded": self.bounded,
+            "automaton": self.automaton.to_state() if self.automaton is not None else None,
+            "fingerprint": self.fingerprint,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        compiled = cls.__new__(cls)
+        compiled.lexicon = state["lexicon"]
+        compiled.placeholders = state["placeholders"]
+        compiled.bounded = state["bounded"]
+        compiled.automaton = AhoCorasick.from_state(state["automaton"]) if state["automaton"] is not None else None
+        compiled.fingerprint = state["fingerprint"]
+        return compiled
+
+    def scan(self, text):
+        """
+        Non-overlapping leftmost-longest phrase/emoji matches as (start, end, placeholder)
+        """
+        if self.automaton is None:
+            return []
+
+        candidates = []
+        for start, end, pattern_id in self.automaton.iter_matches(text):
+            if self.bounded[pattern_id] and (
+                (start > 0 and text[start - 1].isalnum()) or (end < len(text) and text[end].isalnum())
+            ):
+                continue
+            candidates.append((start, -end, pattern_id))
+        candidates.sort()
+
+        matches = []
+        last_end = 0
+        for start, neg_end, pattern_id in candidates:
+            if start >= last_end:
+                matches.append((start, -neg_end, self.placeholders[pattern_id]))
+                last_end = -neg_end
+        return matches
+
+    def rewrite(self, text):
+        """Replace phrase and emoji matches with their placeholder tokens"""
+        matches = self.scan(text)
+        if not matches:
+            return text
+        parts = []
+        position = 0
+        for start, end, placeholder in matches:
+            parts.append(text[position:start])
+            parts.append(f" {placeholder} ")
+            position = end
+        parts.append(text[position:])
+        return "".join(parts)
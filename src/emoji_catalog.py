@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+
+from paths import EMOJI_CATEGORIES_PATH
+
+VARIATION_SELECTOR = "\ufe0f"
+
+# Categories whose emojis are labelled with them even when an earlier category lists them too:
+# a contextual emoji (💯, 👎, 🤷) was picked for a message cue, not for its sentiment
+PRIORITY_CATEGORIES = ("contextual",)
+
+
+class EmojiCatalog:
+    """
+    Precomputed views of the emoji category tree.
+    Emoji -> (category, subcategory) lookups are O(1); category and subcategory
+    members are exposed as tuples. An emoji listed under several categories belongs
+    to the first one in file order, unless one of them is in PRIORITY_CATEGORIES
+    (members of every category still include it).
+    """
+
+    def __init__(self, categories):
+        self.raw = categories
+        self._location = {}
+        self._by_category = {}
+        self._by_subcategory = {}
+
+        for category, members in categories.items():
+            # Categories are either {subcategory: [emojis]} or a flat list of emojis
+            groups = members.items() if isinstance(members, dict) else [(None, members)]
+            category_emojis = []
+            for subcategory, emojis in groups:
+                if subcategory is not None:
+                    self._by_subcategory[(category, subcategory)] = tuple(emojis)
+                for emoji_char in emojis:
+                    if emoji_char not in category_emojis:
+                        category_emojis.append(emoji_char)
+                    self._locate(emoji_char, category, subcategory)
+                    # Also recognize the emoji without its presentation selector
+                    bare = emoji_char.replace(VARIATION_SELECTOR, "")
+                    if bare and bare != emoji_char:
+                        self._locate(bare, category, subcategory)
+            self._by_category[category] = tuple(category_emojis)
+
+    def _locate(self, emoji_char, category, subcategory):
+        location = self._location.get(emoji_char)
+        if location is None or (category in PRIORITY_CATEGORIES and location[0] not in PRIORITY_CATEGORIES):
+            self._location[emoji_char] = (category, subcategory)
+
+    def category_of(self, emoji_char, default="unknown"):
+        """Category an emoji belongs to"""
+        location = self._location.get(emoji_char)
+        return location[0] if location is not None else default
+
+    def subcategory_of(self, emoji_char):
+        """(category, subcategory) of an emoji, or None if it isn't in the catalog"""
+        return self._location.get(emoji_char)
+
+    def emojis(self, category):
+        """All emojis of a category, in file order without duplicates"""
+        return self._by_category.get(category, ())
+
+    def subcategory_emojis(self, category, subcategory):
+        return self._by_subcategory.get((category, subcategory), ())
+
+    def categories(self):
+        return tuple(self._by_category)
+
+    def subcategories(self, category):
+        return tuple(sub for cat, sub in self._by_subcategory if cat == category)
+
+    def __contains__(self, emoji_char):
+        return emoji_char in self._location
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def load_catalog(path=EMOJI_CATEGORIES_PATH):
+    """
+    Load emoji_categories.json once per path and share the catalog
+    Every suggester and the evaluator must see the same categories, so a missing file is an error
+    """
+    key = os.path.abspath(path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    categories = json.load(f)
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Emoji categories file not found: {path}") from None
+            catalog = _catalogs[key] = EmojiCatalog(categories)
+        return catalog
@@ -1,80 +1,195 @@
-import emoji
+import bisect
 import random
 
-class EmojiSuggester:
-    def __init__(self):
-        # Define emoji categories based on sentiment
-        self.positive_emojis = [
-            "😊", "😄", "😁", "😃", "😀", "🙂", "😍", "🥰", "😘", "👍", 
-            "🎉", "✨", "🌟", "💯", "🔥", "👏", "🤩", "😎", "🌈", "💪"
-        ]
-        
-        self.neutral_emojis = [
-            "😐", "🤔", "🙄", "😶", "😑", "🤷", "👀", "💭", "🧐", "🤨",
-            "📝", "🗒️", "📊", "🔍", "⏱️", "📌", "🔄", "🔔", "📱", "💻"
-        ]
-        
-        self.negative_emojis = [
-            "😕", "😟", "😔", "😞", "😢", "😭", "😠", "😡", "😤", "👎",
-            "💔", "😓", "😥", "😰", "😨", "😱", "😖", "😣", "😩", "😫"
-        ]
+import metrics
+from emoji_catalog import load_catalog
+from sentiment_config import load_config
+
+SENTIMENT_CATEGORIES = ("positive", "neutral", "negative")
+
+# Share of the short-term sentiment taken from a draft reply while it is being typed
+DRAFT_WEIGHT = 0.5
+
+def blend_draft(short_term_sentiment, draft_sentiment):
+    """Short-term sentiment to suggest from while a reply is being typed (either may be None)"""
+    if draft_sentiment is None:
+        return short_term_sentiment
+    if short_term_sentiment is None:
+        return draft_sentiment
+    return (1 - DRAFT_WEIGHT) * short_term_sentiment + DRAFT_WEIGHT * draft_sentiment
+
+class SamplingTable:
+    """
+    Precomputed cumulative weights over the union of a few emoji categories.
+    Each category contributes its weight spread evenly over its emojis, so an emoji
+    listed in several categories is proportionally more likely.
+    """
+    
+    def __init__(self, categories, weights):
+        emoji_weights = {}
+        for category, weight in zip(categories, weights):
+            for emoji_char in category:
+                emoji_weights[emoji_char] = emoji_weights.get(emoji_char, 0.0) + weight / len(category)
         
-        # Special categories for mixed sentiments
-        self.mixed_emojis = [
-            "😅", "😬", "😏", "🙃", "😌", "🤐", "😒", "🤥", "😪", "😴",
-            "🤞", "🤝", "🙏", "💆", "🧘", "💅", "🤦", "🤷", "🙇", "🤯"
-        ]
+        self.emojis = tuple(emoji_weights)
+        self.weights = tuple(emoji_weights.values())
+        self.cumulative = []
+        total = 0.0
+        for weight in self.weights:
+            total += weight
+            self.cumulative.append(total)
+        self.total = total
     
-    def suggest(self, short_term_sentiment, long_term_sentiment, num_suggestions=3):
+    def draw(self, k, rng):
         """
-        Suggest emojis based on short-term and long-term sentiment values
-        Returns a string of suggested emojis
+        Draw up to k distinct emojis without rejection
+        Already drawn emojis are cut out of the cumulative range, so every draw
+        is a single bisect: O(k log n) work regardless of category overlap
         """
-        # Determine primary emoji category based on short-term sentiment
-        if short_term_sentiment > 0.3:
-            primary_category = self.positive_emojis
-        elif short_term_sentiment < -0.3:
-            primary_category = self.negative_emojis
-        else:
-            primary_category = self.neutral_emojis
-        
-        # Determine secondary category based on long-term sentiment
-        if long_term_sentiment > 0.3:
-            secondary_category = self.positive_emojis
-        elif long_term_sentiment < -0.3:
-            secondary_category = self.negative_emojis
-        else:
-            secondary_category = self.neutral_emojis
+        k = min(k, len(self.emojis))
+        order = []  # indices in draw order
+        drawn = []  # the same indices, kept sorted
+        remaining = self.total
+        for _ in range(k):
+            target = rng.random() * remaining
+            # Map the target from the reduced range back onto the full cumulative range
+            for idx in drawn:
+                if target >= self.cumulative[idx] - self.weights[idx]:
+                    target += self.weights[idx]
+                else:
+                    break
+            idx = min(bisect.bisect_right(self.cumulative, target), len(self.emojis) - 1)
+            # Float rounding at an interval edge can land on a drawn index; step to a free neighbour
+            while idx in drawn:
+                idx = idx + 1 if idx + 1 < len(self.emojis) else 0
+            order.append(idx)
+            bisect.insort(drawn, idx)
+            remaining -= self.weights[idx]
+        return order
+    
+class EmojiSuggester:
+    def __init__(self, catalog=None, seed=None, config=None):
+        # Emoji categories based on sentiment, shared with the evaluator (see emoji_catalog.py)
+        self.catalog = catalog if catalog is not None else load_catalog()
         
-        # If short and long term sentiments differ significantly, add mixed emojis
-        if abs(short_term_sentiment - long_term_sentiment) > 0.5:
-            tertiary_category = self.mixed_emojis
-        else:
-            tertiary_category = primary_category
+        self.positive_emojis = self.catalog.emojis("positive")
+        self.neutral_emojis = self.catalog.emojis("neutral")
+        self.negative_emojis = self.catalog.emojis("negative")
         
-        # Select emojis with weighted probability
-        suggestions = []
+        # Special categories for mixed sentiments
+        self.mixed_emojis = self.catalog.emojis("mixed")
         
-        # 60% chance from primary category (short-term)
-        if random.random() < 0.6 and primary_category:
-            suggestions.append(random.choice(primary_category))
+        self.category_lists = {
+            "positive": self.positive_emojis,
+            "neutral": self.neutral_emojis,
+            "negative": self.negative_emojis,
+            "mixed": self.mixed_emojis,
+        }
         
-        # 30% chance from secondary category (long-term)
-        if random.random() < 0.3 and secondary_category:
-            suggestions.append(random.choice(secondary_category))
+        # Emojis for what a message is doing rather than how it feels (question, agreement,
+        # disagreement, surprise), picked from the cues of its MessageFeatures
+        self.contextual_emojis = {
+            name: self.catalog.subcategory_emojis("contextual", name)
+            for name in self.catalog.subcategories("contextual")
+        }
         
-        # 10% chance from tertiary category (mixed or primary)
-        if random.random() < 0.1 and tertiary_category:
-            suggestions.append(random.choice(tertiary_category))
+        # Default random source; suggest() also accepts a per-call rng or seed
+        self.rng = random.Random(seed)
         
-        # Fill remaining slots if needed
-        while len(suggestions) < num_suggestions:
-            category = random.choices(
-                [primary_category, secondary_category, tertiary_category],
-                weights=[0.6, 0.3, 0.1]
-            )[0]
-            emoji_choice = random.choice(category)
-            if emoji_choice not in suggestions:
-                suggestions.append(emoji_choice)
+        # Thresholds and category weights come from sentiment_config.json (a ConfigSource),
+        # and follow it when it is edited
+        self.config_source = config if config is not None else load_config()
+        self.config = self.config_source.config
+        self.tables = self._build_tables(self.config.category_weights)
+        self.config_source.subscribe(self._on_config_change)
+    
+    def _build_tables(self, weights):
+        """A sampling table for every (primary, secondary, tertiary) combination"""
+        tables = {}
+        for primary in SENTIMENT_CATEGORIES:
+            for secondary in SENTIMENT_CATEGORIES:
+                for tertiary in ("mixed", primary):
+                    key = (primary, secondary, tertiary)
+                    tables[key] = SamplingTable([self.category_lists[name] for name in key], weights)
+        return tables
+    
+    def _on_config_change(self, old, new):
+        # Thresholds are read on every call; the tables only need rebuilding for new weights
+        if new.category_weights != old.category_weights:
+            self.tables = self._build_tables(new.category_weights)
+        self.config = new
+    
+    def _category_emojis(self, name):
+        # Contextual tertiary categories are named after their cues, e.g. "question+surprise"
+        emojis = self.category_lists.get(name)
+        if emojis is None:
+            emojis = tuple(dict.fromkeys(e for cue in name.split("+") for e in self.contextual_emojis[cue]))
+        return emojis
+    
+    def table(self, categories):
+        """Sampling table for (primary, secondary, tertiary) category names; contextual ones are built on first use"""
+        tables = self.tables
+        table = tables.get(categories)
+        if table is None:
+            table = SamplingTable([self._category_emojis(name) for name in categories],
+                                  self.config.category_weights)
+            tables[categories] = table
+        return table
+    
+    def quantize(self, short_term_sentiment, long_term_sentiment, features=None):
+        """
+        Reduce a pair of sentiment values to the only things suggest() depends on:
+        which side of the positive/negative thresholds each one falls (-1, 0 or 1)
+        and whether they differ by more than the mixed threshold, plus the contextual
+        cues of the message's features when it has any
+        """
+        categorizer = self.config.categorizer
+        bucket = (categorizer.side(short_term_sentiment), categorizer.side(long_term_sentiment),
+                  categorizer.mixed(short_term_sentiment, long_term_sentiment))
+        if features is not None:
+            cues = tuple(cue for cue in features.cues if self.contextual_emojis.get(cue))
+            if cues:
+                bucket += (cues,)
+        return bucket
+    
+    def categories_for_bucket(self, bucket):
+        """
+        (primary, secondary, tertiary) category names for a quantized bucket
+        """
+        names = {1: "positive", 0: "neutral", -1: "negative"}
+        short_side, long_side, mixed = bucket[:3]
+        # Primary follows short-term sentiment, secondary follows long-term sentiment
+        primary = names[short_side]
+        secondary = names[long_side]
+        if len(bucket) > 3:
+            # A question, agreement, disagreement or surprise takes the tertiary share
+            tertiary = "+".join(bucket[3])
+        else:
+            # If short and long term sentiments differ significantly, add mixed emojis
+            tertiary = "mixed" if mixed else primary
+        return primary, secondary, tertiary
+    
+    def resolve_categories(self, short_term_sentiment, long_term_sentiment, features=None):
+        """
+        Pick the (primary, secondary, tertiary) category names for a pair of sentiment values
+        """
+        return self.categories_for_bucket(self.quantize(short_term_sentiment, long_term_sentiment, features))
+    
+    @metrics.timed("suggestion_sample", event="suggestions")
+    def suggest(self, short_term_sentiment, long_term_sentiment, num_suggestions=3, rng=None, seed=None,
+                features=None):
+        """
+        Suggest emojis based on short-term and long-term sentiment values
+        Returns a list of up to num_suggestions distinct emojis, drawn from the primary,
+        secondary and tertiary categories with the configured weights (60/30/10 by default)
+        With the message's features, contextual emojis for its cues (a question, agreement,
+        disagreement or surprise) make up the tertiary category
+        Pass seed (or an rng) for reproducible suggestions
+        """
+        if seed is not None:
+            rng = random.Random(seed)
+        elif rng is None:
+            rng = self.rng
         
-        return " ".join(suggestions)
\ No newline at end of file
+        table = self.table(self.resolve_categories(short_term_sentiment, long_term_sentiment, features))
+        return [table.emojis[idx] for idx in table.draw(num_suggestions, rng)]
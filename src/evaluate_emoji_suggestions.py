@@ -2,11 +2,28 @@ import os
 import json
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.metrics import confusion_matrix
-from collections import Counter
-import emoji
+
+from emoji_catalog import load_catalog
+from jsonl_io import iter_jsonl
+from chart_rendering import CHARTS, render_charts
+from sentiment_config import SENTIMENT_CATEGORIES, load_config
+
+# Map sentiment categories to expected emoji categories
+SENTIMENT_TO_EMOJI_CATEGORY = {
+    "very_positive": "positive",
+    "positive": "positive",
+    "slightly_positive": "positive",
+    "neutral": "neutral",
+    "slightly_negative": "negative",
+    "negative": "negative",
+    "very_negative": "negative"
+}
+
+CONFUSION_LABELS = ['positive', 'neutral', 'negative', 'mixed']
+
+# Contextual emojis answer a message's cues (a question, agreement, ...) rather than its
+# sentiment, so they are left out of the match and counted on their own
+CONTEXTUAL_CATEGORY = 'contextual'
 
 class EmojiSuggestionEvaluator:
     def __init__(self):
@@ -14,266 +31,205 @@ class EmojiSuggestionEvaluator:
         self.eval_dir = os.path.join('d:', 'CODES', 'Projects', 'Emoji', 'data', 'evaluation')
         os.makedirs(self.eval_dir, exist_ok=True)
         
-        # Load test results
-        test_results_path = os.path.join('d:', 'CODES', 'Projects', 'Emoji', 'data', 'test_data', 'test_results.json')
-        with open(test_results_path, 'r', encoding='utf-8') as f:
-            self.results = json.load(f)
+        # Load test results (streamed JSONL, or the legacy single JSON document)
+        test_data_dir = os.path.join('d:', 'CODES', 'Projects', 'Emoji', 'data', 'test_data')
+        test_results_path = os.path.join(test_data_dir, 'test_results.jsonl')
+        if os.path.exists(test_results_path):
+            self.results = list(iter_jsonl(test_results_path))
+        else:
+            with open(os.path.join(test_data_dir, 'test_results.json'), 'r', encoding='utf-8') as f:
+                self.results = json.load(f)
         
         # Convert to DataFrame for easier analysis
         self.df = pd.DataFrame(self.results)
         
-        # Load emoji categories for reference
-        emoji_categories_path = os.path.join('d:', 'CODES', 'Projects', 'Emoji', 'data', 'emoji_categories.json')
-        try:
-            with open(emoji_categories_path, 'r', encoding='utf-8') as f:
-                self.emoji_categories = json.load(f)
-        except FileNotFoundError:
-            # Create a simplified version if file doesn't exist
-            self.emoji_categories = {
-                "positive": ["😊", "😄", "😁", "😃", "😀", "🙂", "😍", "🥰", "😘", "👍", 
-                            "🎉", "✨", "🌟", "💯", "🔥", "👏", "🤩", "😎", "🌈", "💪"],
-                "neutral": ["😐", "🤔", "🙄", "😶", "😑", "🤷", "👀", "💭", "🧐", "🤨",
-                           "📝", "🗒️", "📊", "🔍", "⏱️", "📌", "🔄", "🔔", "📱", "💻"],
-                "negative": ["😕", "😟", "😔", "😞", "😢", "😭", "😠", "😡", "😤", "👎",
-                            "💔", "😓", "😥", "😰", "😨", "😱", "😖", "😣", "😩", "😫"],
-                "mixed": ["😅", "😬", "😏", "🙃", "😌", "🤐", "😒", "🤥", "😪", "😴",
-                         "🤞", "🤝", "🙏", "💆", "🧘", "💅", "🤦", "🤷", "🙇", "🤯"]
-            }
+        # Categorize with the current thresholds, shared with the tester and the suggester,
+        # so edits to sentiment_config.json show up without rerunning the tests
+        self.config = load_config().config
+        if 'short_term_sentiment' in self.df:
+            self.df['sentiment_category'] = pd.Categorical.from_codes(
+                self.config.categorizer.codes(self.df['short_term_sentiment'].to_numpy()), SENTIMENT_CATEGORIES
+            )
+        
+        # The suggester's own emoji categories (precomputed O(1) lookups, see emoji_catalog.py)
+        self.catalog = load_catalog()
+        self.emoji_categories = self.catalog.raw
+        
+        # Filled in by evaluate_sentiment_emoji_match and generate_visualizations
+        self.summary = None
+        self.chart_hashes = None
     
     def categorize_emoji(self, emoji_char):
         """Determine which category an emoji belongs to"""
-        for category, emoji_list in self.emoji_categories.items():
-            # Flatten nested categories if they exist
-            if isinstance(emoji_list, dict):
-                all_emojis = []
-                for subcategory, emojis in emoji_list.items():
-                    all_emojis.extend(emojis)
-                if emoji_char in all_emojis:
-                    return category
-            elif emoji_char in emoji_list:
-                return category
-        return "unknown"
+        return self.catalog.category_of(emoji_char)
     
     def evaluate_sentiment_emoji_match(self):
         """Evaluate how well emoji suggestions match the sentiment"""
         print("Evaluating sentiment-emoji match...")
         
-        # Add emoji category columns to dataframe
-        self.df['emoji_list'] = self.df['suggested_emojis'].apply(lambda x: x.split())
-        self.df['emoji_categories'] = self.df['emoji_list'].apply(
-            lambda emojis: [self.categorize_emoji(e) for e in emojis]
-        )
-        
-        # Map sentiment categories to expected emoji categories
-        sentiment_to_emoji_map = {
-            "very_positive": "positive",
-            "positive": "positive",
-            "slightly_positive": "positive",
-            "neutral": "neutral",
-            "slightly_negative": "negative",
-            "negative": "negative",
-            "very_negative": "negative"
+        # Factorize the suggestions so each distinct one is split and categorized once
+        suggestion_codes, suggestions = pd.factorize(self.df['suggested_emojis'].to_numpy())
+        num_suggestions = len(suggestions)
+        
+        # Emoji category columns: the confusion matrix labels first, then any others seen
+        category_columns = list(CONFUSION_LABELS)
+        column_index = {category: idx for idx, category in enumerate(category_columns)}
+        suggestion_category_counts = []
+        for suggestion in suggestions:
+            counts = {}
+            for emoji_char in suggestion.split():
+                category = self.categorize_emoji(emoji_char)
+                if category not in column_index:
+                    column_index[category] = len(category_columns)
+                    category_columns.append(category)
+                counts[column_index[category]] = counts.get(column_index[category], 0) + 1
+            suggestion_category_counts.append(counts)
+        
+        # (distinct suggestion x emoji category) counts
+        category_counts = np.zeros((num_suggestions, len(category_columns)), dtype=np.int64)
+        for idx, counts in enumerate(suggestion_category_counts):
+            for column, count in counts.items():
+                category_counts[idx, column] = count
+        emoji_totals = category_counts.sum(axis=1)
+        contextual_column = column_index.get(CONTEXTUAL_CATEGORY)
+        contextual_counts = (category_counts[:, contextual_column] if contextual_column is not None
+                             else np.zeros(num_suggestions, dtype=np.int64))
+        sentiment_totals = emoji_totals - contextual_counts
+        # Suggestions of contextual emojis only say nothing about sentiment and aren't scored
+        scored = sentiment_totals > 0
+        
+        # Sentiment categories as codes; anything unrecognized gets the extra last code
+        sentiment_codes = pd.Categorical(self.df['sentiment_category'], categories=SENTIMENT_CATEGORIES).codes
+        sentiment_codes = np.where(sentiment_codes < 0, len(SENTIMENT_CATEGORIES), sentiment_codes).astype(np.int64)
+        num_sentiments = len(SENTIMENT_CATEGORIES) + 1
+        expected_columns = [column_index[SENTIMENT_TO_EMOJI_CATEGORY[c]] for c in SENTIMENT_CATEGORIES]
+        
+        # The only pass over the rows: how often each sentiment category met each distinct suggestion
+        joint = np.bincount(
+            sentiment_codes * num_suggestions + suggestion_codes,
+            minlength=num_sentiments * num_suggestions
+        ).reshape(num_sentiments, num_suggestions)
+        
+        # Share of a suggestion's sentiment (non-contextual) emojis in the expected category,
+        # per (sentiment, suggestion) pair; NaN where the suggestion isn't scored
+        match_table = np.full((num_sentiments, num_suggestions), np.nan)
+        match_table[len(SENTIMENT_CATEGORIES), scored] = 0.0
+        for code, column in enumerate(expected_columns):
+            match_table[code, scored] = category_counts[scored, column] / sentiment_totals[scored]
+        self.df['match_percentage'] = match_table[sentiment_codes, suggestion_codes]
+        
+        # Overall accuracy and accuracy by sentiment category, over the scored rows
+        rows_by_sentiment = joint.sum(axis=1)
+        scored_joint = joint * scored
+        scored_by_sentiment = scored_joint.sum(axis=1)
+        matches_by_sentiment = (scored_joint * np.nan_to_num(match_table)).sum(axis=1)
+        scored_rows = scored_by_sentiment.sum()
+        overall_accuracy = float(matches_by_sentiment.sum() / scored_rows) if scored_rows else float('nan')
+        accuracy_by_sentiment = {
+            category: float(matches_by_sentiment[code] / scored_by_sentiment[code])
+            for code, category in enumerate(SENTIMENT_CATEGORIES)
+            if scored_by_sentiment[code]
         }
         
-        self.df['expected_emoji_category'] = self.df['sentiment_category'].map(sentiment_to_emoji_map)
-        
-        # Calculate match percentage for each suggestion
-        def calculate_match(row):
-            expected = row['expected_emoji_category']
-            categories = row['emoji_categories']
-            if not categories:
-                return 0
-            matches = sum(1 for cat in categories if cat == expected)
-            return matches / len(categories)
-        
-        self.df['match_percentage'] = self.df.apply(calculate_match, axis=1)
-        
-        # Overall accuracy
-        overall_accuracy = self.df['match_percentage'].mean()
-        
-        # Accuracy by sentiment category
-        accuracy_by_sentiment = self.df.groupby('sentiment_category')['match_percentage'].mean()
-        
-        # Create confusion matrix
-        # For each suggested emoji, check if it matches the expected category
-        all_categories = ['positive', 'neutral', 'negative', 'mixed']
-        
-        # Flatten the emoji categories for confusion matrix
-        true_categories = []
-        pred_categories = []
-        
-        for _, row in self.df.iterrows():
-            expected = row['expected_emoji_category']
-            for category in row['emoji_categories']:
-                true_categories.append(expected)
-                pred_categories.append(category)
-        
-                cm = confusion_matrix(
-            true_categories, 
-            pred_categories, 
-            labels=all_categories
-        )
+        # How much of the suggestions the contextual slot took
+        rows_by_suggestion = joint.sum(axis=0)
+        total_emojis = int(rows_by_suggestion @ emoji_totals)
+        contextual_share = float(rows_by_suggestion @ contextual_counts / total_emojis) if total_emojis else 0.0
+        with_contextual = float(rows_by_suggestion[contextual_counts > 0].sum() / len(self.df)) if len(self.df) else 0.0
+        
+        # Emoji category counts by sentiment category, and from them the confusion matrix
+        by_sentiment = joint @ category_counts
+        cm = np.zeros((len(CONFUSION_LABELS), len(CONFUSION_LABELS)), dtype=np.int64)
+        for code, column in enumerate(expected_columns):
+            cm[column] += by_sentiment[code, :len(CONFUSION_LABELS)]
+        
+        # Shared with generate_visualizations and generate_report
+        self.sentiment_counts = pd.Series(rows_by_sentiment[:len(SENTIMENT_CATEGORIES)], index=SENTIMENT_CATEGORIES)
+        present = self.sentiment_counts > 0
+        self.emoji_category_by_sentiment = pd.DataFrame(
+            by_sentiment[:len(SENTIMENT_CATEGORIES)], index=SENTIMENT_CATEGORIES, columns=category_columns
+        ).loc[present.to_numpy(), by_sentiment.sum(axis=0) > 0]
         
         # Save results to files
-        results_summary = {
+        self.summary = {
             "overall_accuracy": overall_accuracy,
-            "accuracy_by_sentiment": accuracy_by_sentiment.to_dict(),
+            "accuracy_by_sentiment": accuracy_by_sentiment,
+            "contextual_emoji_share": contextual_share,
+            "messages_with_contextual_emojis": with_contextual,
             "confusion_matrix": cm.tolist(),
-            "confusion_matrix_labels": all_categories
+            "confusion_matrix_labels": list(CONFUSION_LABELS)
         }
         
         with open(os.path.join(self.eval_dir, 'evaluation_summary.json'), 'w', encoding='utf-8') as f:
-            json.dump(results_summary, f, indent=2)
+            json.dump(self.summary, f, indent=2)
         
-        return results_summary
+        return self.summary
     
-    def generate_visualizations(self):
-        """Generate visualizations of the evaluation results"""
+    def chart_data(self, max_scatter_points=20000):
+        """Input data of each chart in chart_rendering.CHARTS, reduced to what the chart draws"""
+        accuracy_by_sentiment = self.summary["accuracy_by_sentiment"]
+        
+        # A scatter plot can't show millions of points anyway; plot a fixed sample
+        scatter = self.df[['short_term_sentiment', 'long_term_sentiment', 'sentiment_category']]
+        if len(scatter) > max_scatter_points:
+            scatter = scatter.sample(n=max_scatter_points, random_state=0)
+        match_values, match_counts = np.unique(self.df['match_percentage'].dropna().to_numpy(), return_counts=True)
+        
+        return {
+            'sentiment_distribution': {
+                'labels': list(self.sentiment_counts.index),
+                'values': self.sentiment_counts.to_numpy(),
+                'order': SENTIMENT_CATEGORIES,
+            },
+            'accuracy_by_sentiment': {
+                'labels': list(accuracy_by_sentiment),
+                'values': list(accuracy_by_sentiment.values()),
+                'order': SENTIMENT_CATEGORIES,
+            },
+            'confusion_matrix': {
+                'matrix': np.array(self.summary["confusion_matrix"]),
+                'labels': CONFUSION_LABELS,
+            },
+            'emoji_sentiment_distribution': {
+                'table': self.emoji_category_by_sentiment,
+            },
+            'sentiment_comparison': {
+                'short_term': scatter['short_term_sentiment'].to_numpy(),
+                'long_term': scatter['long_term_sentiment'].to_numpy(),
+                'category': scatter['sentiment_category'].to_numpy(),
+                'order': [c for c in SENTIMENT_CATEGORIES if c in accuracy_by_sentiment],
+            },
+            'match_percentage_distribution': {
+                'values': match_values,
+                'counts': match_counts,
+            },
+        }
+    
+    def generate_visualizations(self, workers=None):
+        """Generate visualizations of the evaluation results, re-rendering only charts whose data changed"""
         print("Generating visualizations...")
         
         # Evaluate if not already done
-        if 'match_percentage' not in self.df.columns:
+        if self.summary is None:
             self.evaluate_sentiment_emoji_match()
         
-        # 1. Sentiment distribution
-        plt.figure(figsize=(10, 6))
-        sns.countplot(x='sentiment_category', data=self.df, order=[
-            'very_positive', 'positive', 'slightly_positive', 'neutral',
-            'slightly_negative', 'negative', 'very_negative'
-        ])
-        plt.title('Distribution of Sentiment Categories')
-        plt.xlabel('Sentiment Category')
-        plt.ylabel('Count')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.eval_dir, 'sentiment_distribution.png'))
-        
-        # 2. Accuracy by sentiment category
-        accuracy_by_sentiment = self.df.groupby('sentiment_category')['match_percentage'].mean().reset_index()
-        plt.figure(figsize=(10, 6))
-        sns.barplot(x='sentiment_category', y='match_percentage', data=accuracy_by_sentiment, order=[
-            'very_positive', 'positive', 'slightly_positive', 'neutral',
-            'slightly_negative', 'negative', 'very_negative'
-        ])
-        plt.title('Emoji Suggestion Accuracy by Sentiment Category')
-        plt.xlabel('Sentiment Category')
-        plt.ylabel('Accuracy')
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.eval_dir, 'accuracy_by_sentiment.png'))
-        
-        # 3. Confusion Matrix Heatmap
-        # Flatten the emoji categories for confusion matrix
-        true_categories = []
-        pred_categories = []
-        
-        for _, row in self.df.iterrows():
-            expected = row['expected_emoji_category']
-            for category in row['emoji_categories']:
-                true_categories.append(expected)
-                pred_categories.append(category)
-        
-        all_categories = ['positive', 'neutral', 'negative', 'mixed']
-        cm = confusion_matrix(
-            true_categories, 
-            pred_categories, 
-            labels=all_categories
-        )
-        
-        plt.figure(figsize=(10, 8))
-        sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
-                   xticklabels=all_categories,
-                   yticklabels=all_categories)
-        plt.title('Confusion Matrix: Expected vs. Suggested Emoji Categories')
-        plt.xlabel('Suggested Emoji Category')
-        plt.ylabel('Expected Emoji Category')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.eval_dir, 'confusion_matrix.png'))
-        
-        # 4. Sentiment vs. Emoji Category Distribution
-        emoji_category_counts = []
-        for _, row in self.df.iterrows():
-            sentiment = row['sentiment_category']
-            for category in row['emoji_categories']:
-                emoji_category_counts.append({
-                    'sentiment_category': sentiment,
-                    'emoji_category': category
-                })
-        
-        emoji_df = pd.DataFrame(emoji_category_counts)
-        plt.figure(figsize=(12, 8))
-        ct = pd.crosstab(emoji_df['sentiment_category'], emoji_df['emoji_category'])
-        sns.heatmap(ct, annot=True, fmt='d', cmap='YlGnBu')
-        plt.title('Distribution of Emoji Categories by Sentiment')
-        plt.xlabel('Emoji Category')
-        plt.ylabel('Sentiment Category')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.eval_dir, 'emoji_sentiment_distribution.png'))
-        
-        # 5. Short-term vs. Long-term Sentiment Scatter Plot
-        plt.figure(figsize=(10, 8))
-        sns.scatterplot(
-            x='short_term_sentiment', 
-            y='long_term_sentiment', 
-            hue='sentiment_category',
-            data=self.df,
-            palette='viridis'
-        )
-        plt.title('Short-term vs. Long-term Sentiment')
-        plt.xlabel('Short-term Sentiment')
-        plt.ylabel('Long-term Sentiment')
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.eval_dir, 'sentiment_comparison.png'))
-        
-        # 6. Match Percentage Distribution
-        plt.figure(figsize=(10, 6))
-        sns.histplot(self.df['match_percentage'], bins=10, kde=True)
-        plt.title('Distribution of Emoji-Sentiment Match Percentages')
-        plt.xlabel('Match Percentage')
-        plt.ylabel('Count')
-        plt.tight_layout()
-        plt.savefig(os.path.join(self.eval_dir, 'match_percentage_distribution.png'))
-        
-        print(f"Visualizations saved to {self.eval_dir}")
+        self.chart_hashes, rendered = render_charts(self.chart_data(), self.eval_dir, workers)
+        
+        print(f"Visualizations saved to {self.eval_dir} "
+              f"({len(rendered)} rendered, {len(self.chart_hashes) - len(rendered)} unchanged)")
     
     def generate_report(self):
         """Generate a comprehensive evaluation report"""
         print("Generating evaluation report...")
         
         # Evaluate if not already done
-        if 'match_percentage' not in self.df.columns:
-            results = self.evaluate_sentiment_emoji_match()
-        else:
-            # Recalculate summary metrics
-            overall_accuracy = self.df['match_percentage'].mean()
-            accuracy_by_sentiment = self.df.groupby('sentiment_category')['match_percentage'].mean()
-            
-            # Create confusion matrix
-            true_categories = []
-            pred_categories = []
-            for _, row in self.df.iterrows():
-                expected = row['expected_emoji_category']
-                for category in row['emoji_categories']:
-                    true_categories.append(expected)
-                    pred_categories.append(category)
-            
-            all_categories = ['positive', 'neutral', 'negative', 'mixed']
-            cm = confusion_matrix(
-                true_categories, 
-                pred_categories, 
-                labels=all_categories
-            )
-            
-            results = {
-                "overall_accuracy": overall_accuracy,
-                "accuracy_by_sentiment": accuracy_by_sentiment.to_dict(),
-                "confusion_matrix": cm.tolist(),
-                "confusion_matrix_labels": all_categories
-            }
+        if self.summary is None:
+            self.evaluate_sentiment_emoji_match()
+        results = self.summary
         
-        # Generate visualizations
-        self.generate_visualizations()
+        # Generate visualizations if not already done
+        if self.chart_hashes is None:
+            self.generate_visualizations()
         
         # Create HTML report
         html_report = f"""
@@ -302,6 +258,10 @@ class EmojiSuggestionEvaluator:
                 <span>Overall Accuracy: </span>
                 <span class="metric-value">{results["overall_accuracy"]:.2f}</span>
             </div>
+            <div class="metric">
+                <span>Messages with contextual emojis (not counted in accuracy): </span>
+                <span class="metric-value">{results["messages_with_contextual_emojis"]:.2f}</span>
+            </div>
             
             <h3>Accuracy by Sentiment Category</h3>
             <table>
@@ -325,35 +285,18 @@ class EmojiSuggestionEvaluator:
             
             <h2>Visualizations</h2>
             <div class="container">
+        """
+        
+        # Charts are cached between runs; the data hash in the URL keeps browsers from showing stale images
+        for name, (filename, title, _) in CHARTS.items():
+            html_report += f"""
                 <div class="chart">
-                    <h3>Sentiment Distribution</h3>
-                    <img src="sentiment_distribution.png" alt="Sentiment Distribution">
-                </div>
-                
-                <div class="chart">
-                    <h3>Accuracy by Sentiment</h3>
-                    <img src="accuracy_by_sentiment.png" alt="Accuracy by Sentiment">
-                </div>
-                
-                <div class="chart">
-                    <h3>Confusion Matrix</h3>
-                    <img src="confusion_matrix.png" alt="Confusion Matrix">
-                </div>
-                
-                <div class="chart">
-                    <h3>Emoji-Sentiment Distribution</h3>
-                    <img src="emoji_sentiment_distribution.png" alt="Emoji-Sentiment Distribution">
-                </div>
-                
-                <div class="chart">
-                    <h3>Short-term vs. Long-term Sentiment</h3>
-                    <img src="sentiment_comparison.png" alt="Sentiment Comparison">
-                </div>
-                
-                <div class="chart">
-                    <h3>Match Percentage Distribution</h3>
-                    <img src="match_percentage_distribution.png" alt="Match Percentage Distribution">
+                    <h3>{title}</h3>
+                    <img src="{filename}?v={self.chart_hashes[name][:12]}" alt="{title}">
                 </div>
+            """
+        
+        html_report += """
             </div>
             
             <h2>Conclusion</h2>
@@ -0,0 +1,107 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Startup budget of each entry point: how long `import <module>` may take in a fresh
+# interpreter (ms, cumulative as reported by python -X importtime), and the heavy packages
+# it must not import at all. Budgets are about twice the measured times, so only a real
+# regression (a heavy import creeping back to module scope) trips them.
+#
+#   python import_budget.py              # check every entry point
+#   python import_budget.py --verbose    # ...and list the slowest imports of each
+HEADLESS = ('tkinter', 'matplotlib', 'seaborn', 'pandas', 'sklearn', 'scipy')
+NEVER = ('sklearn', 'textblob', 'emoji')
+
+BUDGETS = {
+    'sentiment_analyzer': (40, HEADLESS + ('numpy',)),
+    'conversation_log': (20, HEADLESS),
+    'batch_suggestions': (100, HEADLESS),
+    'suggestion_service': (150, HEADLESS),
+    'test_emoji_suggestions': (120, HEADLESS + ('requests', 'bs4', 'tqdm')),
+    'chart_rendering': (250, ('matplotlib', 'seaborn', 'pandas', 'sklearn')),
+    'main': (700, ('matplotlib', 'seaborn', 'pandas', 'sklearn', 'scipy')),
+    'evaluate_emoji_suggestions': (700, ('tkinter', 'matplotlib', 'seaborn', 'sklearn')),
+}
+
+
+def import_times(module):
+    """
+    Import module in a fresh interpreter; returns its cumulative import time (µs), the
+    cumulative times of everything imported under it, and the top-level packages loaded
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import sys, {module}; print(" ".join(name for name, m in sys.modules.items() if m is not None))'],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+    # "import time: self [us] | cumulative | imported package", children before their parent,
+    # nested two spaces per level; the entry point's subtree is everything after the previous
+    # top-level line (interpreter startup such as site)
+    subtree = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('  '):
+            subtree.setdefault(name.strip(), int(cumulative))
+        elif name.strip() == module:
+            loaded = {name.split('.')[0] for name in result.stdout.split()}
+            return int(cumulative), subtree, loaded
+        else:
+            subtree = {}
+    raise RuntimeError(f'python -X importtime did not report importing {module}')
+
+
+def check(module, budget_ms, forbidden, runs, verbose=False):
+    """Problems with one entry point (empty when it is within budget)"""
+    samples = [import_times(module) for _ in range(runs)]
+    elapsed_ms = statistics.median(cumulative for cumulative, _, _ in samples) / 1000
+    _, subtree, loaded = samples[0]
+
+    problems = []
+    if elapsed_ms > budget_ms:
+        problems.append(f'import takes {elapsed_ms:.0f} ms, budget {budget_ms:.0f} ms')
+    for name in sorted(set(forbidden) | set(NEVER)):
+        if name in loaded:
+            problems.append(f'imports {name} ({subtree.get(name, 0) / 1000:.0f} ms)')
+
+    status = 'FAIL' if problems else 'ok'
+    print(f'{module:<28}{elapsed_ms:>8.1f}{budget_ms:>8.0f}  {status}')
+    for problem in problems:
+        print(f'    {problem}')
+    if verbose:
+        top_level = sorted(((t, name) for name, t in subtree.items() if '.' not in name), reverse=True)
+        for t, name in top_level[:5]:
+            print(f'    {name:<24}{t / 1000:>8.1f}')
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check each entry point's import time and heavy imports")
+    parser.add_argument('modules', nargs='*', help='Entry points to check (default: all of BUDGETS)')
+    parser.add_argument('--runs', type=int, default=5, help='Interpreter launches per entry point')
+    parser.add_argument('--budget-scale', type=float, default=1.0,
+                        help='Multiply every budget (e.g. 2 on a slow CI machine)')
+    parser.add_argument('--verbose', action='store_true', help='Show the slowest top-level imports')
+    args = parser.parse_args(argv)
+
+    unknown = [module for module in args.modules if module not in BUDGETS]
+    if unknown:
+        parser.error(f"no budget for {', '.join(unknown)}")
+
+    print(f"{'entry point':<28}{'ms':>8}{'budget':>8}  (median of {args.runs})")
+    failed = 0
+    for module in args.modules or BUDGETS:
+        budget_ms, forbidden = BUDGETS[module]
+        failed += bool(check(module, budget_ms * args.budget_scale, forbidden, args.runs, args.verbose))
+    if failed:
+        print(f'{failed} entry point(s) over budget')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import gzip
+import io
+import json
+import os
+import sys
+
+def _is_gzip(path):
+    return path.endswith('.gz')
+
+def iter_jsonl(path, skip=0, keep_invalid=False):
+    """
+    Yield one decoded record per line of a JSONL file (gzip if the name ends in .gz), skipping the first skip records
+    A path of '-' reads standard input
+    With keep_invalid, a line that isn't valid JSON yields a ValueError describing it instead of raising
+    """
+    if path == '-':
+        yield from _decode_lines(io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8'), skip, keep_invalid)
+        return
+    opener = gzip.open if _is_gzip(path) else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        yield from _decode_lines(f, skip, keep_invalid)
+
+def _decode_lines(f, skip, keep_invalid=False):
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        if skip:
+            skip -= 1
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            if not keep_invalid:
+                raise
+            yield ValueError(f"invalid JSON: {e}")
+
+def write_jsonl(path, records):
+    """Write an iterable of records to a JSONL file, returning how many were written"""
+    with JsonlWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+    return writer.count
+
+class JsonlWriter:
+    """
+    Appends records to a JSONL file (gzip if the name ends in .gz) one line at a time.
+    checkpoint() makes everything written so far durable and returns the byte offset it
+    ends at; passing that offset back as resume_offset drops anything written after it
+    (ValueError if the file is missing or doesn't reach it).
+    For gzip output every checkpoint closes a gzip member, and the members concatenate
+    into one valid stream. A path of '-' writes to standard output (flushed, never closed).
+    """
+
+    def __init__(self, path, resume_offset=None):
+        self.path = path
+        self.gzip = _is_gzip(path)
+        self.stdout = path == '-'
+        if self.stdout:
+            self._raw = sys.stdout.buffer
+        elif resume_offset is None:
+            self._raw = open(path, 'wb')
+        else:
+            # Truncating "up" to the offset would zero-fill the gap instead
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if size < resume_offset:
+                raise ValueError(f"{path} holds {size} bytes, fewer than the resume offset {resume_offset}")
+            self._raw = open(path, 'r+b' if os.path.exists(path) else 'wb')
+            self._raw.truncate(resume_offset)
+            self._raw.seek(resume_offset)
+        self._out = self._open_member()
+        self.count = 0
+
+    def _open_member(self):
+        return gzip.GzipFile(fileobj=self._raw, mode='wb') if self.gzip else self._raw
+
+    def write(self, record):
+        self._out.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        self.count += 1
+
+    def flush(self):
+        """Pass plain-text output on without waiting for a checkpoint (gzip output keeps its pending block)"""
+        if not self.gzip:
+            self._raw.flush()
+
+    def checkpoint(self):
+        if self.stdout:
+            self._raw.flush()
+            return None
+        if self.gzip:
+            # Closing the member writes its trailer but leaves the underlying file open
+            self._out.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        offset = self._raw.tell()
+        if self.gzip:
+            self._out = self._open_member()
+        return offset
+
+    def close(self):
+        if self.stdout:
+            self._raw.flush()
+            return
+        if self._raw.closed:
+            return
+        if self.gzip:
+            self._out.close()
+        self._raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def load_checkpoint(path):
+    """Checkpoint dict saved by save_checkpoint, or None if there is none"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_checkpoint(path, state):
+    """Atomically replace the checkpoint file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
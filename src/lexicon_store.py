@@ -0,0 +1,135 @@
+import hashlib
+import marshal
+import mmap
+import os
+import sys
+import threading
+
+from custom_lexicon import CompiledLexicon
+from paths import DATA_DIR
+
+# Bump when the serialized layout of CompiledLexicon, or how it merges the lexicons, changes
+ARTIFACT_VERSION = 2
+
+VADER_RESOURCE = 'sentiment/vader_lexicon.zip'
+VADER_LEXICON_FILE = 'sentiment/vader_lexicon.zip/vader_lexicon/vader_lexicon.txt'
+
+# Packages nltk's __init__ imports eagerly for its drawing, plotting, classifier and
+# statistics integrations; VADER needs none of them
+NLTK_OPTIONAL_IMPORTS = ('tkinter', 'matplotlib', 'pandas', 'sklearn', 'scipy')
+
+
+def cache_dir():
+    """Directory holding prebuilt lexicon artifacts (override with EMOJI_SUGGESTER_CACHE_DIR)"""
+    return os.environ.get('EMOJI_SUGGESTER_CACHE_DIR', os.path.join(DATA_DIR, 'cache'))
+
+
+def artifact_path(custom_lexicon_path):
+    """One artifact per custom lexicon file, so different configurations don't overwrite each other"""
+    source_id = hashlib.sha1(os.path.abspath(custom_lexicon_path or '').encode('utf-8')).hexdigest()[:12]
+    return os.path.join(cache_dir(), f'lexicon-v{ARTIFACT_VERSION}-{source_id}.bin')
+
+
+def _source_stamp(custom_lexicon_path):
+    """Cheap staleness check: the artifact is rebuilt when the custom lexicon file changes"""
+    if not custom_lexicon_path or not os.path.exists(custom_lexicon_path):
+        return None
+    stat = os.stat(custom_lexicon_path)
+    return (os.path.abspath(custom_lexicon_path), stat.st_mtime_ns, stat.st_size)
+
+
+def import_nltk():
+    """
+    Import nltk without the optional packages it would pull in (NLTK_OPTIONAL_IMPORTS, about
+    2s and a Tk interpreter), so headless processes stay headless. They are only hidden while
+    nltk's own modules import, which skip them; anything may still import them afterwards.
+    Hiding them changes sys.modules for every thread, so it is only done on the main thread:
+    call this there before starting threads that score (as SentimentAnalyzer(warm_up=True)
+    does). Elsewhere nltk is imported as is, optional packages included.
+    """
+    if 'nltk' in sys.modules:
+        return sys.modules['nltk']
+    if threading.current_thread() is not threading.main_thread():
+        import nltk
+        return nltk
+    hidden = [name for name in NLTK_OPTIONAL_IMPORTS if name not in sys.modules]
+    for name in hidden:
+        sys.modules[name] = None
+    try:
+        import nltk
+    finally:
+        for name in hidden:
+            if name in sys.modules and sys.modules[name] is None:
+                del sys.modules[name]
+    return nltk
+
+
+def load_vader_lexicon(allow_download=True):
+    """
+    Parse the NLTK VADER lexicon into a {word: valence} dict
+    Only used when building the artifact; the network is touched only if the
+    lexicon is missing and allow_download is set
+    """
+    nltk = import_nltk()
+
+    try:
+        nltk.data.find(VADER_RESOURCE)
+    except LookupError:
+        if not allow_download:
+            raise
+        nltk.download('vader_lexicon', quiet=True)
+
+    lexicon = {}
+    for line in nltk.data.load(VADER_LEXICON_FILE).split('\n'):
+        word, measure = line.strip().split('\t')[0:2]
+        lexicon[word] = float(measure)
+    return lexicon
+
+
+def build_artifact(custom_lexicon_path, allow_download=True):
+    """Compile the VADER + custom lexicon and write it as a marshal artifact"""
+    compiled = CompiledLexicon.from_file(load_vader_lexicon(allow_download), custom_lexicon_path)
+    path = artifact_path(custom_lexicon_path)
+    payload = marshal.dumps((ARTIFACT_VERSION, _source_stamp(custom_lexicon_path), compiled.to_state()))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename so concurrent workers never see a partial artifact
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Read-only data directory: keep the compiled lexicon in memory only
+        pass
+    return compiled
+
+
+def load_compiled_lexicon(custom_lexicon_path, allow_download=True):
+    """
+    Load the prebuilt lexicon artifact through a read-only memory map,
+    rebuilding it first if it is missing or stale
+    """
+    path = artifact_path(custom_lexicon_path)
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            version, stamp, state = marshal.loads(mapped)
+        if version == ARTIFACT_VERSION and stamp == _source_stamp(custom_lexicon_path):
+            return CompiledLexicon.from_state(state)
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+    return build_artifact(custom_lexicon_path, allow_download)
+
+
+def make_vader(lexicon):
+    """
+    SentimentIntensityAnalyzer around an already built lexicon dict
+    Skips the constructor, which would re-read and re-parse the lexicon text file
+    """
+    import_nltk()
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer, VaderConstants
+
+    sia = SentimentIntensityAnalyzer.__new__(SentimentIntensityAnalyzer)
+    sia.lexicon_file = None
+    sia.lexicon = lexicon
+    sia.constants = VaderConstants()
+    return sia
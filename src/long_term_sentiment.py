@@ -0,0 +1,180 @@
+import math
+import time
+from collections import deque
+
+import metrics
+
+
+class LinearKernel:
+    """
+    Recency weights 1, 2, ..., n over the window (the original analyze_long_term weighting).
+    Keeps the weighted and plain sums so each new score is folded in with O(1) work.
+    """
+
+    def __init__(self, window_size=10):
+        self.window_size = window_size
+        self.window = deque(maxlen=window_size)
+        self.weighted_sum = 0.0
+        self.plain_sum = 0.0
+
+    def push(self, score, timestamp):
+        if len(self.window) == self.window_size:
+            # Every remaining score loses one unit of weight and the oldest drops out
+            oldest, _ = self.window[0]
+            self.weighted_sum -= self.plain_sum
+            self.plain_sum -= oldest
+        self.window.append((score, timestamp))
+        self.plain_sum += score
+        self.weighted_sum += score * len(self.window)
+
+    def value(self):
+        n = len(self.window)
+        if n == 0:
+            return 0.0
+        return self.weighted_sum / (n * (n + 1) / 2)
+
+    def rebuild(self):
+        """Recompute the running sums from the window to shed accumulated float error"""
+        self.weighted_sum = sum(score * (i + 1) for i, (score, _) in enumerate(self.window))
+        self.plain_sum = sum(score for score, _ in self.window)
+
+
+class ExponentialKernel:
+    """
+    Weights decay**age over the window, where age 0 is the most recent message.
+    """
+
+    def __init__(self, window_size=10, decay=0.8):
+        self.window_size = window_size
+        self.decay = decay
+        self.window = deque(maxlen=window_size)
+        self.weighted_sum = 0.0
+        self.total_weight = 0.0
+        # Weight of a score once it is about to leave the window
+        self.tail_weight = decay ** window_size
+
+    def push(self, score, timestamp):
+        self.weighted_sum *= self.decay
+        self.total_weight *= self.decay
+        if len(self.window) == self.window_size:
+            oldest, _ = self.window[0]
+            self.weighted_sum -= oldest * self.tail_weight
+            self.total_weight -= self.tail_weight
+        self.window.append((score, timestamp))
+        self.weighted_sum += score
+        self.total_weight += 1.0
+
+    def value(self):
+        if not self.window:
+            return 0.0
+        return self.weighted_sum / self.total_weight
+
+    def rebuild(self):
+        """Recompute the running sums from the window to shed accumulated float error"""
+        n = len(self.window)
+        weights = [self.decay ** (n - 1 - i) for i in range(n)]
+        self.weighted_sum = sum(w * score for w, (score, _) in zip(weights, self.window))
+        self.total_weight = sum(weights)
+
+
+class TimeDecayKernel:
+    """
+    Weights exp(-(now - t) / tau) from message timestamps, with tau = half_life / ln 2.
+    Sums are kept relative to the newest timestamp, so the average does not depend on
+    when it is read.
+    """
+
+    def __init__(self, window_size=10, half_life=300.0):
+        self.window_size = window_size
+        self.tau = half_life / math.log(2)
+        self.window = deque(maxlen=window_size)
+        self.weighted_sum = 0.0
+        self.total_weight = 0.0
+        self.last_timestamp = None
+
+    def push(self, score, timestamp):
+        if self.last_timestamp is not None:
+            # Clamp so out-of-order timestamps never inflate older weights
+            elapsed = max(0.0, timestamp - self.last_timestamp)
+            factor = math.exp(-elapsed / self.tau)
+            self.weighted_sum *= factor
+            self.total_weight *= factor
+            timestamp = max(timestamp, self.last_timestamp)
+        if len(self.window) == self.window_size:
+            oldest, oldest_timestamp = self.window[0]
+            weight = math.exp(-(timestamp - oldest_timestamp) / self.tau)
+            self.weighted_sum -= oldest * weight
+            self.total_weight -= weight
+        self.window.append((score, timestamp))
+        self.weighted_sum += score
+        self.total_weight += 1.0
+        self.last_timestamp = timestamp
+
+    def value(self):
+        if not self.window or self.total_weight <= 0:
+            return 0.0
+        return self.weighted_sum / self.total_weight
+
+    def rebuild(self):
+        """Recompute the running sums from the window to shed accumulated float error"""
+        weights = [math.exp(-(self.last_timestamp - t) / self.tau) for _, t in self.window]
+        self.weighted_sum = sum(w * score for w, (score, _) in zip(weights, self.window))
+        self.total_weight = sum(weights)
+
+
+KERNELS = {
+    "linear": LinearKernel,
+    "exponential": ExponentialKernel,
+    "time_decay": TimeDecayKernel,
+}
+
+
+class LongTermSentiment:
+    """
+    Per-user long-term sentiment state.
+    Each message score is ingested once and the windowed average is updated in O(1).
+    """
+
+    # Running sums are rebuilt from the window every REBUILD_INTERVAL pushes
+    REBUILD_INTERVAL = 1024
+
+    def __init__(self, window_size=10, kernel="linear", **kernel_options):
+        if kernel not in KERNELS:
+            raise ValueError(f"Unknown long-term kernel '{kernel}', expected one of {sorted(KERNELS)}")
+        if window_size < 1:
+            raise ValueError(f"Long-term window_size must be at least 1, got {window_size}")
+        self.window_size = window_size
+        self.kernel_name = kernel
+        self.kernel_options = kernel_options
+        self.kernel = KERNELS[kernel](window_size, **kernel_options)
+        self.last_score = None
+        self.count = 0
+
+    @metrics.timed("long_term_update")
+    def add(self, score, timestamp=None):
+        """Fold a single message score into the state and return the new long-term value"""
+        if timestamp is None:
+            timestamp = time.time()
+        self.kernel.push(score, timestamp)
+        self.last_score = score
+        self.count += 1
+        if self.count % self.REBUILD_INTERVAL == 0:
+            self.kernel.rebuild()
+        return self.kernel.value()
+
+    @property
+    def value(self):
+        """Current long-term sentiment, between -1 and 1"""
+        return self.kernel.value()
+
+    def scores(self):
+        """Scores currently inside the window, oldest first"""
+        return [score for score, _ in self.kernel.window]
+
+    def reset(self):
+        self.kernel = KERNELS[self.kernel_name](self.window_size, **self.kernel_options)
+        self.last_score = None
+        self.count = 0
+
+    def __len__(self):
+        return len(self.kernel.window)
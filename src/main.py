@@ -1,9 +1,27 @@
+import os
+import queue
+import threading
 import tkinter as tk
+import traceback
 from tkinter import scrolledtext
-import emoji
 from sentiment_analyzer import SentimentAnalyzer
-from emoji_suggester import EmojiSuggester
+from emoji_suggester import EmojiSuggester, blend_draft
 from chat_processor import ChatProcessor
+from batch_scoring import DraftScorer
+from conversation_log import ConversationLog
+from paths import DATA_DIR
+from sentiment_config import load_config
+import metrics
+
+NUM_SUGGESTIONS = 3
+# Shown until the other user has said anything
+DEFAULT_EMOJIS = ["🙂", "👋", "👀"]
+# How often the UI thread picks up results from the scoring worker
+RESULT_POLL_MS = 15
+# Quiet time after a keystroke before the draft is rescored
+DEBOUNCE_MS = 120
+# The conversation survives restarts: scored messages are appended here and replayed on startup
+CONVERSATION_LOG_PATH = os.path.join(DATA_DIR, 'conversations', 'desktop.log')
 
 class EmojiSuggestionApp:
     def __init__(self, root):
@@ -11,23 +29,55 @@ class EmojiSuggestionApp:
         self.root.title("Emoji Suggestion App")
         self.root.geometry("600x500")
         
+        # Edits to sentiment_config.json apply while the app runs
+        load_config().watch()
         self.sentiment_analyzer = SentimentAnalyzer()
         self.emoji_suggester = EmojiSuggester()
-        self.chat_processor = ChatProcessor()
+        
+        # Restore the previous conversation, scores and long-term state included, without rescoring;
+        # only a fresh log starts from the default messages
+        self.conversation_log = ConversationLog(CONVERSATION_LOG_PATH)
+        restored = not self.conversation_log.empty
+        self.chat_processor = ChatProcessor(with_defaults=not restored)
+        if restored:
+            self.conversation_log.restore(self.chat_processor, self.sentiment_analyzer.long_term_states,
+                                          self.sentiment_analyzer.long_term_state)
+        # Incremental scorer for the message being typed (used on the worker only)
+        self.draft_scorer = DraftScorer(self.sentiment_analyzer)
         
         # Current users
         self.current_user = "User 1"
         self.second_user = "User 2"
         
+        # Scoring runs on a worker thread so the UI never waits for VADER. Jobs are handled
+        # in order; results come back through a queue polled from the Tk main loop.
+        # Each suggestion request gets a generation number so superseded ones are dropped.
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._generation = 0
+        self._debounce_id = None
+        self._last_draft = ""
+        self._worker = threading.Thread(target=self._work, name="scoring-worker", daemon=True)
+        
         # Create UI elements
         self.create_widgets()
         
+        # Score the default messages once into the long-term sentiment state
+        if not restored:
+            for record in self.chat_processor.iter_records():
+                self._jobs.put(("score", record))
+        
         # Initialize chat display with default messages
         self.initialize_chat_display()
         
         # Show initial emoji suggestions
+        self.show_suggestions(DEFAULT_EMOJIS)
         self.update_emoji_suggestions()
         
+        self._worker.start()
+        self.root.after(RESULT_POLL_MS, self._poll_results)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        
     def create_widgets(self):
         # Chat display area
         self.chat_frame = tk.Frame(self.root)
@@ -44,6 +94,7 @@ class EmojiSuggestionApp:
         self.message_input = tk.Entry(self.input_frame, width=50)
         self.message_input.pack(side=tk.LEFT, fill=tk.X, expand=True)
         self.message_input.bind("<Return>", self.send_message)
+        self.message_input.bind("<KeyRelease>", self.on_draft_changed)
         
         self.send_button = tk.Button(self.input_frame, text="Send", command=self.send_message)
         self.send_button.pack(side=tk.RIGHT, padx=5)
@@ -65,56 +116,139 @@ class EmojiSuggestionApp:
         self.emoji_suggestions_frame = tk.Frame(self.control_frame)
         self.emoji_suggestions_frame.pack(side=tk.LEFT, padx=5)
         
-        # Initial emoji buttons (will be updated later)
+        # Worker errors, cleared when the next message is sent
+        self.status_label = tk.Label(self.control_frame, text="", fg="red")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        
+        # A fixed pool of emoji buttons, relabelled in place on every update
         self.emoji_buttons = []
+        for _ in range(NUM_SUGGESTIONS):
+            button = tk.Button(self.emoji_suggestions_frame, font=("Arial", 14), width=2, height=1)
+            button.config(command=lambda b=button: self.insert_emoji(b.cget("text")))
+            button.pack(side=tk.LEFT, padx=2)
+            self.emoji_buttons.append(button)
     
     def initialize_chat_display(self):
         """Initialize chat display with default messages from chat processor"""
         self.chat_display.config(state=tk.NORMAL)
         self.chat_display.delete(1.0, tk.END)
         
-        # Display default messages from chat processor
-        for user, messages in self.chat_processor.messages.items():
-            for message in messages:
-                self.chat_display.insert(tk.END, f"{user}: {message}\n")
+        # Display default messages from chat processor, in the order they were added
+        for record in self.chat_processor.iter_records():
+            self.chat_display.insert(tk.END, f"{record.speaker}: {record.text}\n")
         
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(tk.END)
         
-    def update_emoji_suggestions(self):
-        """Update emoji suggestions based on the other user's messages"""
-        # Get messages from the other user (not current user)
-        other_user_messages = self.chat_processor.get_recent_messages(self.second_user)
-        
-        # Clear existing emoji buttons
-        for button in self.emoji_buttons:
-            button.destroy()
-        self.emoji_buttons = []
-        
-        if other_user_messages:
-            # Get the most recent message for short-term sentiment
-            short_term_sentiment = self.sentiment_analyzer.analyze_short_term(other_user_messages[-1])
-            # Get long-term sentiment from all recent messages
-            long_term_sentiment = self.sentiment_analyzer.analyze_long_term(other_user_messages)
-            
-            # Get emoji suggestions
-            suggested_emojis = self.emoji_suggester.suggest(short_term_sentiment, long_term_sentiment)
-            emojis_list = suggested_emojis.split()
-        else:
+    def _work(self):
+        """Scoring worker: the only thread touching the analyzer and suggester"""
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            try:
+                if job[0] == "score":
+                    record = job[1]
+                    # Tokenized once here; the features stay with the record for suggestions
+                    record.features = self.sentiment_analyzer.features(record.text)
+                    record.score = self.sentiment_analyzer.update_long_term(record.speaker, record.features,
+                                                                            record.timestamp)
+                    self.conversation_log.append(record.speaker, record.text, record.score, record.timestamp)
+                    if self.conversation_log.snapshot_due():
+                        self.conversation_log.snapshot(self.sentiment_analyzer.long_term_states)
+                else:
+                    _, generation, user, draft, record = job
+                    # A newer request (e.g. a later keystroke) is already queued, so skip this one
+                    if generation != self._generation:
+                        continue
+                    self._results.put((generation, self._suggest_for(user, draft, record)))
+            except Exception as e:
+                # Full traceback on the console; the UI shows the error through the result queue
+                traceback.print_exc()
+                self._results.put((None, f"{'Scoring' if job[0] == 'score' else 'Suggestions'} failed: {e}"))
+    
+    def _suggest_for(self, user, draft="", record=None):
+        """
+        Emoji suggestions based on a user's messages, their latest message record (taken on the
+        Tk thread, which owns the ChatProcessor) and the current draft (runs on the worker)
+        """
+        draft_sentiment = self.draft_scorer.score(draft) if draft.strip() else None
+        
+        # Long-term state of the user, updated as messages arrive
+        user_state = self.sentiment_analyzer.long_term_state(user)
+        if len(user_state) == 0 and draft_sentiment is None:
             # If no messages yet, show neutral emojis
-            emojis_list = ["🙂", "👋", "👀"]
-        
-        # Create clickable buttons for each emoji
-        for emoji_char in emojis_list:
-            button = tk.Button(
-                self.emoji_suggestions_frame, 
-                text=emoji_char, 
-                font=("Arial", 14),
-                command=lambda e=emoji_char: self.insert_emoji(e),
-                width=2, height=1
-            )
-            button.pack(side=tk.LEFT, padx=2)
-            self.emoji_buttons.append(button)
+            return DEFAULT_EMOJIS
+        
+        # The most recent message's score is the short-term sentiment, blended with the draft's
+        short_term_sentiment = blend_draft(user_state.last_score if len(user_state) else None, draft_sentiment)
+        # Long-term sentiment is maintained incrementally, no rescoring needed
+        long_term_sentiment = user_state.value if len(user_state) else short_term_sentiment
+        
+        # The latest message's cues (a question, agreement...) pick contextual emojis
+        features = None
+        if record is not None:
+            if record.features is None:  # restored from the log
+                record.features = self.sentiment_analyzer.features(record.text)
+            features = record.features
+        
+        return self.emoji_suggester.suggest(short_term_sentiment, long_term_sentiment, NUM_SUGGESTIONS,
+                                            features=features)
+    
+    def _poll_results(self):
+        """
+        Apply the newest finished suggestions, dropping stale ones, and show worker errors
+        (runs on the Tk main loop)
+        """
+        latest = None
+        while True:
+            try:
+                generation, result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if generation is None:
+                self.status_label.config(text=result)
+            elif generation == self._generation:
+                latest = result
+        if latest is not None:
+            self.show_suggestions(latest)
+        self.root.after(RESULT_POLL_MS, self._poll_results)
+    
+    def update_emoji_suggestions(self):
+        """Ask the worker for suggestions based on the other user's messages and the draft"""
+        if self._debounce_id is not None:
+            self.root.after_cancel(self._debounce_id)
+            self._debounce_id = None
+        self._generation += 1
+        self._last_draft = self.message_input.get()
+        # The ChatProcessor is only touched on this thread; the worker gets the record it needs
+        records = self.chat_processor.get_recent_records(self.second_user, 1)
+        self._jobs.put(("suggest", self._generation, self.second_user, self._last_draft,
+                        records[0] if records else None))
+    
+    def on_draft_changed(self, event=None):
+        """Refresh suggestions once typing pauses for DEBOUNCE_MS"""
+        # Keys that don't edit the draft (arrows, Shift, Return after sending) change nothing
+        if self.message_input.get() == self._last_draft:
+            if self._debounce_id is not None:
+                self.root.after_cancel(self._debounce_id)
+                self._debounce_id = None
+            return
+        if self._debounce_id is not None:
+            self.root.after_cancel(self._debounce_id)
+        self._debounce_id = self.root.after(DEBOUNCE_MS, self.update_emoji_suggestions)
+    
+    @metrics.timed("ui_update_suggestions")
+    def show_suggestions(self, emojis_list):
+        """Relabel the emoji buttons, hiding any left over"""
+        for idx, button in enumerate(self.emoji_buttons):
+            if idx < len(emojis_list):
+                if button.cget("text") != emojis_list[idx]:
+                    button.config(text=emojis_list[idx])
+                if not button.winfo_manager():
+                    button.pack(side=tk.LEFT, padx=2)
+            else:
+                button.pack_forget()
     
     def insert_emoji(self, emoji_char):
         """Insert the selected emoji into the message input field"""
@@ -131,11 +265,14 @@ class EmojiSuggestionApp:
         # Move cursor after the inserted emoji
         self.message_input.icursor(cursor_position + len(emoji_char))
         self.message_input.focus()
+        self.on_draft_changed()
         
+    @metrics.timed("ui_send_message")
     def send_message(self, event=None):
         message = self.message_input.get().strip()
         if not message:
             return
+        self.status_label.config(text="")
         
         # Add message to chat display
         self.chat_display.config(state=tk.NORMAL)
@@ -143,13 +280,20 @@ class EmojiSuggestionApp:
         self.chat_display.config(state=tk.DISABLED)
         self.chat_display.see(tk.END)
         
-        # Process the message
-        self.chat_processor.add_message(self.current_user, message)
+        # Process the message: stored now, scored on the worker
+        record = self.chat_processor.add_message(self.current_user, message)
+        self._jobs.put(("score", record))
         
-        # Always update emoji suggestions after any message
+        # Clear the draft, then update emoji suggestions after any message
+        self.message_input.delete(0, tk.END)
         self.update_emoji_suggestions()
         
-        self.message_input.delete(0, tk.END)
+    def close(self):
+        """Let the worker finish queued scoring, snapshot the conversation log and quit"""
+        self._jobs.put(None)
+        self._worker.join()
+        self.conversation_log.close(self.sentiment_analyzer.long_term_states)
+        self.root.destroy()
         
     def switch_user(self):
         if self.current_user == "User 1":
@@ -0,0 +1,245 @@
+import math
+import string
+
+from emoji_catalog import VARIATION_SELECTOR
+from lexicon_store import import_nltk
+from score_cache import canonicalize
+
+# nltk through import_nltk, so that importing this module doesn't drag in what nltk's __init__ would
+import_nltk()
+from nltk.sentiment.vader import VaderConstants
+
+# Everything about a message that scoring and suggestions look at is read off its
+# tokens in a single pass (MessageFeatures), so a stored message is never tokenized again.
+
+_PUNCTUATION = frozenset(string.punctuation)
+_PUNC_LIST = frozenset(VaderConstants.PUNC_LIST)
+_NEGATE = frozenset(VaderConstants.NEGATE)
+
+# Words that make VADER look at neighbouring tokens (negation, boosters, "but", "least",
+# "never so/this", "kind of"). A message containing any of them goes to the full scorer.
+_CONTEXT_WORDS = (
+    _NEGATE
+    | frozenset(w for w in VaderConstants.BOOSTER_DICT if " " not in w)
+    | {"but", "least", "never", "so", "this", "kind"}
+)
+
+# Multi-word idioms and boosters, looked up as lowercase bigrams/trigrams
+_CONTEXT_NGRAMS = frozenset(VaderConstants.SPECIAL_CASE_IDIOMS) | frozenset(
+    w for w in VaderConstants.BOOSTER_DICT if " " in w
+)
+
+# Words behind the contextual emoji cues (emoji_categories.json "contextual" group);
+# questions are told by their '?'. Replies like "yes" or "nope" only count as the first word
+# of a message ("ok" or "true" mid-sentence means nothing), the verbs anywhere.
+AGREEMENT_WORDS = frozenset({
+    "yes", "yeah", "yep", "yup", "sure", "ok", "okay", "exactly",
+    "absolutely", "definitely", "indeed", "correct", "true",
+})
+AGREEMENT_VERBS = frozenset({"agree", "agreed"})
+DISAGREEMENT_WORDS = frozenset({"no", "nope", "nah", "wrong", "incorrect"})
+DISAGREEMENT_VERBS = frozenset({"disagree", "disagreed"})
+SURPRISE_WORDS = frozenset({
+    "wow", "whoa", "woah", "omg", "unbelievable", "incredible", "surprised", "shocked", "shocking",
+})
+
+# Contextual subcategories in the order cues are reported
+CONTEXTUAL_CUES = ("question", "agreement", "disagreement", "surprise")
+
+
+def _strip_token(token):
+    """
+    Reproduce VADER's SentiText punctuation stripping for a single token:
+    a word with punctuation only before or only after it (and listed in PUNC_LIST)
+    is reduced to the bare word. Emoticons and contractions are kept as-is.
+    """
+    n = len(token)
+    i = 0
+    while i < n and token[i] in _PUNCTUATION:
+        i += 1
+    if i == n:
+        return token
+    j = n
+    while token[j - 1] in _PUNCTUATION:
+        j -= 1
+    if i > 0 and j == n:
+        core, punc = token[i:], token[:i]
+    elif i == 0 and j < n:
+        core, punc = token[:j], token[j:]
+    else:
+        return token
+    if punc in _PUNC_LIST and len(core) > 1 and not any(c in _PUNCTUATION for c in core):
+        return core
+    return token
+
+
+def compound(valences, exclamations, questions):
+    """
+    VADER's compound score from per-token valences and punctuation counts:
+    up to 4 '!' at 0.292 each, 2-3 '?' at 0.18 each (more capped at 0.96), normalized and
+    rounded like SentimentIntensityAnalyzer.polarity_scores()
+    """
+    total = 0.0
+    for valence in valences:
+        total += valence
+    amplifier = min(exclamations, 4) * 0.292 + (0.96 if questions > 3 else questions * 0.18 if questions > 1 else 0.0)
+    if total > 0:
+        total += amplifier
+    elif total < 0:
+        total -= amplifier
+    return round(total / math.sqrt(total * total + 15), 4)
+
+
+class MessageFeatures:
+    """
+    One message as scoring and suggestions see it.
+    text is the canonical message (the score cache key) and rewritten the same with custom
+    phrases and emojis turned into lexicon tokens. valences are the lexicon valences of its
+    tokens, capitalization emphasis applied; they are the whole score unless needs_context
+    says VADER's context rules apply. score is filled in once the message is scored.
+    """
+
+    __slots__ = ("text", "rewritten", "tokens", "words", "valences", "needs_context",
+                 "exclamations", "questions", "emojis", "negations", "cues", "score")
+
+    def __repr__(self):
+        return f"MessageFeatures({self.text!r}, cues={self.cues}, score={self.score})"
+
+
+class FeatureExtractor:
+    """
+    Tokenizes messages exactly like VADER's SentiText and collects, in the same pass,
+    lexicon valences, '!' and '?' counts, emojis, negations and the contextual cues
+    (question, agreement, disagreement, surprise) they add up to.
+    Without a compiled lexicon, texts are taken as already rewritten; without a catalog,
+    emojis aren't collected.
+    """
+
+    def __init__(self, sia, lexicon=None, catalog=None):
+        self.sia = sia
+        self.valence_of = sia.lexicon.get
+        self.lexicon = lexicon
+        self.c_incr = VaderConstants.C_INCR
+
+        self.catalog = catalog
+        self.cue_emojis = {}
+        # Catalog emojis the compiled lexicon rewrites, by placeholder token
+        self.placeholder_emojis = {}
+        if catalog is not None:
+            for cue in CONTEXTUAL_CUES:
+                members = catalog.subcategory_emojis("contextual", cue)
+                self.cue_emojis[cue] = frozenset(members) | {e.replace(VARIATION_SELECTOR, "") for e in members}
+            for category in catalog.categories():
+                for emoji_char in catalog.emojis(category):
+                    placeholder = "emoji" + "".join(f"{ord(ch):x}" for ch in emoji_char if ch != VARIATION_SELECTOR)
+                    self.placeholder_emojis.setdefault(placeholder, emoji_char)
+
+    def extract(self, text):
+        """MessageFeatures of a message string"""
+        text = canonicalize(text)
+        rewritten = self.lexicon.rewrite(text) if self.lexicon is not None else text
+        catalog = self.catalog
+
+        tokens = []
+        words = []
+        hits = []
+        emojis = []
+        capitals = 0
+        negations = 0
+        needs_context = False
+        for raw in rewritten.split():
+            if catalog is not None:
+                if raw.isascii():
+                    emoji_char = self.placeholder_emojis.get(raw)
+                    if emoji_char is not None:
+                        emojis.append(emoji_char)
+                else:
+                    emojis.extend(ch for ch in raw if ch in catalog)
+            # SentiText drops single characters
+            if len(raw) < 2:
+                continue
+            token = _strip_token(raw)
+            word = token.lower()
+            tokens.append(token)
+            words.append(word)
+            is_upper = token.isupper()
+            capitals += is_upper
+            if word in _CONTEXT_WORDS or "n't" in word:
+                needs_context = True
+                if word in _NEGATE or "n't" in word:
+                    negations += 1
+            valence = self.valence_of(word)
+            if valence is not None:
+                hits.append((valence, is_upper))
+
+        if not needs_context:
+            for k in range(len(words) - 1):
+                bigram = words[k] + " " + words[k + 1]
+                if bigram in _CONTEXT_NGRAMS or (k + 2 < len(words) and bigram + " " + words[k + 2] in _CONTEXT_NGRAMS):
+                    needs_context = True
+                    break
+
+        # Capitalized words are emphasized only when the message isn't all capitals
+        is_cap_diff = 0 < len(tokens) - capitals < len(tokens)
+        c_incr = self.c_incr
+        valences = [
+            (valence + c_incr if valence > 0 else valence - c_incr) if is_cap_diff and is_upper else valence
+            for valence, is_upper in hits
+        ]
+
+        features = MessageFeatures()
+        features.text = text
+        features.rewritten = rewritten
+        features.tokens = tokens
+        features.words = words
+        features.valences = valences
+        features.needs_context = needs_context
+        features.exclamations = rewritten.count("!")
+        features.questions = rewritten.count("?")
+        features.emojis = tuple(emojis)
+        features.negations = negations
+        features.cues = self._cues(features)
+        features.score = None
+        return features
+
+    def _cues(self, features):
+        """
+        Contextual subcategories a message calls for, in CONTEXTUAL_CUES order
+        A word-level heuristic: agreement and disagreement come from a reply word opening the
+        message ("yeah sure", "No, that's wrong") or the verbs (dis)agree anywhere, and a negated
+        agreement word ("not sure", "don't agree") is a disagreement. A bare "no" opening a
+        phrase ("no problem", "no worries") isn't one. Known misses: replies that open with
+        something else ("well, yes") and a "no" phrase that does disagree ("no way").
+        """
+        words = features.words
+        word_set = set(words)
+        emojis = set(features.emojis)
+        emoji_cues = [cue for cue, members in self.cue_emojis.items() if not emojis.isdisjoint(members)] if emojis else ()
+        first = words[0] if words else None
+        cues = []
+        if features.questions or "question" in emoji_cues:
+            cues.append("question")
+        negated_agreement = any(
+            (word in AGREEMENT_WORDS or word in AGREEMENT_VERBS) and (words[k - 1] in _NEGATE or "n't" in words[k - 1])
+            for k, word in enumerate(words) if k
+        )
+        agrees = first in AGREEMENT_WORDS or not word_set.isdisjoint(AGREEMENT_VERBS)
+        # "are you sure?" is neither
+        if (agrees and not features.negations and not features.questions) or "agreement" in emoji_cues:
+            cues.append("agreement")
+        disagrees = first in DISAGREEMENT_WORDS and not (
+            first == "no" and len(words) > 1 and words[1] not in DISAGREEMENT_WORDS
+            and features.rewritten.split(None, 1)[0].lower() == "no"
+        )
+        if disagrees or negated_agreement or not word_set.isdisjoint(DISAGREEMENT_VERBS) or "disagreement" in emoji_cues:
+            cues.append("disagreement")
+        surprised = "?!" in features.rewritten or "!?" in features.rewritten
+        if surprised or not word_set.isdisjoint(SURPRISE_WORDS) or "surprise" in emoji_cues:
+            cues.append("surprise")
+        return tuple(cues)
+
+    def score(self, features):
+        """Compound sentiment of extracted features, the same as analyze_short_term of the message"""
+        if features.needs_context:
+            return self.sia.polarity_scores(features.rewritten)["compound"]
+        return compound(features.valences, features.exclamations, features.questions)
@@ -0,0 +1,278 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Opt-in, in-process metrics: per-stage latency histograms, event counters, cache hit
+# rates and sampled traces of slow requests. Hooks are disabled by default, and then
+# @timed methods are the plain methods, at no cost. Enable them with enable() or by
+# setting EMOJI_METRICS=1, then read them back with snapshot() or prometheus_text().
+
+# Latency buckets in seconds (Prometheus "le" bounds); the last one catches everything
+BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+    1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"),
+)
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_stats_sources = {}
+# (class, method name, plain method, timing wrapper) for every @timed method
+_hooks = []
+
+# Tracing: a sampled fraction of traced requests records every timed stage they go
+# through, and the ones slower than the threshold are kept for inspection
+_trace_sample_rate = 0.0
+_slow_threshold = 0.1
+_slow_traces = deque(maxlen=100)
+_current_trace = contextvars.ContextVar("emoji_metrics_trace", default=None)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th quantile"""
+        if not self.count:
+            return 0.0
+        target = p * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, self.counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound if bound != float("inf") else BUCKETS[-2]
+        return BUCKETS[-2]
+
+
+def _install_hooks(enabled):
+    for owner, name, func, wrapper in _hooks:
+        setattr(owner, name, wrapper if enabled else func)
+
+
+def enable(trace_sample_rate=None, slow_threshold=None):
+    """Turn the hooks on; optionally trace a fraction of requests and keep those slower than slow_threshold seconds"""
+    global _enabled, _trace_sample_rate, _slow_threshold
+    if trace_sample_rate is not None:
+        _trace_sample_rate = trace_sample_rate
+    if slow_threshold is not None:
+        _slow_threshold = slow_threshold
+    _enabled = True
+    _install_hooks(True)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    _install_hooks(False)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forget everything recorded so far (cache sources stay registered)"""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _slow_traces.clear()
+
+
+def observe(stage, seconds):
+    """Record one timing for a stage"""
+    if not _enabled:
+        return
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace["stages"].append((stage, seconds))
+
+
+def count(event, amount=1):
+    """Increment an event counter"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[event] = _counters.get(event, 0) + amount
+
+
+def _timing_wrapper(func, stage, event):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observe(stage, time.perf_counter() - started)
+            if event is not None:
+                count(event)
+    return wrapper
+
+
+class timed:
+    """
+    Method decorator timing every call into the stage's histogram while metrics are enabled
+    With event set, calls are also counted under that name. The class keeps the plain
+    method while metrics are disabled; enable() swaps in the timing wrapper.
+    """
+
+    def __init__(self, stage, event=None):
+        self.stage = stage
+        self.event = event
+        self.func = None
+
+    def __call__(self, func):
+        self.func = func
+        return self
+
+    def __set_name__(self, owner, name):
+        wrapper = _timing_wrapper(self.func, self.stage, self.event)
+        _hooks.append((owner, name, self.func, wrapper))
+        setattr(owner, name, wrapper if _enabled else self.func)
+
+
+@contextmanager
+def trace(name, **attributes):
+    """
+    Time a request as stage name; a sampled fraction also records the stages it runs
+    through and is kept if slower than the slow threshold
+    """
+    if not _enabled:
+        yield None
+        return
+    record = None
+    token = None
+    if _trace_sample_rate > 0 and random.random() < _trace_sample_rate:
+        record = {"name": name, "attributes": attributes, "stages": []}
+        token = _current_trace.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        elapsed = time.perf_counter() - started
+        if token is not None:
+            _current_trace.reset(token)
+        observe(name, elapsed)
+        if record is not None and elapsed >= _slow_threshold:
+            record["seconds"] = elapsed
+            record["finished_at"] = time.time()
+            _slow_traces.append(record)
+
+
+def watch(kind, source):
+    """
+    Report source.stats() hits/misses under kind (e.g. "score" for score caches)
+    Sources are held weakly, so watching a cache never keeps it alive
+    """
+    with _lock:
+        sources = _stats_sources.get(kind)
+        if sources is None:
+            sources = _stats_sources[kind] = weakref.WeakSet()
+        sources.add(source)
+
+
+def _cache_stats():
+    with _lock:
+        sources = {kind: list(objs) for kind, objs in _stats_sources.items()}
+    caches = {}
+    for kind, objs in sources.items():
+        hits = misses = 0
+        for obj in objs:
+            stats = obj.stats()
+            hits += stats.get("hits", 0)
+            misses += stats.get("misses", 0)
+        lookups = hits + misses
+        caches[kind] = {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+    return caches
+
+
+def snapshot():
+    """Everything recorded so far, as a JSON-serializable dict"""
+    with _lock:
+        stages = {
+            stage: {
+                "count": h.count,
+                "sum_seconds": h.sum,
+                "mean_us": h.sum / h.count * 1e6 if h.count else 0.0,
+                "p50_us": h.percentile(0.50) * 1e6,
+                "p99_us": h.percentile(0.99) * 1e6,
+            }
+            for stage, h in sorted(_histograms.items())
+        }
+        events = dict(sorted(_counters.items()))
+        slow = list(_slow_traces)
+    return {
+        "enabled": _enabled,
+        "stages": stages,
+        "events": events,
+        "caches": _cache_stats(),
+        "slow_traces": slow,
+    }
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def prometheus_text():
+    """Everything recorded so far in the Prometheus text exposition format"""
+    with _lock:
+        histograms = [(stage, list(h.counts), h.sum, h.count) for stage, h in sorted(_histograms.items())]
+        counters = sorted(_counters.items())
+    lines = [
+        "# HELP emoji_stage_seconds Time spent per processing stage",
+        "# TYPE emoji_stage_seconds histogram",
+    ]
+    for stage, counts, total, calls in histograms:
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f'emoji_stage_seconds_bucket{{stage="{stage}",le="{_format_bound(bound)}"}} {cumulative}')
+        lines.append(f'emoji_stage_seconds_sum{{stage="{stage}"}} {total!r}')
+        lines.append(f'emoji_stage_seconds_count{{stage="{stage}"}} {calls}')
+
+    lines += ["# HELP emoji_events_total Events counted by the hooks", "# TYPE emoji_events_total counter"]
+    for event, value in counters:
+        lines.append(f'emoji_events_total{{event="{event}"}} {value}')
+
+    caches = _cache_stats()
+    lines += ["# HELP emoji_cache_hits_total Cache hits", "# TYPE emoji_cache_hits_total counter"]
+    lines += [f'emoji_cache_hits_total{{cache="{kind}"}} {stats["hits"]}' for kind, stats in caches.items()]
+    lines += ["# HELP emoji_cache_misses_total Cache misses", "# TYPE emoji_cache_misses_total counter"]
+    lines += [f'emoji_cache_misses_total{{cache="{kind}"}} {stats["misses"]}' for kind, stats in caches.items()]
+    return "\n".join(lines) + "\n"
+
+
+def dump(path):
+    """Write snapshot() to a JSON file"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot(), f, indent=2)
+
+
+if os.environ.get("EMOJI_METRICS", "").lower() in ("1", "true", "yes"):
+    enable()
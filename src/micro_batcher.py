@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import deque
+
+
+class QueueFull(Exception):
+    """Raised by MicroBatcher.score when the queue is full and overflow='reject'"""
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent scoring requests into batched analyze_many calls.
+    A batch is flushed when max_batch requests are waiting or max_delay seconds after
+    the first one arrived, whichever comes first. Larger windows trade a little latency
+    for fewer, larger (and much cheaper per message) scoring calls.
+
+    At most max_queue requests may be waiting or in flight. Beyond that, callers
+    either wait for room (overflow='wait', i.e. back-pressure) or get QueueFull.
+    """
+
+    def __init__(self, analyzer, max_batch=64, max_delay=0.002, max_queue=10000,
+                 overflow="wait", executor=None):
+        if overflow not in ("wait", "reject"):
+            raise ValueError("overflow must be 'wait' or 'reject'")
+        self.analyzer = analyzer
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.executor = executor
+
+        self._pending = []
+        self._timer = None
+        self._slots = None
+        self.in_queue = 0
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.scoring_time = 0.0
+        # Recent request latencies (enqueue to result), for percentile reporting
+        self.latencies = deque(maxlen=10000)
+        self.started = time.perf_counter()
+
+    async def score(self, text):
+        """Sentiment score of one message (text or its analyzer features), computed as part of a batch"""
+        if self._slots is None:
+            # Created lazily so the semaphore binds to the running loop
+            self._slots = asyncio.Semaphore(self.max_queue)
+        if self.overflow == "reject" and self._slots.locked():
+            self.rejected += 1
+            raise QueueFull(f"{self.max_queue} scoring requests already queued")
+        await self._slots.acquire()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        self.in_queue += 1
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        asyncio.get_running_loop().create_task(self._score_batch(batch))
+
+    async def _score_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        texts = [text for text, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            scores = await loop.run_in_executor(self.executor, self.analyzer.analyze_many, texts)
+            error = None
+        except Exception as e:
+            scores, error = None, e
+        finished = time.perf_counter()
+
+        self.batches += 1
+        self.items += len(batch)
+        self.scoring_time += finished - started
+        for idx, (_, future, enqueued) in enumerate(batch):
+            self.in_queue -= 1
+            self._slots.release()
+            self.latencies.append(finished - enqueued)
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(float(scores[idx]))
+
+    def stats(self):
+        """Batching effectiveness and latency/throughput figures"""
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+        elapsed = time.perf_counter() - self.started
+        return {
+            "max_batch": self.max_batch,
+            "max_delay_ms": self.max_delay * 1000,
+            "max_queue": self.max_queue,
+            "in_queue": self.in_queue,
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "scoring_ms_per_item": self.scoring_time * 1000 / self.items if self.items else 0.0,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p99_ms": percentile(0.99),
+            "throughput_per_s": self.items / elapsed if elapsed else 0.0,
+        }
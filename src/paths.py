@@ -0,0 +1,8 @@
+import os
+
+# Repository data directory (../data relative to this file)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+CUSTOM_SENTIMENT_PATH = os.path.join(DATA_DIR, 'custom_sentiment.json')
+EMOJI_CATEGORIES_PATH = os.path.join(DATA_DIR, 'emoji_categories.json')
+SENTIMENT_CONFIG_PATH = os.path.join(DATA_DIR, 'sentiment_config.json')
@@ -0,0 +1,101 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+def canonicalize(text):
+    """
+    Canonical cache key for a message.
+    Only whitespace is normalized: VADER splits on whitespace, so runs of spaces and
+    leading/trailing blanks never change a score. Case and punctuation are kept
+    because VADER scores ALL CAPS emphasis and '!'/'?' amplification.
+    """
+    return " ".join(text.split())
+
+
+class ScoreCache:
+    """
+    Bounded LRU cache of sentiment scores keyed on canonicalized message text.
+    Bounded both by number of entries and by (approximate) bytes held.
+    """
+
+    # Approximate per-entry overhead: OrderedDict node, float value and size bookkeeping
+    ENTRY_OVERHEAD = 120
+
+    _shared = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries=4096, max_bytes=1 << 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        metrics.watch("score", self)
+
+    @classmethod
+    def shared(cls, namespace="default"):
+        """
+        Process-wide cache instance for analyzers created with shared_cache=True
+        Analyzers scoring with different lexicons use different namespaces
+        """
+        with cls._shared_lock:
+            cache = cls._shared.get(namespace)
+            if cache is None:
+                cache = cls._shared[namespace] = cls()
+            return cache
+
+    def _entry_size(self, key):
+        return sys.getsizeof(key) + self.ENTRY_OVERHEAD
+
+    def get(self, key):
+        """Return the cached score for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, score):
+        size = self._entry_size(key)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes_held -= old[1]
+            self._entries[key] = (score, size)
+            self.bytes_held += size
+            while len(self._entries) > self.max_entries or self.bytes_held > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes_held -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes_held = 0
+
+    def stats(self):
+        """Counters for monitoring cache effectiveness"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes_held,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
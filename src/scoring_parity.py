@@ -0,0 +1,114 @@
+import argparse
+import random
+import sys
+
+# Every fast scoring path must agree with plain VADER on the rewritten message:
+#   sia.polarity_scores(lexicon.rewrite(canonicalize(text)))['compound']
+# The messages mix the synthetic corpus with custom words, phrases and emojis, VADER's
+# context rules (negations, "but", idioms, "least"), capitals, punctuation and odd spacing,
+# so a drift in any of them shows up as a mismatch.
+#
+#   python scoring_parity.py                   # 5000 messages, seed 0
+#   python scoring_parity.py --count 50000 --seed 3
+
+FILLERS = ("really", "the", "plan", "is", "very", "not", "but", "never", "kind of", "so",
+           "at least", "without doubt", "sort of", "no", "extremely", "lol", "ok", "the shit")
+MUTATIONS = ("upper", "word_upper", "exclaim", "question", "spaces", "custom", "filler", "join")
+
+
+def _custom_terms(path):
+    """Custom words, phrases and emojis from custom_sentiment.json"""
+    from custom_lexicon import load_custom_sentiment
+    return sorted(load_custom_sentiment(path))
+
+
+def generate_messages(count, seed, terms):
+    """count messages from the synthetic pools, each with a few random mutations"""
+    from synthetic_corpus import ALL_MESSAGES
+
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = rng.choice(ALL_MESSAGES).split()
+        mutations = rng.sample(MUTATIONS, rng.randint(0, 4))
+        for mutation in mutations:
+            at = rng.randrange(len(words) + 1)
+            if mutation == "upper":
+                words = [word.upper() for word in words]
+            elif mutation == "word_upper" and words:
+                words[at - 1] = words[at - 1].upper()
+            elif mutation == "exclaim":
+                words.append("!" * rng.randint(1, 6))
+            elif mutation == "question":
+                words[-1:] = [words[-1] + "?" * rng.randint(1, 4)] if words else ["?"]
+            elif mutation == "custom" and terms:
+                words.insert(at, rng.choice(terms))
+            elif mutation == "filler":
+                words.insert(at, rng.choice(FILLERS))
+            elif mutation == "join":
+                words = words + rng.choice(ALL_MESSAGES).split()
+        separator = rng.choice(("  ", " \t", "\n")) if "spaces" in mutations else " "
+        messages.append(separator.join(words))
+    return messages
+
+
+def check(analyzer, messages, tolerance):
+    """{path: [(message, expected, actual)]} for every score further than tolerance from VADER's"""
+    from batch_scoring import DraftScorer
+    from score_cache import canonicalize
+
+    sia, lexicon = analyzer.sia, analyzer.lexicon
+    expected = [sia.polarity_scores(lexicon.rewrite(canonicalize(text)))['compound'] for text in messages]
+
+    scores = {
+        'analyze_short_term': [analyzer.analyze_short_term(text) for text in messages],
+        'analyze_features': [analyzer.analyze_features(analyzer.features(text)) for text in messages],
+        'analyze_many': list(analyzer.analyze_many(messages)),
+    }
+    # A draft typed one character at a time, ending on each message, exercises the rollback
+    drafts = []
+    scorer = DraftScorer(analyzer)
+    for text in messages:
+        for end in range(1, len(text)):
+            scorer.score(text[:end])
+        drafts.append(scorer.score(text))
+    scores['DraftScorer'] = drafts
+
+    return {
+        path: [(text, want, got) for text, want, got in zip(messages, expected, actual)
+               if abs(want - got) > tolerance]
+        for path, actual in scores.items()
+    }
+
+
+def main(argv=None):
+    from batch_scoring import BATCH_TOLERANCE
+    from paths import CUSTOM_SENTIMENT_PATH
+    from sentiment_analyzer import SentimentAnalyzer
+
+    parser = argparse.ArgumentParser(description="Check every scoring path against VADER's polarity_scores")
+    parser.add_argument('--count', type=int, default=5000, help='Messages to generate')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated messages')
+    parser.add_argument('--tolerance', type=float, default=BATCH_TOLERANCE,
+                        help='Largest accepted difference from VADER')
+    parser.add_argument('--show', type=int, default=5, help='Mismatches to print per path')
+    args = parser.parse_args(argv)
+
+    # No score cache, so every path scores each message itself
+    analyzer = SentimentAnalyzer(cache_size=0)
+    messages = generate_messages(args.count, args.seed, _custom_terms(CUSTOM_SENTIMENT_PATH))
+    mismatches = check(analyzer, messages, args.tolerance)
+
+    failed = 0
+    for path, wrong in mismatches.items():
+        print(f"{path:<22}{len(messages) - len(wrong):>8}/{len(messages)}  {'FAIL' if wrong else 'ok'}")
+        for text, want, got in wrong[:args.show]:
+            print(f"    {text!r}: expected {want}, got {got}")
+        failed += bool(wrong)
+    if failed:
+        print(f'{failed} scoring path(s) disagree with VADER')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
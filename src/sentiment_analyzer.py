@@ -1,34 +1,203 @@
-from textblob import TextBlob
-import nltk
-import os
+import functools
+import threading
+
+import metrics
+from long_term_sentiment import LongTermSentiment
+from paths import CUSTOM_SENTIMENT_PATH
+from score_cache import ScoreCache, canonicalize
+from sentiment_config import load_config
 
 class SentimentAnalyzer:
-    def __init__(self):
-        # Download necessary NLTK data if not already downloaded
-        try:
-            nltk.data.find('vader_lexicon')
-        except LookupError:
-            nltk.download('vader_lexicon')
+    def __init__(self, window_size=None, kernel="linear", cache_size=4096, cache_bytes=1 << 20,
+                 shared_cache=False, custom_lexicon_path=CUSTOM_SENTIMENT_PATH, warm_up=False,
+                 config=None, **kernel_options):
+        # The lexicon and VADER (which imports all of nltk) are loaded lazily on first use,
+        # from a prebuilt artifact, so construction never touches disk-heavy parsing or the network
+        self.custom_lexicon_path = custom_lexicon_path
+        self._sia = None
+        self._lexicon = None
+        self._load_lock = threading.Lock()
+        
+        # Score cache for repeated messages (disabled with cache_size=0)
+        # A shared cache is namespaced by the lexicon, so it is attached once that is loaded
+        self.shared_cache = shared_cache
+        if not shared_cache and cache_size > 0:
+            self.cache = ScoreCache(cache_size, cache_bytes)
+        else:
+            self.cache = None
+        
+        # Incremental long-term state per user (see long_term_sentiment.py)
+        # Without an explicit window_size the window is long_term_window from sentiment_config.json
+        # (a ConfigSource), and follows it when it is edited; states already built keep theirs
+        if window_size is not None and window_size < 1:
+            raise ValueError(f"window_size must be at least 1, got {window_size}")
+        self.window_size = window_size
+        if window_size is None:
+            config_source = config if config is not None else load_config()
+            self.window_size = config_source.config.long_term_window
+            config_source.subscribe(self._on_config_change)
+        self.kernel = kernel
+        self.kernel_options = kernel_options
+        self.long_term_states = {}
+        
+        # Vectorized scorer for analyze_many and the single-pass message feature
+        # extractor (see message_features.py), created on first use
+        self.batch_scorer = None
+        self.feature_extractor = None
+        # Repeated messages share their features, as they share their scores
+        self.feature_cache_size = cache_size
+        self._extract = None
         
-        from nltk.sentiment.vader import SentimentIntensityAnalyzer
-        self.sia = SentimentIntensityAnalyzer()
+        # Optionally load everything in the background so the first message is fast too.
+        # nltk itself is imported here: only this (main) thread may hide its optional imports
+        if warm_up:
+            from lexicon_store import import_nltk
+            import_nltk()
+            threading.Thread(target=self._ensure_loaded, name="sentiment-warm-up", daemon=True).start()
+    
+    def _on_config_change(self, old, new):
+        # Only the window size is read from the config; scores and the score cache don't depend on it
+        self.window_size = new.long_term_window
+    
+    def _ensure_loaded(self):
+        """Load the compiled lexicon and VADER once (thread-safe)"""
+        if self._sia is not None:
+            return
+        with self._load_lock:
+            if self._sia is not None:
+                return
+            from lexicon_store import load_compiled_lexicon, make_vader
+            
+            lexicon = load_compiled_lexicon(self.custom_lexicon_path)
+            sia = make_vader(lexicon.lexicon)
+            if self.shared_cache:
+                self.cache = ScoreCache.shared(lexicon.fingerprint)
+            self._lexicon = lexicon
+            self._sia = sia
+    
+    @property
+    def sia(self):
+        """VADER analyzer using the merged VADER + custom lexicon"""
+        self._ensure_loaded()
+        return self._sia
+    
+    @property
+    def lexicon(self):
+        """Compiled lexicon (custom words, phrases and emojis merged into VADER's)"""
+        self._ensure_loaded()
+        return self._lexicon
         
+    @metrics.timed("sentiment_score")
     def analyze_short_term(self, text):
         """
         Analyze the sentiment of a single message (short-term sentiment)
         Returns a value between -1 (very negative) and 1 (very positive)
         """
-        # Using VADER for short-term sentiment analysis
-        sentiment_scores = self.sia.polarity_scores(text)
-        return sentiment_scores['compound']
+        self._ensure_loaded()
+        if not isinstance(text, str):
+            return self.sia.polarity_scores(text)['compound']
+        if self.cache is None:
+            return self.sia.polarity_scores(self.lexicon.rewrite(canonicalize(text)))['compound']
+        
+        # Repeated messages skip VADER entirely
+        key = canonicalize(text)
+        score = self.cache.get(key)
+        if score is None:
+            # Using VADER (with custom phrases and emojis rewritten to lexicon tokens)
+            score = self.sia.polarity_scores(self.lexicon.rewrite(key))['compound']
+            self.cache.put(key, score)
+        return score
+    
+    def features(self, text):
+        """
+        Tokens, punctuation cues, emojis and negations of a message, extracted in one pass
+        Score them with analyze_features and keep them with the message, so it is never tokenized again
+        """
+        if self._extract is None:
+            from emoji_catalog import load_catalog
+            from message_features import FeatureExtractor
+            extractor = FeatureExtractor(self.sia, self.lexicon, load_catalog())
+            extract = extractor.extract
+            if self.feature_cache_size > 0:
+                extract = functools.lru_cache(maxsize=self.feature_cache_size)(extract)
+            self.feature_extractor = extractor
+            self._extract = extract
+        return self._extract(text)
+    
+    @metrics.timed("sentiment_score")
+    def analyze_features(self, features):
+        """
+        analyze_short_term of a message already run through features(), without tokenizing it again
+        The score is also kept on the features
+        """
+        if features.score is None:
+            score = self.cache.get(features.text) if self.cache is not None else None
+            if score is None:
+                score = self.feature_extractor.score(features)
+                if self.cache is not None:
+                    self.cache.put(features.text, score)
+            features.score = score
+        return features.score
     
-    def analyze_long_term(self, messages, window_size=10):
+    @metrics.timed("sentiment_batch")
+    def analyze_many(self, texts):
+        """
+        Analyze the sentiment of a batch of messages (strings or features()) in one call
+        Returns a NumPy array of compound scores, matching analyze_short_term
+        within batch_scoring.BATCH_TOLERANCE; features also keep their score
+        """
+        import numpy as np
+        
+        self._ensure_loaded()
+        if self.batch_scorer is None:
+            from batch_scoring import BatchScorer
+            self.batch_scorer = BatchScorer(self.sia)
+        
+        scores = np.zeros(len(texts))
+        
+        # Deduplicate the batch and answer what we can from the cache
+        pending = {}
+        for idx, text in enumerate(texts):
+            if not isinstance(text, str) and text.score is not None:
+                scores[idx] = text.score
+                continue
+            key = canonicalize(text) if isinstance(text, str) else text.text
+            if key in pending:
+                pending[key].append(idx)
+                continue
+            score = self.cache.get(key) if self.cache is not None else None
+            if score is None:
+                pending[key] = [idx]
+            else:
+                scores[idx] = score
+        
+        if pending:
+            keys = list(pending)
+            # Strings are tokenized here; features are scored from what they already hold
+            firsts = [texts[pending[key][0]] for key in keys]
+            batch = self.batch_scorer.score_features(
+                [self.features(text) if isinstance(text, str) else text for text in firsts]
+            )
+            for key, score in zip(keys, batch.tolist()):
+                scores[pending[key]] = score
+                if self.cache is not None:
+                    self.cache.put(key, score)
+        for idx, text in enumerate(texts):
+            if not isinstance(text, str) and text.score is None:
+                text.score = float(scores[idx])
+        return scores
+    
+    @metrics.timed("long_term_window")
+    def analyze_long_term(self, messages, window_size=None):
         """
         Analyze the sentiment over multiple messages (long-term sentiment)
         Takes a list of messages and returns a value between -1 and 1
+        Rescores every message in the window; use update_long_term for incremental state
         """
         if not messages:
             return 0.0
+        if window_size is None:
+            window_size = self.window_size
         
         # Take the most recent messages up to window_size
         recent_messages = messages[-window_size:] if len(messages) > window_size else messages
@@ -43,4 +212,41 @@ class SentimentAnalyzer:
             weighted_sum += score * weight
             total_weight += weight
         
-        return weighted_sum / total_weight if total_weight > 0 else 0.0
\ No newline at end of file
+        return weighted_sum / total_weight if total_weight > 0 else 0.0
+    
+    def long_term_state(self, user):
+        """Get (or lazily create) the incremental long-term state for a user"""
+        state = self.long_term_states.get(user)
+        if state is None:
+            state = LongTermSentiment(self.window_size, self.kernel, **self.kernel_options)
+            self.long_term_states[user] = state
+        return state
+    
+    def update_long_term(self, user, message, timestamp=None):
+        """
+        Score a new message (a string or its features()) once and fold it into the user's long-term state
+        Returns the message's short-term sentiment
+        """
+        score = self.analyze_short_term(message) if isinstance(message, str) else self.analyze_features(message)
+        self.long_term_state(user).add(score, timestamp)
+        return score
+    
+    def add_long_term_score(self, user, score, timestamp=None):
+        """Fold an already computed score (e.g. from analyze_many) into the user's long-term state"""
+        return self.long_term_state(user).add(score, timestamp)
+    
+    def get_long_term(self, user):
+        """Current long-term sentiment for a user without rescoring any messages"""
+        state = self.long_term_states.get(user)
+        return state.value if state is not None else 0.0
+    
+    def reset_long_term(self, user=None):
+        """Drop the long-term state of one user, or of every user"""
+        if user is None:
+            self.long_term_states.clear()
+        else:
+            self.long_term_states.pop(user, None)
+    
+    def cache_stats(self):
+        """Hit/miss/eviction counters of the score cache"""
+        return self.cache.stats() if self.cache is not None else {}
\ No newline at end of file
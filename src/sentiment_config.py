@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+import weakref
+from bisect import bisect_left, bisect_right
+
+from paths import SENTIMENT_CONFIG_PATH
+
+# Used for anything sentiment_config.json leaves out (and written out when it doesn't exist)
+DEFAULT_CONFIG = {
+    "thresholds": {
+        "very_positive": 0.6,
+        "positive": 0.3,
+        "slightly_positive": 0.1,
+        "neutral_upper": 0.1,
+        "neutral_lower": -0.1,
+        "slightly_negative": -0.1,
+        "negative": -0.3,
+        "very_negative": -0.6,
+        # Short- and long-term sentiment further apart than this get mixed emojis
+        "mixed_difference": 0.5
+    },
+    "weights": {
+        "short_term": 0.6,
+        "long_term": 0.3,
+        "context": 0.1
+    },
+    "analysis": {
+        "short_term_window": 1,
+        "long_term_window": 10,
+        "context_window": 20
+    }
+}
+
+# Sentiment categories from most positive to most negative
+SENTIMENT_CATEGORIES = (
+    'very_positive', 'positive', 'slightly_positive', 'neutral',
+    'slightly_negative', 'negative', 'very_negative'
+)
+
+# Code of the most negative category
+_LAST = len(SENTIMENT_CATEGORIES) - 1
+
+# Seconds between checks for edits while watching a config file
+POLL_INTERVAL = 1.0
+
+
+class Categorizer:
+    """
+    Sentiment thresholds compiled into two sorted boundary lists.
+    A score's category takes one bisect into each (np.digitize over arrays): at or above
+    slightly_positive / positive / very_positive moves it up, and at or below neutral_lower /
+    negative / very_negative moves it down, exactly like the threshold chain it replaces.
+    """
+
+    def __init__(self, thresholds):
+        thresholds = dict(DEFAULT_CONFIG["thresholds"], **thresholds)
+        # A score must be strictly above these to leave very_negative, negative, slightly_negative
+        self.lower = [thresholds["very_negative"], thresholds["negative"], thresholds["neutral_lower"]]
+        # ...and at least these to reach slightly_positive, positive, very_positive
+        self.upper = [thresholds["slightly_positive"], thresholds["positive"], thresholds["very_positive"]]
+        if self.lower != sorted(self.lower) or self.upper != sorted(self.upper) or self.lower[-1] > self.upper[0]:
+            raise ValueError(f"Sentiment thresholds must increase from very_negative to very_positive, got {thresholds}")
+        # Suggestions only tell positive (above), negative (below) and neutral apart
+        self.positive = thresholds["positive"]
+        self.negative = thresholds["negative"]
+        self.mixed_difference = thresholds["mixed_difference"]
+
+    def code(self, score):
+        """Index of a score's category in SENTIMENT_CATEGORIES"""
+        return _LAST - bisect_left(self.lower, score) - bisect_right(self.upper, score)
+
+    def categorize(self, score):
+        return SENTIMENT_CATEGORIES[self.code(score)]
+
+    def codes(self, scores):
+        """code() of every score in an array, as a NumPy array"""
+        import numpy as np
+
+        scores = np.asarray(scores, dtype=float)
+        return _LAST - np.digitize(scores, self.lower, right=True) - np.digitize(scores, self.upper)
+
+    def categorize_many(self, scores):
+        return [SENTIMENT_CATEGORIES[code] for code in self.codes(scores).tolist()]
+
+    def side(self, score):
+        """1, 0 or -1: above the positive threshold, between the two, or below the negative one"""
+        if score > self.positive:
+            return 1
+        if score < self.negative:
+            return -1
+        return 0
+
+    def mixed(self, short_term_sentiment, long_term_sentiment):
+        return abs(short_term_sentiment - long_term_sentiment) > self.mixed_difference
+
+
+class SentimentConfig:
+    """One parsed sentiment_config.json, with defaults filled in and its categorizer compiled"""
+
+    def __init__(self, data):
+        self.thresholds = dict(DEFAULT_CONFIG["thresholds"], **data.get("thresholds", {}))
+        self.weights = dict(DEFAULT_CONFIG["weights"], **data.get("weights", {}))
+        self.analysis = dict(DEFAULT_CONFIG["analysis"], **data.get("analysis", {}))
+        self.categorizer = Categorizer(self.thresholds)
+        # Share of the suggestion weight for the primary (short-term), secondary (long-term)
+        # and tertiary (mixed, or primary again) emoji categories
+        self.category_weights = (self.weights["short_term"], self.weights["long_term"], self.weights["context"])
+        self.long_term_window = int(self.analysis["long_term_window"])
+        if self.long_term_window < 1:
+            raise ValueError(f"long_term_window must be at least 1, got {self.long_term_window}")
+
+
+class ConfigSource:
+    """
+    The current SentimentConfig of one file, picked up again whenever the file changes.
+    Readers just take .config; refresh() (called by the watch() thread, or by hand) reloads
+    an edited file and calls every subscriber with (old, new), so each one rebuilds only
+    what the change affects. A file that doesn't parse or validate is reported and the
+    previous config stays in effect.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._watcher = None
+        self._stamp = self._file_stamp()
+        self.config = self._read() or SentimentConfig(DEFAULT_CONFIG)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self):
+        if self._stamp is None:
+            return None
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return SentimentConfig(json.load(f))
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            print(f"Ignoring sentiment config {self.path}: {e}")
+            return None
+
+    def subscribe(self, callback):
+        """
+        Call callback(old, new) after every reload
+        Bound methods are held weakly, so subscribing never keeps their object alive
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, '__self__') else (lambda: callback)
+        with self._lock:
+            self._subscribers.append(ref)
+
+    def refresh(self):
+        """Reload the file if it changed since the last look; returns whether the config changed"""
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            new = self._read()
+            if new is None:
+                return False
+            old, self.config = self.config, new
+            self._subscribers = [ref for ref in self._subscribers if ref() is not None]
+            callbacks = [ref() for ref in self._subscribers]
+        for callback in callbacks:
+            if callback is not None:
+                callback(old, new)
+        return True
+
+    def watch(self, interval=POLL_INTERVAL):
+        """Check the file for edits every interval seconds on a daemon thread (once per source)"""
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._poll, args=(interval,),
+                                                 name="sentiment-config-watcher", daemon=True)
+                self._watcher.start()
+        return self
+
+    def _poll(self, interval):
+        while True:
+            time.sleep(interval)
+            self.refresh()
+
+
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+def load_config(path=SENTIMENT_CONFIG_PATH):
+    """
+    Shared ConfigSource for a config file, so everything reading it sees the same reloads
+    A missing file gives DEFAULT_CONFIG
+    """
+    key = os.path.abspath(path)
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is None:
+            source = _sources[key] = ConfigSource(path)
+        return source
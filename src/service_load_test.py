@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+SAMPLE_MESSAGES = [
+    "That's wonderful news!", "I'm so happy for you!", "I see what you mean.",
+    "Let me think about that.", "I'm disappointed with the results.", "ok", "lol", "thanks!",
+    "This creates more problems than it solves.", "Great job on the project!",
+]
+
+
+async def _client(client_id, args, latencies, errors):
+    if args.unix:
+        reader, writer = await asyncio.open_unix_connection(args.unix)
+    else:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    rng = random.Random(client_id)
+    conversation_id = f"load-{client_id % args.conversations}"
+    try:
+        for i in range(args.requests):
+            body = json.dumps({
+                "speaker": "User 1" if i % 2 else "User 2",
+                "message": rng.choice(SAMPLE_MESSAGES),
+            }).encode("utf-8")
+            request = (
+                f"POST /conversations/{conversation_id}/messages HTTP/1.1\r\n"
+                f"Host: localhost\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.decode("latin-1").split("\r\n"):
+                if line.lower().startswith("content-length:"):
+                    length = int(line.split(":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors.append(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    finally:
+        writer.close()
+
+
+async def run_load_test(args):
+    latencies = []
+    errors = []
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(_client(i, args, latencies, errors) for i in range(args.connections)), return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+    failed_connections = [r for r in results if isinstance(r, Exception)]
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    return {
+        "connections": args.connections,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "failed_connections": len(failed_connections),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test a running suggestion service on localhost")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="Connect over this Unix socket instead of TCP")
+    parser.add_argument("--connections", type=int, default=1000, help="Concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per connection")
+    parser.add_argument("--conversations", type=int, default=500, help="Distinct conversation IDs")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_load_test(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import conversation_log
+from chat_processor import ChatProcessor
+from conversation_log import ConversationLog
+from long_term_sentiment import LongTermSentiment
+
+# Rough per-message cost on top of the text itself: Message record, deque slots, score float
+MESSAGE_OVERHEAD = 160
+# Rough cost of a message's MessageFeatures on top of its text (kept about twice: canonical
+# and rewritten, plus the token lists)
+FEATURES_OVERHEAD = 600
+# Rough fixed cost of an empty session: ChatProcessor, deques, dicts, state objects
+SESSION_OVERHEAD = 4096
+# Spilled sessions are <sha1 of the conversation id><SPILL_SUFFIX> in spill_dir
+SPILL_SUFFIX = '.session'
+
+
+class Session:
+    """
+    One conversation: its ChatProcessor plus per-user long-term sentiment state.
+    Scoring itself is done by the SentimentAnalyzer shared by all sessions.
+    With a ConversationLog, every message is also appended to it, and the session
+    starts out restored from whatever the log already holds.
+    """
+
+    def __init__(self, conversation_id, per_user_capacity, global_capacity,
+                 window_size, kernel, kernel_options, log=None):
+        self.conversation_id = conversation_id
+        self.chat_processor = ChatProcessor(per_user_capacity, global_capacity, with_defaults=False)
+        self.window_size = window_size
+        self.kernel = kernel
+        self.kernel_options = kernel_options
+        self.long_term_states = {}
+        self.conversation_log = log
+        self.replayed = log.restore(self.chat_processor, self.long_term_states, self.long_term_state) if log else 0
+        self.last_access = time.monotonic()
+        self.nbytes = SESSION_OVERHEAD + sum(self._record_size(r) for r in self.chat_processor.iter_records())
+
+    @staticmethod
+    def _record_size(record):
+        size = sys.getsizeof(record.text) + MESSAGE_OVERHEAD
+        if record.features is not None:
+            size += 2 * sys.getsizeof(record.text) + FEATURES_OVERHEAD
+        return size
+
+    def long_term_state(self, user):
+        state = self.long_term_states.get(user)
+        if state is None:
+            state = LongTermSentiment(self.window_size, self.kernel, **self.kernel_options)
+            self.long_term_states[user] = state
+        return state
+
+    def add_message(self, speaker, text, score, timestamp=None, features=None):
+        """
+        Store a scored message (with its features, if extracted) and fold its score into the
+        speaker's long-term state
+        Returns the change in estimated bytes held
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        # Logged first, so a failed write leaves memory as it was
+        if self.conversation_log is not None:
+            self.conversation_log.append(speaker, text, score, timestamp)
+
+        log = self.chat_processor.log
+        before = self.nbytes
+        # Approximate footprint by what the global log retains
+        if log.maxlen is not None and len(log) == log.maxlen:
+            self.nbytes -= self._record_size(log[0])
+        record = self.chat_processor.add_message(speaker, text, timestamp, score, features)
+        self.nbytes += self._record_size(record)
+        self.long_term_state(speaker).add(score, timestamp)
+        if self.conversation_log is not None and self.conversation_log.snapshot_due():
+            self.conversation_log.snapshot(self.long_term_states)
+        return self.nbytes - before
+
+    def close(self):
+        """Snapshot and close the log, if any; the session can be reopened from it"""
+        if self.conversation_log is not None:
+            self.conversation_log.close(self.long_term_states)
+
+    def latest(self, user):
+        """A user's latest message record, or None if they have none"""
+        records = self.chat_processor.get_recent_records(user, 1)
+        return records[0] if records else None
+
+    def sentiment(self, user):
+        """(short-term, long-term) sentiment of a user's latest message, or None if they have none"""
+        state = self.long_term_states.get(user)
+        if state is None or len(state) == 0:
+            return None
+        return state.last_score, state.value
+
+
+class SessionManager:
+    """
+    Conversations keyed by ID, created lazily and evicted least-recently-used first
+    when there are more than max_sessions, when the estimated memory held exceeds
+    memory_budget bytes, or when a session has been idle for longer than ttl seconds.
+    With spill_dir set, evicted sessions are pickled to disk and restored on next use,
+    including sessions an earlier run spilled there.
+    With log_dir set, every conversation is kept in a durable ConversationLog instead:
+    evicted sessions just close their log, and any conversation logged there before,
+    including by an earlier run, is restored from it on first use.
+    """
+
+    def __init__(self, analyzer, max_sessions=10000, memory_budget=256 << 20, ttl=None,
+                 spill_dir=None, per_user_capacity=1000, global_capacity=10000, log_dir=None,
+                 snapshot_every=1000, sync=False):
+        self.analyzer = analyzer
+        self.max_sessions = max_sessions
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.spill_dir = spill_dir
+        self.per_user_capacity = per_user_capacity
+        self.global_capacity = global_capacity
+        self.log_dir = log_dir
+        self.snapshot_every = snapshot_every
+        self.sync = sync
+
+        self._sessions = OrderedDict()
+        # File names (see _file_name) of the sessions spilled to spill_dir
+        self._spilled = set()
+        self._lock = threading.RLock()
+        self.bytes_held = 0
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.restored = 0
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Sessions spilled by an earlier run are restored on first use like any other
+            self._spilled = {name[:-len(SPILL_SUFFIX)] for name in os.listdir(spill_dir)
+                             if name.endswith(SPILL_SUFFIX)}
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+    @staticmethod
+    def _file_name(conversation_id):
+        return hashlib.sha1(str(conversation_id).encode('utf-8')).hexdigest()
+
+    def _spill_path(self, conversation_id):
+        return os.path.join(self.spill_dir, self._file_name(conversation_id) + SPILL_SUFFIX)
+
+    def _log_path(self, conversation_id):
+        return os.path.join(self.log_dir, f'{self._file_name(conversation_id)}.log')
+
+    def _new_session(self, conversation_id):
+        log = None
+        if self.log_dir:
+            log = ConversationLog(self._log_path(conversation_id), self.snapshot_every,
+                                  retain=self.global_capacity, sync=self.sync)
+        session = Session(conversation_id, self.per_user_capacity, self.global_capacity,
+                          self.analyzer.window_size, self.analyzer.kernel, self.analyzer.kernel_options, log)
+        if session.replayed:
+            self.restored += 1
+        else:
+            self.created += 1
+        return session
+
+    def _restore(self, conversation_id):
+        path = self._spill_path(conversation_id)
+        self._spilled.discard(self._file_name(conversation_id))
+        try:
+            with open(path, 'rb') as f:
+                session = pickle.load(f)
+        except OSError:
+            return None
+        except Exception:
+            # Torn by a crash mid-spill, or written by an incompatible version: start afresh
+            session = None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        if session is None or session.conversation_id != conversation_id:
+            return None
+        self.restored += 1
+        return session
+
+    def get(self, conversation_id):
+        """Session for a conversation, restoring or creating it as needed"""
+        with self._lock:
+            session = self._sessions.get(conversation_id)
+            if session is not None:
+                self._sessions.move_to_end(conversation_id)
+            else:
+                if self._file_name(conversation_id) in self._spilled:
+                    session = self._restore(conversation_id)
+                if session is None:
+                    session = self._new_session(conversation_id)
+                self._sessions[conversation_id] = session
+                self.bytes_held += session.nbytes
+            session.last_access = time.monotonic()
+            self._enforce_limits(keep=conversation_id)
+            return session
+
+    def add_message(self, conversation_id, speaker, text, score=None, timestamp=None, features=None):
+        """
+        Add a message to a conversation, scoring it with the shared analyzer unless a score is given
+        Returns the session
+        """
+        if score is None and features is not None:
+            score = self.analyzer.analyze_features(features)
+        elif score is None:
+            score = self.analyzer.analyze_short_term(text)
+        with self._lock:
+            session = self.get(conversation_id)
+            self.bytes_held += session.add_message(speaker, text, score, timestamp, features)
+            self._enforce_limits(keep=conversation_id)
+            return session
+
+    def latest(self, conversation_id, user):
+        """
+        (sentiment, latest message record) of a user in a conversation, as session.sentiment()
+        and session.latest() give them, read under the lock messages are added with, so a
+        concurrent message can't tear the long-term state or mutate the deques mid-read
+        """
+        with self._lock:
+            session = self.get(conversation_id)
+            return session.sentiment(user), session.latest(user)
+
+    def _evict(self, conversation_id, expired=False):
+        session = self._sessions.pop(conversation_id)
+        self.bytes_held -= session.nbytes
+        if expired:
+            self.expirations += 1
+        else:
+            self.evictions += 1
+        if session.conversation_log is not None:
+            # Everything is in the log already; reopening replays it from the snapshot taken here
+            session.close()
+        elif self.spill_dir:
+            with open(self._spill_path(conversation_id), 'wb') as f:
+                pickle.dump(session, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._spilled.add(self._file_name(conversation_id))
+
+    def _enforce_limits(self, keep=None):
+        if self.ttl is not None:
+            cutoff = time.monotonic() - self.ttl
+            # Oldest-accessed sessions sit at the front of the LRU order
+            while self._sessions:
+                conversation_id, session = next(iter(self._sessions.items()))
+                if session.last_access >= cutoff or conversation_id == keep:
+                    break
+                self._evict(conversation_id, expired=True)
+
+        while self._sessions and (len(self._sessions) > self.max_sessions or self.bytes_held > self.memory_budget):
+            conversation_id = next(iter(self._sessions))
+            if conversation_id == keep:
+                # Never evict the session being served; the budget is rechecked on the next call
+                break
+            self._evict(conversation_id)
+
+    def drop(self, conversation_id):
+        """Forget a conversation entirely, including any spilled state"""
+        with self._lock:
+            session = self._sessions.pop(conversation_id, None)
+            if session is not None:
+                self.bytes_held -= session.nbytes
+                if session.conversation_log is not None:
+                    # Deleted next, so no point snapshotting it
+                    session.conversation_log.close()
+            if self.log_dir:
+                conversation_log.remove(self._log_path(conversation_id))
+            if self._file_name(conversation_id) in self._spilled:
+                self._spilled.discard(self._file_name(conversation_id))
+                try:
+                    os.remove(self._spill_path(conversation_id))
+                except OSError:
+                    pass
+
+    def close(self):
+        """Snapshot and close the logs of every active session"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active_sessions": len(self._sessions),
+                "spilled_sessions": len(self._spilled),
+                "bytes_held": self.bytes_held,
+                "memory_budget": self.memory_budget,
+                "created": self.created,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "restored": self.restored,
+            }
+
+    def __contains__(self, conversation_id):
+        if conversation_id in self._sessions or self._file_name(conversation_id) in self._spilled:
+            return True
+        return bool(self.log_dir) and os.path.exists(self._log_path(conversation_id))
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,106 @@
+import random
+import threading
+
+import metrics
+
+
+class BucketEntry:
+    """Everything suggest() needs for one quantized (short, long) bucket"""
+
+    __slots__ = ("categories", "table", "candidates", "pool")
+
+    def __init__(self, categories, table, pool):
+        self.categories = categories
+        self.table = table
+        # Every emoji that can be suggested for this bucket
+        self.candidates = table.emojis
+        self.pool = pool
+
+
+class SuggestionCache:
+    """
+    Memoizing front for EmojiSuggester.
+    Sentiment pairs are quantized onto the handful of buckets that can change the
+    outcome (3 x 3 x 2 = 18, and the same again for each combination of contextual
+    cues that comes up), and each bucket's resolved categories, sampling
+    table and candidate set are memoized. With pool_size > 0 every bucket also gets
+    a pool of suggestions precomputed from a seeded RNG, so a suggest call becomes a
+    dict lookup plus picking one pool entry.
+    """
+
+    def __init__(self, suggester, pool_size=0, seed=None):
+        self.suggester = suggester
+        self.pool_size = pool_size
+        self.seed = seed
+        self.pool_k = 3
+        self.rng = random.Random(seed)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        metrics.watch("suggestion", self)
+        # Buckets are quantized with the live thresholds, but entries hold sampling tables
+        # that are rebuilt when the category weights change
+        suggester.config_source.subscribe(self._on_config_change)
+
+    def _build_entry(self, bucket):
+        categories = self.suggester.categories_for_bucket(bucket)
+        table = self.suggester.table(categories)
+        pool = None
+        if self.pool_size > 0:
+            # Seeded per bucket, so pools are identical across processes and restarts
+            pool_rng = random.Random(f"{self.seed}:{bucket}")
+            pool = tuple(
+                tuple(table.emojis[idx] for idx in table.draw(self.pool_k, pool_rng))
+                for _ in range(self.pool_size)
+            )
+        return BucketEntry(categories, table, pool)
+
+    def entry(self, short_term_sentiment, long_term_sentiment, features=None):
+        """Memoized BucketEntry for a pair of sentiment values (and a message's features)"""
+        bucket = self.suggester.quantize(short_term_sentiment, long_term_sentiment, features)
+        entry = self._entries.get(bucket)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        with self._lock:
+            entry = self._entries.get(bucket)
+            if entry is None:
+                self.misses += 1
+                entry = self._entries[bucket] = self._build_entry(bucket)
+            return entry
+
+    @metrics.timed("suggestion_cached", event="suggestions")
+    def suggest(self, short_term_sentiment, long_term_sentiment, num_suggestions=3, rng=None, seed=None,
+                features=None):
+        """
+        Same contract as EmojiSuggester.suggest, served from the bucket cache
+        """
+        if seed is not None:
+            rng = random.Random(seed)
+        elif rng is None:
+            rng = self.rng
+
+        entry = self.entry(short_term_sentiment, long_term_sentiment, features)
+        if entry.pool is not None and num_suggestions == self.pool_k:
+            return list(entry.pool[rng.randrange(self.pool_size)])
+        return [entry.table.emojis[idx] for idx in entry.table.draw(num_suggestions, rng)]
+
+    def _on_config_change(self, old, new):
+        if new.category_weights != old.category_weights:
+            self.clear()
+
+    def clear(self):
+        """Drop memoized buckets (e.g. after the suggester's categories change)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "buckets": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "pool_size": self.pool_size,
+        }
@@ -0,0 +1,333 @@
+import argparse
+import asyncio
+import contextvars
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from emoji_suggester import EmojiSuggester
+from micro_batcher import MicroBatcher, QueueFull
+from sentiment_analyzer import SentimentAnalyzer
+from paths import SENTIMENT_CONFIG_PATH
+from sentiment_config import load_config
+from session_manager import SessionManager
+from suggestion_cache import SuggestionCache
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _timestamp(payload):
+    """The optional "timestamp" of a posted message, as float seconds since the epoch"""
+    timestamp = payload.get("timestamp")
+    if timestamp is None:
+        return None
+    if not isinstance(timestamp, bool) and isinstance(timestamp, (int, float)):
+        try:
+            timestamp = float(timestamp)
+        except OverflowError:
+            pass
+        else:
+            if math.isfinite(timestamp):
+                return timestamp
+    raise HTTPError(400, '"timestamp" must be a finite number (seconds since the epoch)')
+
+
+class SuggestionService:
+    """
+    Headless emoji suggestion service.
+    Clients post messages for a conversation and get suggestions back over a small
+    HTTP/1.1 (keep-alive) protocol on TCP and/or a Unix socket:
+
+        POST /conversations/<id>/messages    {"speaker": "...", "message": "..."}
+        GET  /conversations/<id>/suggestions?user=<speaker>
+        GET  /stats
+        GET  /health
+        GET  /metrics[?format=json]          (Prometheus text by default)
+
+    Scoring and session updates run in an executor so the event loop only parses
+    requests and writes responses. With a MicroBatcher, concurrent messages are
+    scored together in batched analyze_many calls.
+    """
+
+    def __init__(self, analyzer=None, sessions=None, suggester=None, workers=4, num_suggestions=3,
+                 batcher=None):
+        self.analyzer = analyzer if analyzer is not None else SentimentAnalyzer(warm_up=True)
+        self.sessions = sessions if sessions is not None else SessionManager(self.analyzer)
+        self.suggester = suggester if suggester is not None else SuggestionCache(EmojiSuggester())
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="suggest")
+        self.num_suggestions = num_suggestions
+        self.batcher = batcher
+        if self.batcher is not None and self.batcher.executor is None:
+            self.batcher.executor = self.executor
+        self.servers = []
+        self.requests_served = 0
+
+    # Blocking work, run in the executor
+
+    def _suggest_for(self, conversation_id, user):
+        # Read under the session manager's lock; request threads may be adding messages meanwhile
+        sentiment, record = self.sessions.latest(conversation_id, user)
+        if sentiment is None:
+            return {"user": user, "short_term_sentiment": None, "long_term_sentiment": None,
+                    "suggestions": []}
+        short_term_sentiment, long_term_sentiment = sentiment
+        # Contextual emojis follow the cues of the latest message (extracted now if it was restored)
+        if record is not None and record.features is None:
+            record.features = self.analyzer.features(record.text)
+        return {
+            "user": user,
+            "short_term_sentiment": short_term_sentiment,
+            "long_term_sentiment": long_term_sentiment,
+            "suggestions": self.suggester.suggest(short_term_sentiment, long_term_sentiment,
+                                                  self.num_suggestions,
+                                                  features=record.features if record is not None else None),
+        }
+
+    def process_message(self, conversation_id, speaker, message, timestamp=None, score=None, features=None):
+        """
+        Score a message (unless already scored), store it and return suggestions for replying to it
+        The message is tokenized once, into features kept with it, unless they are given
+        """
+        if features is None:
+            features = self.analyzer.features(message)
+        if score is None:
+            score = self.analyzer.analyze_features(features)
+        self.sessions.add_message(conversation_id, speaker, message, score, timestamp, features)
+        result = self._suggest_for(conversation_id, speaker)
+        result["conversation_id"] = conversation_id
+        return result
+
+    def current_suggestions(self, conversation_id, user):
+        result = self._suggest_for(conversation_id, user)
+        result["conversation_id"] = conversation_id
+        return result
+
+    def stats(self):
+        return {
+            "requests_served": self.requests_served,
+            "sessions": self.sessions.stats(),
+            "score_cache": self.analyzer.cache_stats(),
+            "suggestion_cache": self.suggester.stats() if hasattr(self.suggester, "stats") else {},
+            "batching": self.batcher.stats() if self.batcher is not None else None,
+        }
+
+    # Request handling
+
+    async def _run(self, func, *args):
+        # Carry the context over so stages timed in the executor join the request's trace
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, context.run, func, *args)
+
+    async def route(self, method, target, body):
+        """Dispatch a parsed request; returns a JSON-serializable payload"""
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"]:
+            return {"status": "ok"}
+        if parts == ["stats"]:
+            return self.stats()
+        if parts == ["metrics"]:
+            if parse_qs(url.query).get("format", [None])[0] == "json":
+                return metrics.snapshot()
+            return metrics.prometheus_text()
+
+        if len(parts) == 3 and parts[0] == "conversations":
+            conversation_id = parts[1]
+            if parts[2] == "messages":
+                if method != "POST":
+                    raise HTTPError(405, "use POST to add a message")
+                try:
+                    payload = json.loads(body or b"{}")
+                    speaker = str(payload["speaker"])
+                    message = str(payload["message"])
+                except (ValueError, KeyError, TypeError):
+                    raise HTTPError(400, 'expected JSON body {"speaker": ..., "message": ...}')
+                timestamp = _timestamp(payload)
+                score = features = None
+                if self.batcher is not None:
+                    # Tokenized once in the executor; the batch scores the features, which the session keeps
+                    features = await self._run(self.analyzer.features, message)
+                    try:
+                        score = await self.batcher.score(features)
+                    except QueueFull as e:
+                        raise HTTPError(503, str(e))
+                return await self._run(self.process_message, conversation_id, speaker, message,
+                                       timestamp, score, features)
+            if parts[2] == "suggestions":
+                if method != "GET":
+                    raise HTTPError(405, "use GET to read suggestions")
+                user = parse_qs(url.query).get("user", [None])[0]
+                if user is None:
+                    raise HTTPError(400, "missing ?user= parameter")
+                return await self._run(self.current_suggestions, conversation_id, user)
+
+        raise HTTPError(404, f"no route for {url.path}")
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 413, {"error": "headers too large"}, keep_alive=False)
+                    break
+
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                for line in header_lines:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                # Content-Length is 1*DIGIT; anything else (a sign, spaces inside, non-ASCII digits) is rejected
+                content_length = headers.get("content-length", "0") or "0"
+                if not (content_length.isascii() and content_length.isdigit()):
+                    await self._respond(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(content_length)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                with metrics.trace("service_request", method=method, target=target):
+                    try:
+                        status, payload = 200, await self.route(method.upper(), target, body)
+                    except HTTPError as e:
+                        status, payload = e.status, {"error": e.message}
+                    except Exception as e:  # keep serving other requests on this connection
+                        status, payload = 500, {"error": str(e)}
+                self.requests_served += 1
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive=True):
+        if isinstance(payload, str):
+            # Plain-text payloads (the Prometheus exposition format)
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        head = (
+            f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode("latin-1")
+        writer.write(head + body)
+        await writer.drain()
+
+    async def start(self, host=None, port=None, unix_path=None, backlog=4096):
+        """Start listening on TCP and/or a Unix socket"""
+        if host is not None and port is not None:
+            self.servers.append(await asyncio.start_server(
+                self.handle_connection, host, port, backlog=backlog, limit=MAX_HEADER_BYTES))
+        if unix_path is not None:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            self.servers.append(await asyncio.start_unix_server(
+                self.handle_connection, unix_path, backlog=backlog, limit=MAX_HEADER_BYTES))
+        if not self.servers:
+            raise ValueError("Nothing to listen on: give host and port and/or unix_path")
+        return self.servers
+
+    async def serve_forever(self, host=None, port=None, unix_path=None):
+        await self.start(host, port, unix_path)
+        await asyncio.gather(*(server.serve_forever() for server in self.servers))
+
+    async def close(self):
+        for server in self.servers:
+            server.close()
+            await server.wait_closed()
+        self.servers = []
+        self.executor.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the headless emoji suggestion service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", dest="unix_path", help="Also (or only, with --no-tcp) listen on this Unix socket")
+    parser.add_argument("--no-tcp", action="store_true", help="Don't listen on TCP")
+    parser.add_argument("--workers", type=int, default=4, help="Executor threads for scoring")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    parser.add_argument("--memory-budget-mb", type=int, default=256)
+    parser.add_argument("--ttl", type=float, default=None, help="Evict sessions idle for this many seconds")
+    parser.add_argument("--spill-dir", help="Spill evicted sessions to this directory")
+    parser.add_argument("--log-dir", help="Keep a durable log per conversation here and restore conversations from it")
+    parser.add_argument("--snapshot-every", type=int, default=1000,
+                        help="With --log-dir, messages between snapshots of the long-term sentiment state")
+    parser.add_argument("--fsync", action="store_true", help="With --log-dir, fsync every logged message")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="Coalesce messages arriving within this window into one scoring call (0 disables)")
+    parser.add_argument("--max-batch", type=int, default=64, help="Flush a batch early once this many messages wait")
+    parser.add_argument("--max-queue", type=int, default=10000, help="Messages allowed to wait for scoring")
+    parser.add_argument("--reject-when-full", action="store_true",
+                        help="Answer 503 instead of applying back-pressure when the scoring queue is full")
+    parser.add_argument("--config", default=SENTIMENT_CONFIG_PATH,
+                        help="Sentiment config (thresholds, weights, windows), reloaded when it changes")
+    parser.add_argument("--config-poll-s", type=float, default=1.0, help="How often to check the config for edits")
+    parser.add_argument("--metrics", action="store_true", help="Record per-stage timings (served on /metrics)")
+    parser.add_argument("--trace-sample-rate", type=float, default=0.0,
+                        help="With --metrics, fraction of requests traced stage by stage")
+    parser.add_argument("--slow-ms", type=float, default=100.0,
+                        help="Traced requests slower than this are kept (see /metrics?format=json)")
+    args = parser.parse_args()
+
+    if args.metrics:
+        metrics.enable(trace_sample_rate=args.trace_sample_rate, slow_threshold=args.slow_ms / 1000)
+    config_source = load_config(args.config).watch(args.config_poll_s)
+    analyzer = SentimentAnalyzer(warm_up=True, config=config_source)
+    sessions = SessionManager(analyzer, max_sessions=args.max_sessions,
+                              memory_budget=args.memory_budget_mb << 20,
+                              ttl=args.ttl, spill_dir=args.spill_dir, log_dir=args.log_dir,
+                              snapshot_every=args.snapshot_every, sync=args.fsync)
+    batcher = None
+    if args.batch_window_ms > 0:
+        batcher = MicroBatcher(analyzer, max_batch=args.max_batch, max_delay=args.batch_window_ms / 1000,
+                               max_queue=args.max_queue,
+                               overflow="reject" if args.reject_when_full else "wait")
+    suggester = SuggestionCache(EmojiSuggester(config=config_source))
+    service = SuggestionService(analyzer, sessions, suggester, workers=args.workers, batcher=batcher)
+
+    host, port = (None, None) if args.no_tcp else (args.host, args.port)
+    where = ", ".join(filter(None, [f"http://{host}:{port}" if host else None, args.unix_path]))
+    print(f"Emoji suggestion service listening on {where}")
+    try:
+        asyncio.run(service.serve_forever(host, port, args.unix_path))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sessions.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import random
+
+# Sample messages for synthetic conversations
+POSITIVE_MESSAGES = [
+    "That's wonderful news!", "I'm so happy for you!", "Great job on the project!",
+    "I love this idea!", "This makes me so excited!", "You're doing amazing work!",
+    "I'm really impressed with your progress!", "This is exactly what we needed!",
+    "I'm looking forward to our next meeting!", "Your help has been invaluable!"
+]
+
+NEUTRAL_MESSAGES = [
+    "I see what you mean.", "Let me think about that.", "That's interesting.",
+    "I'm not sure yet.", "We should consider all options.", "What do you think?",
+    "Let's discuss this further.", "I need more information.", "That's a possibility.",
+    "I'll get back to you on that."
+]
+
+NEGATIVE_MESSAGES = [
+    "I'm disappointed with the results.", "This isn't what I expected.",
+    "We need to fix these issues.", "I'm concerned about the timeline.",
+    "This approach has serious problems.", "I disagree with your assessment.",
+    "The quality is below our standards.", "I'm frustrated with the lack of progress.",
+    "This creates more problems than it solves.", "We're facing significant challenges."
+]
+
+ALL_MESSAGES = POSITIVE_MESSAGES + NEUTRAL_MESSAGES + NEGATIVE_MESSAGES
+
+
+def generate_conversation(rng=random, min_length=4, max_length=8):
+    """One synthetic conversation between User 1 and User 2 with a random overall tone"""
+    sentiment_type = rng.choice(["positive", "neutral", "negative", "mixed"])
+    conversation = []
+
+    for i in range(rng.randint(min_length, max_length)):
+        speaker = "User 1" if i % 2 == 0 else "User 2"
+
+        if sentiment_type == "positive":
+            message = rng.choice(POSITIVE_MESSAGES)
+        elif sentiment_type == "negative":
+            message = rng.choice(NEGATIVE_MESSAGES)
+        elif sentiment_type == "neutral":
+            message = rng.choice(NEUTRAL_MESSAGES)
+        else:  # mixed
+            if speaker == "User 1":
+                message = rng.choice(POSITIVE_MESSAGES)
+            else:
+                message = rng.choice(NEGATIVE_MESSAGES)
+
+        conversation.append({"speaker": speaker, "message": message})
+
+    return conversation
+
+
+def generate_conversations(count, seed=None, min_length=4, max_length=8):
+    """Yield count synthetic conversations; the same seed gives the same corpus"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield generate_conversation(rng, min_length, max_length)
+
+
+def generate_messages(count, seed=None, vocabulary=None):
+    """
+    count synthetic messages drawn from the pools. With vocabulary set, each message also
+    gets a few words drawn from a synthetic vocabulary of that size, so caches see
+    mostly distinct texts.
+    """
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        message = rng.choice(ALL_MESSAGES)
+        if vocabulary:
+            message += " " + " ".join(f"word{rng.randrange(vocabulary)}" for _ in range(rng.randint(1, 4)))
+        messages.append(message)
+    return messages
@@ -1,67 +1,43 @@
 import os
 import json
 import random
-import requests
-from bs4 import BeautifulSoup
-import pandas as pd
-from tqdm import tqdm
-import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
+from batch_suggestions import chunked, ordered_imap
 from sentiment_analyzer import SentimentAnalyzer
 from emoji_suggester import EmojiSuggester
 from chat_processor import ChatProcessor
+from suggestion_cache import SuggestionCache
+from synthetic_corpus import generate_conversation
+from paths import SENTIMENT_CONFIG_PATH
+from sentiment_config import load_config
+from jsonl_io import JsonlWriter, iter_jsonl, load_checkpoint, save_checkpoint, write_jsonl
 
 class EmojiSuggestionTester:
     def __init__(self):
-        self.sentiment_analyzer = SentimentAnalyzer()
-        self.emoji_suggester = EmojiSuggester()
-        self.chat_processor = ChatProcessor()
-        
         # Create data directory if it doesn't exist
         self.test_data_dir = os.path.join('d:', 'CODES', 'Projects', 'Emoji', 'data', 'test_data')
         os.makedirs(self.test_data_dir, exist_ok=True)
         
-        # Create default sentiment config if it doesn't exist
-        config_path = os.path.join('d:', 'CODES', 'Projects', 'Emoji', 'data', 'sentiment_config.json')
-        if not os.path.exists(config_path):
-            # Create default sentiment config
-            default_config = {
-                "thresholds": {
-                    "very_positive": 0.6,
-                    "positive": 0.3,
-                    "slightly_positive": 0.1,
-                    "neutral_upper": 0.1,
-                    "neutral_lower": -0.1,
-                    "slightly_negative": -0.1,
-                    "negative": -0.3,
-                    "very_negative": -0.6
-                },
-                "weights": {
-                    "short_term": 0.6,
-                    "long_term": 0.3,
-                    "context": 0.1
-                },
-                "analysis": {
-                    "short_term_window": 1,
-                    "long_term_window": 10,
-                    "context_window": 20
-                }
-            }
-            
-            # Ensure the directory exists
-            os.makedirs(os.path.dirname(config_path), exist_ok=True)
-            
-            # Save the default config
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=2)
-            print(f"Created default sentiment config at {config_path}")
+        # The sentiment config shared with the app, the service and the evaluator
+        # (thresholds, weights and windows; a missing file gives the defaults)
+        self.config_path = SENTIMENT_CONFIG_PATH
+        self.config_source = load_config(self.config_path)
         
-        # Load configuration
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+        self.sentiment_analyzer = SentimentAnalyzer(config=self.config_source)
+        self.emoji_suggester = EmojiSuggester(config=self.config_source)
+        # Suggestions only depend on the quantized sentiment bucket, so memoize per bucket
+        self.suggestion_cache = SuggestionCache(self.emoji_suggester)
+        self.chat_processor = ChatProcessor()
         
-        # Initialize results storage
         self.results = []
+        self.results_file = None
+    
+    @property
+    def config(self):
+        """The current sentiment config (see sentiment_config.py)"""
+        return self.config_source.config
     
     def scrape_conversations(self, num_conversations=20):
         """Scrape sample conversations from various sources"""
@@ -83,6 +59,10 @@ class EmojiSuggestionTester:
             }
         ]
         
+        # Only scraping needs the network stack
+        import requests
+        from bs4 import BeautifulSoup
+        
         print("Scraping conversation data...")
         
         for source in sources:
@@ -116,141 +96,221 @@ class EmojiSuggestionTester:
             synthetic_count = num_conversations - len(conversations)
             print(f"Generating {synthetic_count} synthetic conversations...")
             
-            # Sample messages for synthetic conversations
-            positive_messages = [
-                "That's wonderful news!", "I'm so happy for you!", "Great job on the project!",
-                "I love this idea!", "This makes me so excited!", "You're doing amazing work!",
-                "I'm really impressed with your progress!", "This is exactly what we needed!",
-                "I'm looking forward to our next meeting!", "Your help has been invaluable!"
-            ]
-            
-            neutral_messages = [
-                "I see what you mean.", "Let me think about that.", "That's interesting.",
-                "I'm not sure yet.", "We should consider all options.", "What do you think?",
-                "Let's discuss this further.", "I need more information.", "That's a possibility.",
-                "I'll get back to you on that."
-            ]
-            
-            negative_messages = [
-                "I'm disappointed with the results.", "This isn't what I expected.",
-                "We need to fix these issues.", "I'm concerned about the timeline.",
-                "This approach has serious problems.", "I disagree with your assessment.",
-                "The quality is below our standards.", "I'm frustrated with the lack of progress.",
-                "This creates more problems than it solves.", "We're facing significant challenges."
-            ]
-            
+            # Synthetic conversations reuse the message pools in synthetic_corpus.py
             for _ in range(synthetic_count):
-                sentiment_type = random.choice(["positive", "neutral", "negative", "mixed"])
-                conversation = []
-                
-                for i in range(random.randint(4, 8)):
-                    speaker = "User 1" if i % 2 == 0 else "User 2"
-                    
-                    if sentiment_type == "positive":
-                        message = random.choice(positive_messages)
-                    elif sentiment_type == "negative":
-                        message = random.choice(negative_messages)
-                    elif sentiment_type == "neutral":
-                        message = random.choice(neutral_messages)
-                    else:  # mixed
-                        if speaker == "User 1":
-                            message = random.choice(positive_messages)
-                        else:
-                            message = random.choice(negative_messages)
-                    
-                    conversation.append({"speaker": speaker, "message": message})
-                
-                conversations.append(conversation)
+                conversations.append(generate_conversation())
         
-        # Save conversations to file
-        conversations_file = os.path.join(self.test_data_dir, 'test_conversations.json')
-        with open(conversations_file, 'w', encoding='utf-8') as f:
-            json.dump(conversations[:num_conversations], f, indent=2)
+        # Save conversations to file, one conversation per line
+        conversations_file = os.path.join(self.test_data_dir, 'test_conversations.jsonl')
+        count = write_jsonl(conversations_file, conversations[:num_conversations])
         
-        print(f"Saved {len(conversations[:num_conversations])} conversations to {conversations_file}")
+        print(f"Saved {count} conversations to {conversations_file}")
         return conversations[:num_conversations]
     
+    def find_conversations_file(self):
+        """Path of the saved conversations (JSONL, gzipped JSONL or legacy JSON), or None"""
+        for name in ('test_conversations.jsonl.gz', 'test_conversations.jsonl', 'test_conversations.json'):
+            path = os.path.join(self.test_data_dir, name)
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def iter_conversations(self, skip=0):
+        """Stream previously scraped conversations, scraping them first if there are none"""
+        conversations_file = self.find_conversations_file()
+        if conversations_file is None:
+            return iter(self.scrape_conversations()[skip:])
+        print(f"Streaming conversations from {conversations_file}")
+        if conversations_file.endswith('.json'):
+            # Legacy single-document format has to be loaded whole
+            with open(conversations_file, 'r', encoding='utf-8') as f:
+                return iter(json.load(f)[skip:])
+        return iter_jsonl(conversations_file, skip=skip)
+    
     def load_conversations(self):
         """Load previously scraped conversations if available"""
-        conversations_file = os.path.join(self.test_data_dir, 'test_conversations.json')
-        if os.path.exists(conversations_file):
-            with open(conversations_file, 'r', encoding='utf-8') as f:
-                conversations = json.load(f)
-            print(f"Loaded {len(conversations)} conversations from {conversations_file}")
-            return conversations
-        else:
-            return self.scrape_conversations()
+        conversations = list(self.iter_conversations())
+        print(f"Loaded {len(conversations)} conversations")
+        return conversations
     
-    def test_emoji_suggestions(self):
-        """Test emoji suggestions on the conversations"""
-        conversations = self.load_conversations()
+    def test_emoji_suggestions(self, workers=1, seed=None, chunk_size=64, results_file=None, resume=False,
+                               load_results=True):
+        """
+        Test emoji suggestions on the conversations, streaming results to a JSONL file
+        (gzipped if results_file ends in .gz, kept as self.results_file) and returning the results
+        list, read back from it. With load_results=False nothing is kept in memory and None is returned.
+        With workers > 1, conversations are sharded across a process pool. Pass seed to make
+        suggestions reproducible; results are identical for any number of workers.
+        A checkpoint is saved after every chunk; with resume=True an interrupted run
+        continues after the last checkpointed chunk.
+        """
+        if results_file is None:
+            results_file = os.path.join(self.test_data_dir, 'test_results.jsonl')
+        checkpoint_file = results_file + '.checkpoint'
         
-        print("Testing emoji suggestions...")
+        checkpoint = load_checkpoint(checkpoint_file) if resume else None
+        if checkpoint is not None and checkpoint.get("seed") != seed:
+            print(f"Ignoring checkpoint {checkpoint_file}: it was made with seed {checkpoint.get('seed')}")
+            checkpoint = None
+        if checkpoint is not None and (not os.path.exists(results_file)
+                                       or os.path.getsize(results_file) < checkpoint["offset"]):
+            print(f"Ignoring checkpoint {checkpoint_file}: {results_file} is missing or shorter than it records")
+            checkpoint = None
+        done = checkpoint["conversations_done"] if checkpoint else 0
+        written = checkpoint["results_written"] if checkpoint else 0
+        if checkpoint:
+            print(f"Resuming after {done} conversations ({written} results)")
         
-        for conversation_idx, conversation in enumerate(tqdm(conversations)):
-            # Reset chat processor for each conversation
-            self.chat_processor = ChatProcessor()
-            
-            # Process each message in the conversation
-            for msg_idx, msg_data in enumerate(conversation):
-                speaker = msg_data["speaker"]
-                message = msg_data["message"]
-                
-                # Add message to chat processor
-                self.chat_processor.add_message(speaker, message)
-                
-                # Only analyze messages from User 2 (as per your app logic)
-                if speaker == "User 2":
-                    # Get messages from User 2
-                    user2_messages = self.chat_processor.get_recent_messages("User 2")
-                    
-                    # Calculate sentiments
-                    short_term_sentiment = self.sentiment_analyzer.analyze_short_term(message)
-                    long_term_sentiment = self.sentiment_analyzer.analyze_long_term(user2_messages)
-                    
-                    # Get emoji suggestions
-                    suggested_emojis = self.emoji_suggester.suggest(short_term_sentiment, long_term_sentiment)
-                    
-                    # Store results
-                    self.results.append({
-                        "conversation_id": conversation_idx,
-                        "message_id": msg_idx,
-                        "message": message,
-                        "short_term_sentiment": short_term_sentiment,
-                        "long_term_sentiment": long_term_sentiment,
-                        "suggested_emojis": suggested_emojis,
-                        # Categorize sentiment for evaluation
-                        "sentiment_category": self._categorize_sentiment(short_term_sentiment)
+        chunks = chunked(self.iter_conversations(skip=done), chunk_size, done)
+        
+        from tqdm import tqdm
+        
+        print(f"Testing emoji suggestions ({workers} worker{'s' if workers != 1 else ''})...")
+        
+        pool = None
+        if workers > 1:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                       initargs=(self.config_path, seed))
+            # Chunks come back in submission order, so the merged results are deterministic
+            scored = ordered_imap(pool, _score_chunk, chunks, max_pending=workers * 2)
+        else:
+            scored = (
+                ((start, chunk), score_conversations(start, chunk, self.sentiment_analyzer,
+                                                     self.suggestion_cache, self.config_source, seed))
+                for start, chunk in chunks
+            )
+        
+        try:
+            with JsonlWriter(results_file, resume_offset=checkpoint["offset"] if checkpoint else None) as writer, \
+                    tqdm(initial=done, unit=" conversations") as progress:
+                for (start, chunk), chunk_results in scored:
+                    for result in chunk_results:
+                        writer.write(result)
+                    done = start + len(chunk)
+                    written += len(chunk_results)
+                    save_checkpoint(checkpoint_file, {
+                        "conversations_done": done,
+                        "results_written": written,
+                        "offset": writer.checkpoint(),
+                        "seed": seed,
                     })
+                    progress.update(len(chunk))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
         
-        # Save results
-        results_file = os.path.join(self.test_data_dir, 'test_results.json')
-        with open(results_file, 'w', encoding='utf-8') as f:
-            json.dump(self.results, f, indent=2)
+        # The run finished, so there is nothing left to resume
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
         
-        print(f"Saved {len(self.results)} test results to {results_file}")
+        print(f"Saved {written} test results to {results_file}")
+        self.results_file = results_file
+        if not load_results:
+            return None
+        self.results = list(iter_jsonl(results_file))
         return self.results
     
     def _categorize_sentiment(self, sentiment_score):
         """Categorize sentiment score into discrete categories"""
-        thresholds = self.config["thresholds"]
+        return self.config.categorizer.categorize(sentiment_score)
+
+def score_conversations(start_idx, conversations, analyzer, suggester, config_source, seed=None):
+    """
+    Run the suggestion pipeline over consecutive conversations, numbered from start_idx
+    With a seed, each message's suggestions come from an RNG seeded by (seed, conversation, message),
+    so they don't depend on how conversations were split up. Edits to the sentiment config
+    are picked up between chunks, in every worker.
+    """
+    config_source.refresh()
+    categorizer = config_source.config.categorizer
+    chat_processor = ChatProcessor()
+    
+    # Score User 2's default messages and every User 2 message of these conversations in one batch;
+    # each message is tokenized once, into features that also pick its contextual emojis
+    default_messages = chat_processor.get_recent_messages("User 2")
+    user2_features = [
+        analyzer.features(msg_data["message"])
+        for conversation in conversations
+        for msg_data in conversation
+        if msg_data["speaker"] == "User 2"
+    ]
+    batch_scores = analyzer.analyze_many(default_messages + user2_features)
+    # Categorized for evaluation in the same batch (see sentiment_config.Categorizer)
+    message_categories = iter(categorizer.categorize_many(batch_scores[len(default_messages):]))
+    batch_scores = batch_scores.tolist()
+    default_scores = batch_scores[:len(default_messages)]
+    message_scores = iter(batch_scores[len(default_messages):])
+    message_features = iter(user2_features)
+    
+    results = []
+    for conversation_idx, conversation in enumerate(conversations, start_idx):
+        # Reset chat processor for each conversation
+        chat_processor.reset_conversation()
         
-        if sentiment_score >= thresholds["very_positive"]:
-            return "very_positive"
-        elif sentiment_score >= thresholds["positive"]:
-            return "positive"
-        elif sentiment_score >= thresholds["slightly_positive"]:
-            return "slightly_positive"
-        elif sentiment_score > thresholds["neutral_lower"]:
-            return "neutral"
-        elif sentiment_score > thresholds["negative"]:
-            return "slightly_negative"
-        elif sentiment_score > thresholds["very_negative"]:
-            return "negative"
-        else:
-            return "very_negative"
+        # Reset long-term sentiment and seed it with User 2's default messages
+        analyzer.reset_long_term()
+        for default_score in default_scores:
+            analyzer.add_long_term_score("User 2", default_score)
+        
+        # Process each message in the conversation
+        for msg_idx, msg_data in enumerate(conversation):
+            speaker = msg_data["speaker"]
+            message = msg_data["message"]
+            
+            # Add message to chat processor
+            features = next(message_features) if speaker == "User 2" else None
+            record = chat_processor.add_message(speaker, message, features=features)
+            
+            # Only analyze messages from User 2 (as per your app logic)
+            if speaker == "User 2":
+                # Calculate sentiments: the batch score is folded into the long-term state
+                short_term_sentiment = record.score = next(message_scores)
+                analyzer.add_long_term_score("User 2", short_term_sentiment)
+                long_term_sentiment = analyzer.get_long_term("User 2")
+                
+                # Get emoji suggestions
+                rng = random.Random(f"{seed}:{conversation_idx}:{msg_idx}") if seed is not None else None
+                suggested_emojis = " ".join(
+                    suggester.suggest(short_term_sentiment, long_term_sentiment, rng=rng, features=features)
+                )
+                
+                # Store results
+                results.append({
+                    "conversation_id": conversation_idx,
+                    "message_id": msg_idx,
+                    "message": message,
+                    "short_term_sentiment": short_term_sentiment,
+                    "long_term_sentiment": long_term_sentiment,
+                    "suggested_emojis": suggested_emojis,
+                    # Categorize sentiment for evaluation
+                    "sentiment_category": next(message_categories)
+                })
+    return results
+
+# Per-process state for parallel runs, built once by _init_worker
+_worker = {}
+
+def _init_worker(config_path, seed):
+    config_source = load_config(config_path)
+    _worker["analyzer"] = SentimentAnalyzer(config=config_source)
+    _worker["suggester"] = SuggestionCache(EmojiSuggester(config=config_source))
+    _worker["config_source"] = config_source
+    _worker["seed"] = seed
+
+def _score_chunk(chunk):
+    start_idx, conversations = chunk
+    return score_conversations(start_idx, conversations, _worker["analyzer"], _worker["suggester"],
+                               _worker["config_source"], _worker["seed"])
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run emoji suggestions over the test conversations")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes to shard conversations across")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible suggestions")
+    parser.add_argument("--chunk-size", type=int, default=64, help="Conversations per work unit (and checkpoint)")
+    parser.add_argument("--output", help="Results file (.jsonl, or .jsonl.gz to compress)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its checkpoint")
+    args = parser.parse_args()
+    
     tester = EmojiSuggestionTester()
-    results = tester.test_emoji_suggestions()
-    print(f"Testing complete. Processed {len(results)} messages.")
\ No newline at end of file
+    tester.test_emoji_suggestions(workers=args.workers, seed=args.seed, chunk_size=args.chunk_size,
+                                  results_file=args.output, resume=args.resume, load_results=False)